@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""Benchmarks for the I/O paths of timetracker and tt.py
+
+Generates tracking files of several sizes with tests/helpers.py and times
+reading, writing, formatting, saving, loading and appending with
+TrackingFile, as well as the tail, insert and list commands of tt.py.
+read_parallel parses the file on all cores (see timetracker.parallel).
+parallel_append measures the throughput of appends from several processes
+at once, which are batched by group commit (see timetracker.locking).
+
+Results are written as JSON. Each result holds the median time, the
+throughput in rows per second, the peak memory allocated by Python (from
+tracemalloc) and, for operations that are repeated many times like appends,
+latency percentiles.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_io --sizes 10000,1000000 --output bench.json
+
+With --baseline, results are compared to a stored run and slower results are
+reported as regressions (and the exit status is 1); a missing baseline is an
+error. --save-baseline stores the current run. Timings depend on the
+machine, so baselines are not committed.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import multiprocessing
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# pylint: disable=wrong-import-position
+import tt
+import timetracker
+from tests import helpers
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+DEFAULT_ACTIVITIES = 200
+DEFAULT_THRESHOLD = 1.25
+
+def measure(function, repeat: int = 3) -> list:
+    """Calls function repeat times and returns the times taken in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+def peak_memory(function) -> int:
+    """Calls function once and returns the peak of memory allocated in bytes"""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def percentiles(times: list) -> dict:
+    """Returns p50, p90 and p99 of times"""
+    if len(times) < 2:
+        return {'p50': times[0], 'p90': times[0], 'p99': times[0]}
+    cuts = statistics.quantiles(times, n=100, method='inclusive')
+    return {'p50': cuts[49], 'p90': cuts[89], 'p99': cuts[98]}
+
+class Benchmark:
+    """A single benchmark on a file of a given size
+
+    run is timed, setup is called before every run on a fresh copy of the
+    source file (working_file). Benchmarks with operations > 1 time single
+    operations inside run and report latency percentiles of those.
+    """
+    name = None
+    operations = 1
+
+    def __init__(self, source_file: str, rows: int, work_dir: str):
+        self.source_file = source_file
+        self.rows = rows
+        self.working_file = os.path.join(work_dir, 'time.txt')
+        self.other_file = os.path.join(work_dir, 'other.txt')
+        self.latencies = []
+
+    def setup(self):
+        """Prepares the working file"""
+        shutil.copy(self.source_file, self.working_file)
+        helpers.delete_sidecars(self.working_file)
+
+    def run(self):
+        """The operation being measured"""
+        raise NotImplementedError
+
+    def timed(self, function, *args):
+        """Calls function, recording its latency"""
+        start = time.perf_counter()
+        result = function(*args)
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    def measure(self, repeat: int, memory: bool) -> dict:
+        """Runs the benchmark and returns its results"""
+        times = []
+        for _ in range(repeat):
+            self.setup()
+            times.extend(measure(self.run, 1))
+        seconds = statistics.median(times)
+        result = {
+            'name': self.name,
+            'rows': self.rows,
+            'seconds': seconds,
+            'rows_per_second': self.rows / seconds if self.operations == 1 and seconds else None,
+        }
+        if self.operations > 1:
+            result['operations'] = self.operations
+            result['operations_per_second'] = self.operations / seconds if seconds else None
+            result['latency'] = percentiles(self.latencies)
+        if memory:
+            self.setup()
+            result['peak_bytes'] = peak_memory(self.run)
+        return result
+
+class Read(Benchmark):
+    """TrackingFile.read"""
+    name = 'read'
+
+    def run(self):
+        timetracker.TrackingFile(self.working_file).read()
+
+class ReadParallel(Benchmark):
+    """read_columns_parallel on all cores, also for files below the threshold"""
+    name = 'read_parallel'
+
+    def run(self):
+        timetracker.read_columns_parallel(self.working_file, timetracker.Dialect, threshold=0)
+
+class Write(Benchmark):
+    """TrackingFile.write of a loaded file"""
+    name = 'write'
+
+    def setup(self):
+        super().setup()
+        self.tracking_file = timetracker.TrackingFile(self.working_file)
+        self.tracking_file.read()
+
+    def run(self):
+        self.tracking_file.write()
+
+class Format(Benchmark):
+    """TrackingFile.format with the default human readable format"""
+    name = 'format'
+
+    def setup(self):
+        super().setup()
+        self.tracking_file = timetracker.TrackingFile(self.working_file)
+        self.tracking_file.read()
+
+    def run(self):
+        self.tracking_file.format(timetracker.DEFAULT_HUMAN_DATETIME)
+
+class Save(Format):
+    """TrackingFile.save of a loaded file"""
+    name = 'save'
+
+    def run(self):
+        self.tracking_file.save(self.other_file)
+
+class Load(Benchmark):
+    """TrackingFile.load of a human readable file"""
+    name = 'load'
+
+    def setup(self):
+        super().setup()
+        if not os.path.exists(self.other_file):
+            timetracker.TrackingFile(self.working_file).save(self.other_file)
+
+    def run(self):
+        timetracker.TrackingFile(self.working_file).load(self.other_file)
+
+class Append(Benchmark):
+    """TrackingFile.append_direct of single rows"""
+    name = 'append'
+    operations = 200
+
+    def run(self):
+        tracking_file = timetracker.TrackingFile(self.working_file)
+        for _ in range(self.operations):
+            self.timed(tracking_file.append_direct, 'Benchmark:Append')
+
+def append_worker(file_name: str, count: int) -> list:
+    """Appends count rows from a worker process and returns the latencies"""
+    tracking_file = timetracker.TrackingFile(file_name)
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        tracking_file.append_direct('Benchmark:Parallel')
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+class ParallelAppend(Benchmark):
+    """TrackingFile.append_direct from several processes at once"""
+    name = 'parallel_append'
+    operations = 800
+    writers = 8
+
+    def setup(self):
+        super().setup()
+        # Started here, so that starting processes is not measured
+        self.pool = multiprocessing.Pool(self.writers)
+
+    def run(self):
+        count = self.operations // self.writers
+        try:
+            results = self.pool.starmap(append_worker, [(self.working_file, count)] * self.writers)
+        finally:
+            self.pool.close()
+            self.pool.join()
+        for latencies in results:
+            self.latencies.extend(latencies)
+
+class Tail(Benchmark):
+    """tt.py tail"""
+    name = 'tt_tail'
+    operations = 200
+
+    def run(self):
+        ttf = tt.TimeTrackingFile(file_name=self.working_file, raw_ts=True)
+        for _ in range(self.operations):
+            self.timed(ttf.tail, 10)
+
+class Insert(Benchmark):
+    """tt.py insert of back-dated rows in the last tenth of the file"""
+    name = 'tt_insert'
+    operations = 20
+
+    def setup(self):
+        super().setup()
+        self.timestamps = timetracker.tail_lines(self.working_file, max(self.rows // 10, 1))
+        self.timestamps = [int(line.split('\t')[0]) for line in self.timestamps]
+
+    def run(self):
+        ttf = tt.TimeTrackingFile(file_name=self.working_file, raw_ts=True)
+        step = max(len(self.timestamps) // self.operations, 1)
+        for timestamp in self.timestamps[::step][:self.operations]:
+            self.timed(ttf.insert, 'Benchmark:Insert', timestamp)
+
+class List(Benchmark):
+    """tt.py list"""
+    name = 'tt_list'
+
+    def run(self):
+        tt.TimeTrackingFile(file_name=self.working_file).list()
+
+BENCHMARKS = (Read, ReadParallel, Write, Format, Save, Load, Append, ParallelAppend, Tail, Insert, List)
+
+def run_benchmarks(sizes, names=None, repeat: int = 3, memory: bool = True,
+                   activities: int = DEFAULT_ACTIVITIES) -> dict:
+    """Runs benchmarks for every size and returns the report"""
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as work_dir:
+            source_file = helpers.write_example_data(os.path.join(work_dir, 'source.txt'),
+                                                     size, activities)
+            for benchmark in BENCHMARKS:
+                if names and benchmark.name not in names:
+                    continue
+                result = benchmark(source_file, size, work_dir).measure(repeat, memory)
+                print('{name:>10} {rows:>10} {seconds:10.4f}s'.format(**result), file=sys.stderr)
+                results.append(result)
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created': time.time(),
+        'results': results,
+    }
+
+def compare(report: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Returns results of report that are slower than in baseline by threshold"""
+    previous = {(result['name'], result['rows']): result for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        old = previous.get((result['name'], result['rows']))
+        if not old:
+            continue
+        ratio = result['seconds'] / old['seconds'] if old['seconds'] else 1.0
+        if ratio > threshold:
+            regressions.append({'name': result['name'], 'rows': result['rows'],
+                                'seconds': result['seconds'], 'baseline': old['seconds'],
+                                'ratio': ratio})
+    return regressions
+
+def main(argv=None):
+    """Runs the benchmarks from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma separated numbers of rows (10000 up to 100000000)')
+    parser.add_argument('--only', default='',
+                        help='comma separated benchmark names to run')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark')
+    parser.add_argument('--writers', type=int, default=ParallelAppend.writers,
+                        help='processes appending at once in parallel_append')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='do not measure peak memory (faster for big files)')
+    parser.add_argument('--output', help='file to write the JSON report to')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--save-baseline', help='store the report as baseline here')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown ratio counted as regression')
+    args = parser.parse_args(argv)
+    if args.baseline and not os.path.exists(args.baseline):
+        # Baselines depend on the machine, so none is committed
+        parser.error('baseline `{}` does not exist, store one on this machine first '
+                     '(--save-baseline or make bench-baseline)'.format(args.baseline))
+
+    ParallelAppend.writers = args.writers
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    names = [name for name in args.only.split(',') if name]
+    report = run_benchmarks(sizes, names, args.repeat, args.memory)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            report['regressions'] = compare(report, json.load(baseline_file), args.threshold)
+        status = 1 if report['regressions'] else 0
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            baseline_file.write(output)
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
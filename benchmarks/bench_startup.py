@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Benchmark of the start-up time of tt.py
+
+tt is run from prompt hooks and key bindings, where starting the interpreter
+and importing modules is most of the time a command takes. Every command is
+run in a fresh interpreter with `-X importtime`; the time spent importing is
+the sum of the self times reported, minus that of an interpreter that
+imports nothing. Wall times of the same commands (without -X importtime)
+are measured as well.
+
+The import time of every command has to stay within its budget in COMMANDS
+(multiplied by --budget-factor on slow machines); commands over budget are
+reported and the exit status is 1.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --repeat 20 --output startup.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from tests import helpers
+
+DEFAULT_ROWS = 10000
+# Names, arguments and budgets of the commands: milliseconds of imports
+# allowed on top of a bare interpreter. Appending also updates the activity
+# dictionary, which needs the csv and json modules.
+COMMANDS = (
+    ('tail', ['tail'], 5),
+    ('do', ['do', 'Work'], 20),
+    ('complete', ['complete', 'W'], 3),
+)
+
+def import_time(stderr: str) -> float:
+    """Sums up the self times (in ms) of an -X importtime report"""
+    total = 0
+    for line in stderr.splitlines():
+        if line.startswith('import time:'):
+            self_time = line.split('|')[0].split(':')[1].strip()
+            # Skips the header line
+            if self_time.isdigit():
+                total += int(self_time)
+    return total / 1000
+
+def run(argv: list, env: dict, importtime: bool = False):
+    """Runs a python command line, returns its wall time and stderr"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + argv
+    start = time.perf_counter()
+    process = subprocess.run(command, env=env, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    return time.perf_counter() - start, process.stderr
+
+def measure(argv: list, env: dict, repeat: int) -> dict:
+    """Returns median import and wall times (in ms) of a python command line"""
+    imports = [import_time(run(argv, env, importtime=True)[1]) for _ in range(repeat)]
+    walls = [run(argv, env)[0] * 1000 for _ in range(repeat)]
+    return {'import_ms': statistics.median(imports), 'wall_ms': statistics.median(walls)}
+
+def run_benchmarks(repeat: int, rows: int, budget_factor: float = 1) -> dict:
+    """Measures the start-up of all COMMANDS on a file of rows rows"""
+    with tempfile.TemporaryDirectory() as home:
+        # tt finds its file in ~/Cloud/tt without options, -d would need argparse
+        tt_dir = os.path.join(home, 'Cloud', 'tt')
+        os.makedirs(tt_dir)
+        helpers.write_example_data(os.path.join(tt_dir, 'time.txt'), rows, 50)
+        env = dict(os.environ, HOME=home)
+        # Installed modules have their bytecode compiled, compiling is not start-up
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        tt_script = os.path.join(ROOT, 'tt.py')
+        # Creates the sidecars, as they would exist after the first use, and
+        # the bytecode of all modules
+        run([tt_script, 'list'], env)
+        for _, argv, _ in COMMANDS:
+            run([tt_script] + argv, env)
+        bare = measure(['-c', 'pass'], env, repeat)
+        results = []
+        for name, argv, budget in COMMANDS:
+            result = measure([tt_script] + argv, env, repeat)
+            result['name'] = name
+            result['import_ms'] = max(result['import_ms'] - bare['import_ms'], 0)
+            result['budget_ms'] = budget * budget_factor
+            result['over_budget'] = result['import_ms'] > result['budget_ms']
+            results.append(result)
+    return {
+        'python': sys.version.split()[0],
+        'rows': rows,
+        'interpreter': bare,
+        'results': results,
+    }
+
+def main(argv=None):
+    """Runs the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=10, help='runs per command')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help='rows in the file')
+    parser.add_argument('--budget-factor', type=float, default=1,
+                        help='factor applied to the budgets of all commands')
+    parser.add_argument('--output', help='file to write the JSON report to')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.repeat, args.rows, args.budget_factor)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+    over = [result for result in report['results'] if result['over_budget']]
+    for result in over:
+        print('{name} over budget: {import_ms:.1f} ms > {budget_ms} ms'.format(**result),
+              file=sys.stderr)
+    return 1 if over else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,7 @@ import tempfile
 import time
 import os
 import random
+import glob
 from typing import List, Tuple
 
 def create_example_file(content: str) -> str:
@@ -44,6 +45,27 @@ def store_example_data(length: int, activities: int) -> str:
     chars = format_example_data(data)
     return create_example_file(chars)
 
+def write_example_data(file_name: str, length: int, activities: int,
+                       chunk_size: int = 100000) -> str:
+    """Writes sorted random data of given length to file_name, chunk by chunk.
+
+    Unlike store_example_data, the data is never held in memory as a whole, so
+    this also works for files with hundreds of millions of rows. Timestamps
+    start at 0 and increase by up to 15 minutes per row.
+    Returns file_name.
+    """
+    activities = [create_random_activity(length=5, depth=random.randint(1, 4))
+                  for i in range(0, activities)]
+    timestamp = 0
+    with open(file_name, 'w') as data_file:
+        for start in range(0, length, chunk_size):
+            rows = []
+            for _ in range(start, min(start + chunk_size, length)):
+                timestamp += random.randint(1, 900)
+                rows.append((timestamp, random.choice(activities)))
+            data_file.write(format_example_data(rows))
+    return file_name
+
 def create_no_file():
     """Creates no file, but returns the name of a temporary file which does not exist."""
     with tempfile.NamedTemporaryFile('w', delete=True) as temp:
@@ -56,6 +78,12 @@ def create_empty_file():
         name = temp.name
     return name
 
+def delete_sidecars(file_name: str):
+    """Deletes the sidecar files that timetracker created next to file_name"""
+    directory, base_name = os.path.split(file_name)
+    for sidecar in glob.glob(os.path.join(directory, '.{}.*'.format(glob.escape(base_name)))):
+        os.remove(sidecar)
+
 def create_sample_config():
     """Creates a random sample configuration file"""
     sample_file_content = [
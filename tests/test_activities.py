@@ -0,0 +1,94 @@
+"""Tests for the persistent activity dictionary"""
+#pylint: disable=invalid-name
+
+import os
+import unittest
+
+from .context import timetracker
+from . import helpers
+
+class TestActivityDictionary(unittest.TestCase):
+    """Test building and updating the activity dictionary"""
+
+    def setUp(self):
+        self.rows = [[0, 'Free'], [60, 'Work'], [120, 'Lunch'], [180, 'Work'], [240, 'Free']]
+        self.file_name = helpers.create_example_file(helpers.format_example_data(self.rows))
+        self.dialect = timetracker.Dialect
+
+    def tearDown(self):
+        helpers.delete_sidecars(self.file_name)
+        os.remove(self.file_name)
+
+    def dictionary(self):
+        """Returns the updated dictionary of the example file"""
+        return timetracker.ActivityDictionary(self.file_name).update(self.dialect)
+
+    def test_entries(self):
+        """Assert that counts and first and last use are recorded"""
+        activities = self.dictionary()
+        self.assertEqual(activities.names(), ['Free', 'Lunch', 'Work'])
+        self.assertEqual(activities['Work'], timetracker.ActivityEntry(2, 60, 180))
+        self.assertEqual(activities['Free'], timetracker.ActivityEntry(2, 0, 240))
+
+    def test_append(self):
+        """Assert that appends update the stored dictionary without a rebuild"""
+        self.dictionary()
+        tracking_file = timetracker.TrackingFile(self.file_name)
+        tracking_file.append_direct('Meeting', 300)
+        tracking_file.append_direct('Work', 360)
+        activities = timetracker.ActivityDictionary(self.file_name)
+        activities.load()
+        self.assertEqual(activities.offset, os.path.getsize(self.file_name))
+        self.assertEqual(activities['Meeting'], timetracker.ActivityEntry(1, 300, 300))
+        self.assertEqual(activities['Work'], timetracker.ActivityEntry(3, 60, 360))
+
+    def test_no_sidecar_on_append(self):
+        """Assert that appends do not create a dictionary"""
+        timetracker.TrackingFile(self.file_name).append_direct('Meeting', 300)
+        self.assertFalse(timetracker.ActivityDictionary(self.file_name).exists())
+
+    def test_external_edit(self):
+        """Assert that an edit outside of tt rebuilds the dictionary"""
+        self.dictionary()
+        self.rows[2][1] = 'Walk'
+        self.rows.append([300, 'Work'])
+        with open(self.file_name, 'w') as data_file:
+            data_file.write(helpers.format_example_data(self.rows))
+        activities = self.dictionary()
+        self.assertEqual(activities.names(), ['Free', 'Walk', 'Work'])
+        self.assertEqual(activities['Work'].count, 3)
+
+    def test_edit_and_append(self):
+        """Assert that an edit keeping the length of a line is noticed after growth"""
+        self.rows = [[timestamp, 'Wrok'] for timestamp in range(0, 120000, 60)]
+        with open(self.file_name, 'w') as data_file:
+            data_file.write(helpers.format_example_data(self.rows))
+        self.dictionary()
+        self.rows[0][1] = 'Work'
+        with open(self.file_name, 'w') as data_file:
+            data_file.write(helpers.format_example_data(self.rows))
+        timetracker.TrackingFile(self.file_name).append_direct('Free', 120000)
+        activities = timetracker.ActivityDictionary(self.file_name)
+        activities.load()
+        self.assertEqual(activities.names(), ['Free', 'Work', 'Wrok'])
+        self.assertEqual(activities['Work'].count, 1)
+
+    def test_unsorted(self):
+        """Assert that first and last use are the earliest and latest timestamps"""
+        with open(self.file_name, 'a') as data_file:
+            data_file.write('30\tWork\n')
+        self.assertEqual(self.dictionary()['Work'], timetracker.ActivityEntry(3, 30, 180))
+
+    def test_insert_and_append(self):
+        """Assert that an insertion before the parsed offset is noticed after growth"""
+        self.rows = [[timestamp, 'Work'] for timestamp in range(0, 60000, 60)]
+        with open(self.file_name, 'w') as data_file:
+            data_file.write(helpers.format_example_data(self.rows))
+        self.dictionary()
+        self.rows.insert(10, [570, 'Walk'])
+        self.rows.append([60000, 'Free'])
+        with open(self.file_name, 'w') as data_file:
+            data_file.write(helpers.format_example_data(self.rows))
+        activities = self.dictionary()
+        self.assertEqual(activities.names(), ['Free', 'Walk', 'Work'])
+        self.assertEqual(activities['Work'].count, 1000)
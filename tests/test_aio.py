@@ -0,0 +1,104 @@
+"""Tests for the asyncio interface of tracking files"""
+#pylint: disable=invalid-name
+
+import os
+import asyncio
+import threading
+import unittest
+
+from .context import timetracker
+from . import helpers
+
+class TestAsyncTrackingFile(unittest.TestCase):
+    """Test that AsyncTrackingFile behaves like TrackingFile"""
+
+    def setUp(self):
+        self.rows = [[0, 'Free'], [60, 'Work'], [120, 'Lunch'], [180, 'Work']]
+        self.file_name = helpers.create_example_file(helpers.format_example_data(self.rows))
+
+    def tearDown(self):
+        helpers.delete_sidecars(self.file_name)
+        os.remove(self.file_name)
+
+    def run_with_file(self, coroutine_function):
+        """Runs coroutine_function with an AsyncTrackingFile of the example file"""
+        async def main():
+            tracking_file = timetracker.AsyncTrackingFile(self.file_name)
+            try:
+                return await coroutine_function(tracking_file)
+            finally:
+                await tracking_file.close()
+        return asyncio.run(main())
+
+    def read_sync(self):
+        """Returns the rows of the example file as read by TrackingFile"""
+        tracking_file = timetracker.TrackingFile(self.file_name)
+        tracking_file.read()
+        return tracking_file.data
+
+    def test_read(self):
+        """Assert that reading gives the same data as TrackingFile"""
+        async def read(tracking_file):
+            await tracking_file.read()
+            return tracking_file.data, await tracking_file.tail(2)
+        data, tail = self.run_with_file(read)
+        self.assertEqual(data, self.rows)
+        self.assertEqual(tail, self.rows[-2:])
+
+    def test_iter_rows(self):
+        """Assert that streaming yields all rows, over several batches"""
+        async def collect(tracking_file):
+            return [row async for row in tracking_file]
+        batch_rows = timetracker.aio.BATCH_ROWS
+        timetracker.aio.BATCH_ROWS = 3
+        try:
+            self.assertEqual(self.run_with_file(collect), self.rows)
+        finally:
+            timetracker.aio.BATCH_ROWS = batch_rows
+
+    def test_concurrent_appends(self):
+        """Assert that concurrent appends are all written, in order"""
+        async def append(tracking_file):
+            return await asyncio.gather(*(tracking_file.append_direct('Task {}'.format(i), 300 + i)
+                                          for i in range(50)))
+        rows = self.run_with_file(append)
+        self.assertEqual(rows, [[300 + i, 'Task {}'.format(i)] for i in range(50)])
+        self.assertEqual(self.read_sync(), self.rows + rows)
+
+    def test_cancelled_append(self):
+        """Assert that cancelling the append writing a batch still writes all of it"""
+        async def append(tracking_file):
+            started, release = threading.Event(), threading.Event()
+            write_lines = tracking_file.write_lines
+            def blocking_write_lines(lines):
+                started.set()
+                release.wait()
+                write_lines(lines)
+            tracking_file.write_lines = blocking_write_lines
+            loop = asyncio.get_running_loop()
+            async with tracking_file.append_lock:
+                appends = [asyncio.ensure_future(tracking_file.append_direct(
+                    'Task {}'.format(i), 300 + i)) for i in range(4)]
+                while len(tracking_file.pending) < len(appends):
+                    await asyncio.sleep(0.01)
+            # The first append takes the whole batch
+            await loop.run_in_executor(None, started.wait)
+            appends[0].cancel()
+            release.set()
+            rows = await asyncio.wait_for(asyncio.gather(*appends[1:]), 5)
+            with self.assertRaises(asyncio.CancelledError):
+                await appends[0]
+            return rows
+        rows = self.run_with_file(append)
+        self.assertEqual(rows, [[300 + i, 'Task {}'.format(i)] for i in range(1, 4)])
+        self.assertEqual(self.read_sync(), self.rows + [[300, 'Task 0']] + rows)
+
+    def test_context(self):
+        """Assert that async with reads and writes back like with"""
+        async def edit(tracking_file):
+            async with tracking_file:
+                tracking_file[2] = [120, 'Walk']
+                tracking_file.append('Free', 240)
+        self.run_with_file(edit)
+        self.assertEqual(self.read_sync(), [[0, 'Free'], [60, 'Work'], [120, 'Walk'],
+                                            [180, 'Work'], [240, 'Free']])
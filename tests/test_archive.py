@@ -0,0 +1,129 @@
+"""Tests for archiving closed periods into chunks"""
+#pylint: disable=invalid-name
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, date, timezone
+
+from .context import timetracker
+from . import helpers
+
+def utc(*args) -> int:
+    """Returns the timestamp of a date in UTC"""
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+class TestPeriods(unittest.TestCase):
+    """Test the calculation of period boundaries"""
+
+    def test_period_start(self):
+        """Assert that timestamps are rounded down to their period"""
+        timestamp = utc(2018, 5, 17, 13, 5)
+        self.assertEqual(timetracker.period_start(timestamp, 'day', timezone.utc),
+                         utc(2018, 5, 17))
+        self.assertEqual(timetracker.period_start(timestamp, 'week', timezone.utc),
+                         utc(2018, 5, 14))
+        self.assertEqual(timetracker.period_start(timestamp, 'month', timezone.utc),
+                         utc(2018, 5, 1))
+        self.assertEqual(timetracker.period_start(timestamp, 'year', timezone.utc),
+                         utc(2018, 1, 1))
+        with self.assertRaises(ValueError):
+            timetracker.period_start(timestamp, 'fortnight')
+
+    def test_next_period(self):
+        """Assert that the next period starts at the right time"""
+        next_period = timetracker.archive.next_period
+        self.assertEqual(next_period(utc(2018, 12, 1), 'month', timezone.utc), utc(2019, 1, 1))
+        self.assertEqual(next_period(utc(2018, 2, 28), 'day', timezone.utc), utc(2018, 3, 1))
+        self.assertEqual(next_period(utc(2018, 12, 31), 'week', timezone.utc), utc(2019, 1, 7))
+        self.assertEqual(next_period(utc(2018, 1, 1), 'year', timezone.utc), utc(2019, 1, 1))
+
+class TestArchive(unittest.TestCase):
+    """Test moving rows into the archive and querying them"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'time.txt')
+        self.manifest = os.path.join(self.directory, 'archive.txt')
+        self.rows = [[utc(2018, month, day, 12), 'Work' if day % 2 else 'Free']
+                     for month in (3, 4, 5) for day in (1, 10, 20)]
+        with open(self.file_name, 'w') as data_file:
+            data_file.write(helpers.format_example_data(self.rows))
+        self.archive = timetracker.Archive(self.manifest, tz_info=timezone.utc)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_archive(self):
+        """Assert that closed months are moved into chunks"""
+        moved = self.archive.archive(self.file_name, utc(2018, 5, 15))
+        self.assertEqual(moved, 6)
+        self.assertEqual([entry.chunk for entry in timetracker.Archive(self.manifest)],
+                         [os.path.join('archive', '2018-03.txt'),
+                          os.path.join('archive', '2018-04.txt')])
+        tracking_file = timetracker.TrackingFile(self.file_name)
+        tracking_file.read()
+        self.assertEqual(tracking_file.data, self.rows[6:])
+
+    def test_archive_again(self):
+        """Assert that archiving twice moves nothing and merges late rows"""
+        self.archive.archive(self.file_name, utc(2018, 5, 15))
+        self.assertEqual(self.archive.archive(self.file_name, utc(2018, 5, 15)), 0)
+        timetracker.insert_lines(self.file_name, [(utc(2018, 4, 2), '{}\tLate\n'
+                                                   .format(utc(2018, 4, 2)))])
+        self.assertEqual(self.archive.archive(self.file_name, utc(2018, 5, 15)), 1)
+        entry = self.archive.entries[1]
+        self.assertEqual(entry.count, 4)
+
+    def test_between(self):
+        """Assert that range queries only open overlapping chunks"""
+        self.archive.archive(self.file_name, utc(2018, 5, 15))
+        entries = self.archive.chunks_between(utc(2018, 4, 5), utc(2018, 5, 15))
+        self.assertEqual(len(entries), 1)
+        os.remove(self.archive.chunk_path(self.archive.entries[0]))
+        rows = self.archive.between(utc(2018, 4, 5), utc(2018, 5, 15), self.file_name)
+        self.assertEqual(rows, self.rows[4:8])
+
+    def test_duplicates(self):
+        """Assert that merging into a chunk keeps rows that are in it twice"""
+        with open(self.file_name, 'w') as data_file:
+            data_file.write(helpers.format_example_data(self.rows[:1] + self.rows))
+        self.archive.archive(self.file_name, utc(2018, 5, 15))
+        timetracker.insert_lines(self.file_name, [(utc(2018, 3, 2), '{}\tLate\n'
+                                                   .format(utc(2018, 3, 2)))])
+        self.archive.archive(self.file_name, utc(2018, 5, 15))
+        entry = self.archive.entries[0]
+        self.assertEqual(entry.count, 5)
+        chunk = timetracker.TrackingFile(self.archive.chunk_path(entry))
+        chunk.read()
+        self.assertEqual(chunk.data, self.rows[:1] + self.rows[:1]
+                         + [[utc(2018, 3, 2), 'Late']] + self.rows[1:3])
+
+    def test_readers(self):
+        """Assert that reports, totals and activities include archived rows"""
+        day = date(2018, 4, 10).toordinal()
+        def read():
+            archive = timetracker.Archive(self.manifest, tz_info=timezone.utc)
+            tracking_file = timetracker.TrackingFile(self.file_name)
+            tracking_file.data = archive.between(file_name=self.file_name)
+            report = list(tracking_file.report('month', tz_info=timezone.utc).rows())
+            cache = timetracker.AggregateCache(self.file_name, timezone.utc, self.manifest)
+            activities = timetracker.ActivityDictionary(self.file_name, self.manifest)
+            activities.update(timetracker.Dialect)
+            return (report, cache.update().totals(now=utc(2018, 6, 1)),
+                    cache.totals(day, day),
+                    dict(activities.entries))
+        before = read()
+        self.archive.archive(self.file_name, utc(2018, 5, 15))
+        self.assertEqual(read(), before)
+        self.assertEqual(read(), before)
+        self.archive.archive(self.file_name, utc(2018, 6, 15))
+        self.assertEqual(read(), before)
+        with open(self.file_name, 'a') as data_file:
+            data_file.write('{}\tLunch\n'.format(utc(2018, 5, 31)))
+        report, totals, _, activities = read()
+        self.assertEqual(report[:4], before[0][:4])
+        self.assertEqual(totals['Lunch'], [utc(2018, 6, 1) - utc(2018, 5, 31), 1])
+        self.assertEqual(totals['Work'], before[1]['Work'])
+        self.assertEqual(activities['Lunch'].count, 1)
@@ -0,0 +1,93 @@
+"""Tests for the binary storage of tracking data"""
+#pylint: disable=invalid-name
+
+import os
+import unittest
+
+from .context import timetracker
+from . import helpers
+
+class TestBinaryFile(unittest.TestCase):
+    """Test reading, writing and appending binary files"""
+
+    def setUp(self):
+        self.file_name = helpers.create_example_file('')
+        os.remove(self.file_name)
+        self.rows = [[0, 'Free'], [60, 'Work:Writing'], [120, 'Free'], [180, 'Café\n"x"']]
+
+    def tearDown(self):
+        for name in (self.file_name, timetracker.binary.dictionary_name(self.file_name)):
+            if os.path.exists(name):
+                os.remove(name)
+
+    def test_round_trip(self):
+        """Assert that written rows are read back unchanged"""
+        timetracker.write_binary(self.file_name, self.rows)
+        self.assertTrue(timetracker.binary.is_binary(self.file_name))
+        self.assertEqual(os.path.getsize(self.file_name), 8 + 12 * len(self.rows))
+        self.assertEqual(timetracker.read_binary(self.file_name), self.rows)
+
+    def test_append(self):
+        """Assert that appending creates the file and extends the dictionary"""
+        timetracker.append_binary(self.file_name, self.rows[:2])
+        timetracker.append_binary(self.file_name, self.rows[2:])
+        self.assertEqual(timetracker.read_binary(self.file_name), self.rows)
+        self.assertEqual(len(timetracker.binary.load_dictionary(self.file_name)), 3)
+
+    def test_incomplete_record(self):
+        """Assert that an interrupted append does not break the file"""
+        timetracker.write_binary(self.file_name, self.rows[:2])
+        with open(self.file_name, 'ab') as data_file:
+            data_file.write(b'\x01\x02\x03')
+        self.assertEqual(timetracker.read_binary(self.file_name), self.rows[:2])
+        timetracker.append_binary(self.file_name, self.rows[2:])
+        self.assertEqual(timetracker.read_binary(self.file_name), self.rows)
+
+    def test_extra_fields(self):
+        """Assert that rows with extra fields are refused"""
+        with self.assertRaises(ValueError):
+            timetracker.write_binary(self.file_name, [[0, 'a', 'extra']])
+
+    def test_not_binary(self):
+        """Assert that text files are not read as binary"""
+        with open(self.file_name, 'w') as data_file:
+            data_file.write('0\tFree\n')
+        with self.assertRaises(ValueError):
+            timetracker.read_binary(self.file_name)
+
+class TestBinaryTrackingFile(unittest.TestCase):
+    """Test the TrackingFile interface on binary files"""
+
+    def setUp(self):
+        self.text_name = helpers.store_example_data(300, 10)
+        self.binary_name = self.text_name + '.bin'
+        self.other_name = self.text_name + '.txt'
+
+    def tearDown(self):
+        for name in (self.text_name, self.binary_name, self.other_name,
+                     timetracker.binary.dictionary_name(self.binary_name)):
+            helpers.delete_sidecars(name)
+            if os.path.exists(name):
+                os.remove(name)
+
+    def test_conversion(self):
+        """Assert that text to binary to text is lossless"""
+        timetracker.text_to_binary(self.text_name, self.binary_name)
+        timetracker.binary_to_text(self.binary_name, self.other_name)
+        with open(self.text_name) as original, open(self.other_name) as converted:
+            self.assertEqual(original.read(), converted.read())
+
+    def test_tracking_file(self):
+        """Assert that reading, tail and appending work like on text files"""
+        timetracker.text_to_binary(self.text_name, self.binary_name)
+        text = timetracker.TrackingFile(self.text_name)
+        text.read()
+        binary = timetracker.BinaryTrackingFile(self.binary_name)
+        binary.read()
+        self.assertEqual(binary.data, text.data)
+        self.assertEqual(binary.tail(3), text.tail(3))
+        self.assertEqual(binary.format('%F %T'), text.format('%F %T'))
+        binary.append_direct('New:Activity', 10**10)
+        self.assertEqual(binary.tail(1), [[10**10, 'New:Activity']])
+        binary.read()
+        self.assertEqual(len(binary.data), 301)
@@ -0,0 +1,126 @@
+"""Tests for the incremental aggregate cache"""
+#pylint: disable=invalid-name
+
+import os
+import unittest
+from datetime import datetime, timezone, timedelta
+
+from .context import timetracker
+from . import helpers
+
+def utc(*args) -> int:
+    """Returns the timestamp of a date in UTC"""
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+def segment_totals(rows, now=None) -> dict:
+    """Sums up the segments of rows per activity the slow way"""
+    totals = {}
+    for (start, activity), (end, _) in zip(rows, rows[1:]):
+        total = totals.setdefault(activity, [0, 0])
+        total[0] += end - start
+        total[1] += 1
+    if now is not None and rows:
+        total = totals.setdefault(rows[-1][1], [0, 0])
+        total[0] += now - rows[-1][0]
+        total[1] += 1
+    return totals
+
+class TestAggregateCache(unittest.TestCase):
+    """Test totals from the cache and their incremental updates"""
+
+    def setUp(self):
+        self.rows = [[utc(2018, 5, day, hour), activity]
+                     for day in range(1, 11)
+                     for hour, activity in ((8, 'Work:Mail'), (9, 'Work:Code'), (12, 'Lunch'),
+                                            (13, 'Work:Code'), (18, 'Free'))]
+        self.file_name = helpers.create_example_file(helpers.format_example_data(self.rows))
+
+    def tearDown(self):
+        helpers.delete_sidecars(self.file_name)
+        os.remove(self.file_name)
+
+    def cache(self, tz_info=timezone.utc):
+        """Returns an updated cache of the example file"""
+        return timetracker.AggregateCache(self.file_name, tz_info).update()
+
+    def append(self, rows):
+        """Appends rows to the example file"""
+        with open(self.file_name, 'a') as data_file:
+            data_file.write(helpers.format_example_data(rows))
+        self.rows.extend(rows)
+
+    def test_totals(self):
+        """Assert that the totals are the sums of the segments"""
+        now = utc(2018, 5, 11)
+        self.assertEqual(self.cache().totals(), segment_totals(self.rows))
+        self.assertEqual(self.cache().totals(now=now), segment_totals(self.rows, now))
+
+    def test_days(self):
+        """Assert that segments count on the day they start"""
+        day = datetime(2018, 5, 3).toordinal()
+        totals = self.cache().totals(day, day)
+        self.assertEqual(totals['Free'], [14 * 3600, 1])
+        self.assertEqual(totals['Work:Code'], [8 * 3600, 2])
+        self.assertEqual(self.cache().totals(day, day, now=utc(2018, 5, 11)), totals)
+
+    def test_append(self):
+        """Assert that appended rows are added to stored totals"""
+        self.cache()
+        self.append([[utc(2018, 5, 11, 8), 'Work:Mail'], [utc(2018, 5, 11, 9), 'Meeting']])
+        cache = timetracker.AggregateCache(self.file_name, timezone.utc)
+        cache.load()
+        offset = cache.offset
+        cache.update()
+        self.assertGreater(cache.offset, offset)
+        self.assertEqual(cache.totals(), segment_totals(self.rows))
+        self.assertEqual(cache.offset, os.path.getsize(self.file_name))
+
+    def test_incomplete_line(self):
+        """Assert that a line without newline is left for later"""
+        self.cache()
+        with open(self.file_name, 'a') as data_file:
+            data_file.write('{}\tWork'.format(utc(2018, 5, 11)))
+        self.assertEqual(self.cache().totals(), segment_totals(self.rows))
+        with open(self.file_name, 'a') as data_file:
+            data_file.write(':Mail\n')
+        self.rows.append([utc(2018, 5, 11), 'Work:Mail'])
+        self.assertEqual(self.cache().totals(), segment_totals(self.rows))
+
+    def test_edit(self):
+        """Assert that an edit rebuilds from the day before it, not from scratch"""
+        cache = self.cache()
+        checkpoints = len(cache.checkpoint_offsets)
+        self.rows[27][1] = 'Work:Review'
+        with open(self.file_name, 'w') as data_file:
+            data_file.write(helpers.format_example_data(self.rows))
+        cache = timetracker.AggregateCache(self.file_name, timezone.utc)
+        cache.load()
+        self.assertEqual(cache.first_changed(), 5)
+        cache.update()
+        self.assertEqual(cache.totals(), segment_totals(self.rows))
+        self.assertEqual(len(cache.checkpoint_offsets), checkpoints)
+
+    def test_truncate(self):
+        """Assert that removed rows are removed from the totals"""
+        self.cache()
+        del self.rows[-7:]
+        with open(self.file_name, 'w') as data_file:
+            data_file.write(helpers.format_example_data(self.rows))
+        self.assertEqual(self.cache().totals(), segment_totals(self.rows))
+
+    def test_time_zone(self):
+        """Assert that a cache of another time zone is rebuilt"""
+        self.cache()
+        day = datetime(2018, 5, 3).toordinal()
+        cache = self.cache(timezone(timedelta(hours=8)))
+        # 18:00 UTC is 02:00 of the next day
+        self.assertEqual(cache.totals(day, day)['Free'], [14 * 3600, 1])
+        self.assertEqual(cache.totals(day + 1, day + 1)['Lunch'], [3600, 1])
+        self.assertEqual(cache.totals(), segment_totals(self.rows))
+
+    def test_tree(self):
+        """Assert that the tree sums up along the hierarchy"""
+        tree = self.cache().tree()
+        self.assertEqual(tree.root.children['Work'].total,
+                         sum(total[0] for activity, total in segment_totals(self.rows).items()
+                             if activity.startswith('Work')))
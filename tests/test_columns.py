@@ -0,0 +1,92 @@
+"""Tests for the column-wise storage and its range queries"""
+#pylint: disable=invalid-name
+
+import unittest
+
+from .context import timetracker
+
+class TestColumnsSorted(unittest.TestCase):
+    """Test that Columns keeps track of being sorted"""
+
+    def setUp(self):
+        self.data = timetracker.Columns([[0, 'a'], [10, 'b'], [20, 'c']])
+
+    def test_sorted_after_appends(self):
+        """Assert that appending in order keeps the data sorted"""
+        self.data.append([30, 'd'])
+        self.assertTrue(self.data.is_sorted)
+
+    def test_unsorted_after_append(self):
+        """Assert that appending out of order unsorts the data"""
+        self.data.append([5, 'd'])
+        self.assertFalse(self.data.is_sorted)
+
+    def test_sorted_recomputed(self):
+        """Assert that sortedness is recomputed after replacing rows"""
+        self.data[1] = [15, 'x']
+        self.assertTrue(self.data.is_sorted)
+        self.data[1] = [25, 'x']
+        self.assertFalse(self.data.is_sorted)
+
+    def test_reversed_slice(self):
+        """Assert that reversed slices are not sorted"""
+        self.assertFalse(self.data[::-1].is_sorted)
+
+class TestColumnsBetween(unittest.TestCase):
+    """Test the range queries between and at"""
+
+    def setUp(self):
+        self.rows = [[i * 10, 'a' if i % 2 else 'b'] for i in range(20)]
+        self.data = timetracker.Columns(self.rows)
+
+    def test_between_is_view(self):
+        """Assert that between returns a view on sorted data"""
+        view = self.data.between(25, 60)
+        self.assertIsInstance(view, timetracker.ColumnsView)
+        self.assertEqual(view, self.rows[3:6])
+
+    def test_between_bounds(self):
+        """Assert that start is included and end is excluded"""
+        self.assertEqual(self.data.between(30, 60), self.rows[3:6])
+        self.assertEqual(len(self.data.between(500, 600)), 0)
+        self.assertEqual(len(self.data.between(60, 30)), 0)
+
+    def test_view_columns(self):
+        """Assert that the columns of a view are the columns of the range"""
+        view = self.data.between(30, 60)
+        self.assertEqual(view.timestamps.tolist(), [30, 40, 50])
+        self.assertEqual(view.activities, ['a', 'b', 'a'])
+        self.assertEqual(view[-1], [50, 'a'])
+        self.assertEqual(view[1:], self.rows[4:6])
+
+    def test_view_iteration(self):
+        """Assert that iterating a view yields only its rows, with extra fields"""
+        self.data.append([200, 'c', 'note'])
+        view = timetracker.ColumnsView(self.data, 18, 21)
+        self.assertEqual(list(view), [self.rows[18], self.rows[19], [200, 'c', 'note']])
+        self.assertEqual(list(timetracker.ColumnsView(self.data, 19, 40)),
+                         [self.rows[19], [200, 'c', 'note']])
+
+    def test_view_segments(self):
+        """Assert that views can be turned into segments"""
+        segments = timetracker.segmentify(self.data.between(30, 60), now=60)
+        self.assertEqual(list(segments.duration), [10, 10, 10])
+
+    def test_between_unsorted(self):
+        """Assert that unsorted data is filtered instead"""
+        self.data.append([35, 'c'])
+        rows = self.data.between(30, 40)
+        self.assertIsInstance(rows, timetracker.Columns)
+        self.assertEqual(rows, [[30, 'a'], [35, 'c']])
+
+    def test_at(self):
+        """Assert that at returns the row going on at a timestamp"""
+        self.assertEqual(self.data.at(35), [30, 'a'])
+        self.assertEqual(self.data.at(30), [30, 'a'])
+        self.assertIsNone(self.data.at(-1))
+
+    def test_at_unsorted(self):
+        """Assert that at works on unsorted data"""
+        self.data.append([35, 'c'])
+        self.assertEqual(self.data.at(37), [35, 'c'])
+        self.assertEqual(self.data.at(1000), [190, 'a'])
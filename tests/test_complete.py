@@ -0,0 +1,75 @@
+"""Tests for completion of activities"""
+#pylint: disable=invalid-name
+
+import os
+import unittest
+
+from .context import timetracker
+from . import helpers
+
+DAY = 86400
+
+class TestRanking(unittest.TestCase):
+    """Test ranking of the children of trie nodes"""
+
+    def test_frequency(self):
+        """Assert that activities used more often come first"""
+        entries = {
+            'Work:Code': timetracker.ActivityEntry(10, 0, 100 * DAY),
+            'Work:Mail': timetracker.ActivityEntry(20, 0, 100 * DAY),
+            'Free': timetracker.ActivityEntry(5, 0, 100 * DAY),
+        }
+        children = timetracker.rank_children(entries, now=100 * DAY)
+        self.assertEqual(children[''], ['Work', 'Free'])
+        self.assertEqual(children['Work'], ['Work:Mail', 'Work:Code'])
+
+    def test_recency(self):
+        """Assert that activities not used for long fall behind"""
+        entries = {
+            'Old': timetracker.ActivityEntry(20, 0, 0),
+            'New': timetracker.ActivityEntry(10, 0, 100 * DAY),
+        }
+        self.assertEqual(timetracker.rank_children(entries, now=100 * DAY)[''], ['New', 'Old'])
+
+class TestComplete(unittest.TestCase):
+    """Test completing from the stored trie"""
+
+    def setUp(self):
+        rows = [[0, 'Work:Code'], [60, 'Work:Mail'], [120, 'Work:Code:Review'],
+                [180, 'Work:Code'], [240, 'Free']]
+        self.file_name = helpers.create_example_file(helpers.format_example_data(rows))
+
+    def tearDown(self):
+        helpers.delete_sidecars(self.file_name)
+        os.remove(self.file_name)
+
+    def test_segments(self):
+        """Assert that only the next segment is completed"""
+        self.assertEqual(timetracker.complete(self.file_name), ['Work', 'Free'])
+        self.assertEqual(timetracker.complete(self.file_name, 'W'), ['Work'])
+        self.assertEqual(timetracker.complete(self.file_name, 'Work:'),
+                         ['Work:Code', 'Work:Mail'])
+        self.assertEqual(timetracker.complete(self.file_name, 'Work:Code:'),
+                         ['Work:Code:Review'])
+        self.assertEqual(timetracker.complete(self.file_name, 'Lunch:'), [])
+
+    def test_stored(self):
+        """Assert that completions are answered from the sidecar"""
+        self.assertIsNone(timetracker.load_completions(self.file_name, 'Work:'))
+        timetracker.complete(self.file_name)
+        self.assertEqual(timetracker.load_completions(self.file_name, 'Work:M'), ['Work:Mail'])
+
+    def test_append(self):
+        """Assert that appends keep the completions up to date"""
+        timetracker.complete(self.file_name)
+        timetracker.TrackingFile(self.file_name).append_direct('Work:Meeting', 300)
+        self.assertEqual(timetracker.load_completions(self.file_name, 'Work:Me'),
+                         ['Work:Meeting'])
+
+    def test_external_edit(self):
+        """Assert that stale completions are not used"""
+        timetracker.complete(self.file_name)
+        with open(self.file_name, 'a') as data_file:
+            data_file.write('300\tLunch\n')
+        self.assertIsNone(timetracker.load_completions(self.file_name, 'L'))
+        self.assertEqual(timetracker.complete(self.file_name, 'L'), ['Lunch'])
@@ -0,0 +1,124 @@
+"""Tests for the daemon and its client"""
+#pylint: disable=invalid-name
+
+import os
+import socket
+import threading
+import unittest
+
+from .context import timetracker
+from . import helpers
+
+class TestDaemon(unittest.TestCase):
+    """Test answering requests from a running daemon"""
+
+    def setUp(self):
+        self.rows = [[0, 'Free'], [60, 'Work:Code'], [120, 'Lunch'], [180, 'Work:Mail']]
+        self.file_name = helpers.create_example_file(helpers.format_example_data(self.rows))
+        self.daemon = timetracker.Daemon(self.file_name)
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+        self.daemon.server_close()
+        helpers.delete_sidecars(self.file_name)
+        os.remove(self.file_name)
+
+    def request(self, command, *args):
+        """Sends a request to the daemon of the example file"""
+        return timetracker.request(self.file_name, command, *args)
+
+    def test_ping(self):
+        """Assert that the daemon answers"""
+        self.assertEqual(self.request('ping'), 'pong')
+
+    def test_append(self):
+        """Assert that appends are written through to the file"""
+        self.assertEqual(self.request('append', 'Meeting', 240), '240\tMeeting\n')
+        with open(self.file_name) as data_file:
+            self.assertEqual(data_file.readlines()[-1], '240\tMeeting\n')
+        self.assertEqual(self.request('tail', 2), '180\tWork:Mail\n240\tMeeting')
+        activities = timetracker.ActivityDictionary(self.file_name)
+        activities.load()
+        self.assertIn('Meeting', activities)
+
+    def test_list(self):
+        """Assert that list follows appends of other processes"""
+        self.assertEqual(self.request('list'), 'Free\nLunch\nWork:Code\nWork:Mail')
+        timetracker.TrackingFile(self.file_name).append_direct('Walk', 240)
+        self.assertIn('Walk', self.request('list').split('\n'))
+        self.assertEqual(self.request('complete', 'Wo'), 'Work')
+
+    def test_error(self):
+        """Assert that failed commands raise DaemonError and keep the daemon running"""
+        with self.assertRaises(timetracker.DaemonError):
+            self.request('fly')
+        with self.assertRaises(timetracker.DaemonError):
+            self.request('tail', 'many')
+        self.assertEqual(self.request('ping'), 'pong')
+
+    def test_stalled_client(self):
+        """Assert that a client that sends nothing does not block the others"""
+        self.daemon.request_timeout = 0.1
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stalled:
+            stalled.connect(timetracker.client.socket_name(self.file_name))
+            self.assertEqual(timetracker.request(self.file_name, 'ping', timeout=2), 'pong')
+            self.assertEqual(stalled.recv(1), b'')
+
+    def test_second_daemon(self):
+        """Assert that a second daemon for the same file is refused"""
+        with self.assertRaises(timetracker.DaemonError):
+            timetracker.Daemon(self.file_name)
+
+
+class TestNoDaemon(unittest.TestCase):
+    """Test the client without a running daemon"""
+
+    def setUp(self):
+        self.file_name = helpers.create_example_file(helpers.format_example_data([[0, 'Free']]))
+
+    def tearDown(self):
+        helpers.delete_sidecars(self.file_name)
+        os.remove(self.file_name)
+
+    def test_unavailable(self):
+        """Assert that DaemonUnavailable is raised without a daemon"""
+        with self.assertRaises(timetracker.DaemonUnavailable):
+            timetracker.request(self.file_name, 'ping')
+
+    def test_stale_socket(self):
+        """Assert that the socket of a stopped daemon is replaced"""
+        daemon = timetracker.Daemon(self.file_name)
+        daemon.socket.close()
+        with self.assertRaises(timetracker.DaemonUnavailable):
+            timetracker.request(self.file_name, 'ping')
+        with timetracker.Daemon(self.file_name) as daemon:
+            thread = threading.Thread(target=daemon.serve_forever)
+            thread.start()
+            self.assertEqual(timetracker.request(self.file_name, 'stop'), 'stopped')
+            thread.join()
+        self.assertFalse(os.path.exists(timetracker.client.socket_name(self.file_name)))
+
+    def test_no_answer(self):
+        """Assert that a daemon that does not answer raises DaemonNoAnswer"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(timetracker.client.socket_name(self.file_name))
+            server.listen()
+            try:
+                with self.assertRaises(timetracker.DaemonNoAnswer):
+                    timetracker.request(self.file_name, 'ping', timeout=0.1)
+            finally:
+                os.remove(timetracker.client.socket_name(self.file_name))
+
+    def test_unreachable(self):
+        """Assert that sockets that cannot be connected to count as no daemon"""
+        name = timetracker.client.socket_name(self.file_name)
+        with open(name, 'w'):
+            pass
+        try:
+            with self.assertRaises(timetracker.DaemonUnavailable):
+                timetracker.request(self.file_name, 'ping')
+        finally:
+            os.remove(name)
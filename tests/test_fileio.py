@@ -0,0 +1,220 @@
+"""Tests for the low-level file access functions"""
+#pylint: disable=invalid-name
+
+import os
+import unittest
+
+from .context import timetracker
+from . import helpers
+
+import tt
+
+class TestTailLines(unittest.TestCase):
+    """Test tail_lines, the backwards-reading tail engine
+
+    Small block sizes are used to force several blocks to be read.
+    """
+
+    def setUp(self):
+        self.data = helpers.create_example_data(50, 5)
+        self.file = helpers.create_example_file(helpers.format_example_data(self.data))
+        self.lines = ['{}\t{}'.format(*row) for row in self.data]
+
+    def tearDown(self):
+        os.remove(self.file)
+
+    def test_tail_is_last_lines(self):
+        """Assert that the last lines of the file are returned"""
+        self.assertEqual(timetracker.tail_lines(self.file, 5), self.lines[-5:])
+
+    def test_tail_small_blocks(self):
+        """Assert that block sizes smaller than a line give the same result"""
+        self.assertEqual(timetracker.tail_lines(self.file, 7, block_size=3), self.lines[-7:])
+
+    def test_tail_more_than_file(self):
+        """Assert that asking for more lines than available returns the whole file"""
+        self.assertEqual(timetracker.tail_lines(self.file, 100, block_size=16), self.lines)
+
+    def test_tail_zero(self):
+        """Assert that no lines are returned for a count of zero"""
+        self.assertEqual(timetracker.tail_lines(self.file, 0), [])
+
+    def test_tail_no_final_newline(self):
+        """Assert that a missing final newline does not lose the last line"""
+        with open(self.file, 'a') as f:
+            f.write('1\tLast')
+        self.assertEqual(timetracker.tail_lines(self.file, 2, block_size=5),
+                         [self.lines[-1], '1\tLast'])
+
+    def test_tail_empty_file(self):
+        """Assert that an empty file has no lines"""
+        open(self.file, 'w').close()
+        self.assertEqual(timetracker.tail_lines(self.file, 3), [])
+
+class TestParseChunk(unittest.TestCase):
+    """Test the chunked parser for the canonical format and its fallback"""
+
+    def setUp(self):
+        self.dialect = timetracker.Dialect
+
+    def test_canonical(self):
+        """Assert that canonical lines are parsed"""
+        columns = timetracker.parse_chunk(b'1\tWork:A\n2\tFree\n3\tWork:A\n', self.dialect)
+        self.assertEqual(columns, [[1, 'Work:A'], [2, 'Free'], [3, 'Work:A']])
+        self.assertEqual(columns.dictionary, ['Work:A', 'Free'])
+
+    def test_crlf_and_missing_newline(self):
+        """Assert that CRLF line endings and a missing final newline are handled"""
+        columns = timetracker.parse_chunk(b'1\tWork\r\n2\tFree', self.dialect)
+        self.assertEqual(columns, [[1, 'Work'], [2, 'Free']])
+
+    def test_quoted_falls_back(self):
+        """Assert that quoted fields are parsed by csv"""
+        columns = timetracker.parse_chunk(b'1\t"Work\tHome"\n2\tFree\n', self.dialect)
+        self.assertEqual(columns, [[1, 'Work\tHome'], [2, 'Free']])
+
+    def test_extra_fields_fall_back(self):
+        """Assert that lines with more fields keep them"""
+        columns = timetracker.parse_chunk(b'1\tWork\tlaptop\n2\tFree\n', self.dialect)
+        self.assertEqual(columns, [[1, 'Work', 'laptop'], [2, 'Free']])
+
+    def test_malformed_not_misparsed(self):
+        """Assert that a line without activity next to one with two tabs is not split wrongly"""
+        with self.assertRaises(IndexError):
+            timetracker.parse_chunk(b'1\t2\t3\n4\n', self.dialect)
+
+    def test_non_canonical_dialect(self):
+        """Assert that other dialects go through csv"""
+        dialect = timetracker.sniff_dialect(b'1,Work\n2,Free\n')
+        columns = timetracker.parse_chunk(b'1,Work\n2,Free\n', dialect)
+        self.assertEqual(columns, [[1, 'Work'], [2, 'Free']])
+
+class TestReadColumns(unittest.TestCase):
+    """Test reading files in chunks"""
+
+    def setUp(self):
+        self.data = helpers.create_example_data(200, 7)
+        self.file = helpers.create_example_file(helpers.format_example_data(self.data))
+
+    def tearDown(self):
+        os.remove(self.file)
+
+    def test_small_chunks(self):
+        """Assert that chunk boundaries do not change the result"""
+        columns = timetracker.read_columns(self.file, timetracker.Dialect, chunk_size=7)
+        self.assertEqual(columns, [list(row) for row in self.data])
+
+    def test_chunks_are_lines(self):
+        """Assert that chunks always end with a complete line"""
+        chunks = list(timetracker.iter_chunks(self.file, chunk_size=100))
+        self.assertTrue(all(chunk.endswith(b'\n') for chunk in chunks))
+        with open(self.file, 'rb') as f:
+            self.assertEqual(b''.join(chunks), f.read())
+
+class TestInsertLines(unittest.TestCase):
+    """Test bisect_file and insert_lines on sorted files"""
+
+    def setUp(self):
+        self.data = [(i * 10, 'a{}'.format(i)) for i in range(1, 41)]
+        self.file = helpers.create_example_file(helpers.format_example_data(self.data))
+
+    def tearDown(self):
+        os.remove(self.file)
+
+    def read(self):
+        """Reads the file as rows"""
+        with open(self.file, 'r') as f:
+            return [(int(line.split('\t')[0]), line.split('\t')[1].strip()) for line in f]
+
+    def test_bisect_matches_bisect(self):
+        """Assert that the offset found is after the last line not greater than timestamp"""
+        with open(self.file, 'rb') as f:
+            content = f.read()
+        for timestamp in (-5, 0, 10, 15, 200, 399, 400, 401, 1000):
+            offset = timetracker.bisect_file(self.file, timestamp)
+            before = [line for line in content[:offset].split(b'\n') if line]
+            after = [line for line in content[offset:].split(b'\n') if line]
+            self.assertTrue(all(int(line.split(b'\t')[0]) <= timestamp for line in before))
+            self.assertTrue(all(int(line.split(b'\t')[0]) > timestamp for line in after))
+
+    def test_insert_keeps_order(self):
+        """Assert that several inserted rows end up in order"""
+        rows = [(155, 'x'), (5, 'y'), (400, 'z'), (1000, 'w')]
+        timetracker.insert_lines(self.file, [(ts, '{}\t{}\n'.format(ts, act)) for ts, act in rows])
+        self.assertEqual(self.read(), sorted(self.data + rows, key=lambda row: row[0]))
+
+    def test_insert_returns_offset(self):
+        """Assert that the offset returned is where the earliest row went"""
+        offset = timetracker.insert_lines(self.file, [(155, '155\tx\n')])
+        self.assertEqual(timetracker.read_lines(self.file, offset, 1), ['155\tx'])
+        self.assertEqual(timetracker.tail_lines(self.file, 1, end=offset), ['150\ta15'])
+
+    def test_insert_without_final_newline(self):
+        """Assert that a file without final newline gets one before new rows"""
+        with open(self.file, 'a') as f:
+            f.write('500\tlast')
+        timetracker.insert_lines(self.file, [(450, '450\tx\n'), (600, '600\ty\n')])
+        self.assertEqual(self.read()[-3:], [(450, 'x'), (500, 'last'), (600, 'y')])
+
+    def test_empty_lines(self):
+        """Assert that empty lines are skipped while searching and left out of the rewrite"""
+        with open(self.file, 'w') as f:
+            f.write('100\tA\n\n200\tB\n\n\n300\tC\n\n')
+        with open(self.file, 'rb') as f:
+            content = f.read()
+        for timestamp in (50, 100, 150, 200, 250, 300, 350):
+            offset = timetracker.bisect_file(self.file, timestamp)
+            before = [line for line in content[:offset].split(b'\n') if line]
+            after = [line for line in content[offset:].split(b'\n') if line]
+            self.assertTrue(all(int(line.split(b'\t')[0]) <= timestamp for line in before))
+            self.assertTrue(all(int(line.split(b'\t')[0]) > timestamp for line in after))
+        timetracker.insert_lines(self.file, [(250, '250\tx\n')])
+        with open(self.file, 'r') as f:
+            self.assertEqual(f.read(), '100\tA\n\n200\tB\n250\tx\n300\tC\n')
+        with open(self.file, 'a') as f:
+            f.write('\n' * 20)
+        timetracker.insert_lines(self.file, [(350, '350\tx\n')])
+        with open(self.file, 'r') as f:
+            self.assertEqual(f.read(), '100\tA\n\n200\tB\n250\tx\n300\tC\n350\tx\n')
+
+
+class TestInsert(unittest.TestCase):
+    """Test tt insert on a sorted file"""
+
+    def setUp(self):
+        self.data = [(i * 10, 'a{}'.format(i)) for i in range(1, 11)]
+        self.file = helpers.create_example_file(helpers.format_example_data(self.data))
+        self.ttf = tt.TimeTrackingFile(file_name=self.file, raw_ts=True)
+
+    def tearDown(self):
+        helpers.delete_sidecars(self.file)
+        os.remove(self.file)
+
+    def rows(self):
+        """Reads the file as rows"""
+        with open(self.file, 'r') as f:
+            return [(int(line.split('\t')[0]), line.split('\t')[1].strip()) for line in f]
+
+    def test_pairs(self):
+        """Assert that arguments are pairs of activity and timestamp"""
+        self.ttf.insert('x', '55', 'y', '15')
+        self.assertEqual(self.rows()[:7], [(10, 'a1'), (15, 'y'), (20, 'a2'), (30, 'a3'),
+                                           (40, 'a4'), (50, 'a5'), (55, 'x')])
+
+    def test_without_timestamp(self):
+        """Assert that a last activity without timestamp is inserted now"""
+        self.ttf.insert('x', '55', 'now')
+        self.assertEqual(self.rows()[-1][1], 'now')
+        self.assertIn((55, 'x'), self.rows())
+
+    def test_surrounding_lines(self):
+        """Assert that the two lines before and after the earliest entry are returned"""
+        result = self.ttf.insert('x', '55', 'y', '75')
+        self.assertEqual(result.split(os.linesep), ['40\ta4', '50\ta5', '55\tx', '60\ta6'])
+
+    def test_empty_lines(self):
+        """Assert that inserting into a file with empty lines works"""
+        with open(self.file, 'w') as f:
+            f.write('100\tA\n\n200\tB\n')
+        self.assertEqual(self.ttf.insert('x', '150').split(os.linesep),
+                         ['100\tA', '150\tx', '200\tB'])
@@ -264,3 +264,25 @@ class TestCreateSampleConfig(unittest.TestCase):
         with open(self.file, 'r') as connection:
             content = connection.read()
         self.assertTrue(content)
+
+class TestWriteExampleData(unittest.TestCase):
+    """Tests the chunked writing of example data"""
+
+    def setUp(self):
+        self.file_name = helpers.create_no_file()
+
+    def tearDown(self):
+        os.remove(self.file_name)
+
+    def test_length_across_chunks(self):
+        """Tests if the file has the requested amount of lines"""
+        helpers.write_example_data(self.file_name, 25, 3, chunk_size=10)
+        with open(self.file_name, 'r') as data_file:
+            self.assertEqual(len(data_file.readlines()), 25)
+
+    def test_sorted(self):
+        """Tests if the timestamps are sorted"""
+        helpers.write_example_data(self.file_name, 50, 3, chunk_size=7)
+        with open(self.file_name, 'r') as data_file:
+            timestamps = [int(line.split('\t')[0]) for line in data_file]
+        self.assertEqual(timestamps, sorted(timestamps))
@@ -0,0 +1,90 @@
+"""Tests for locking and group commit of appends"""
+#pylint: disable=invalid-name
+
+import os
+import fcntl
+import unittest
+import multiprocessing
+
+from .context import timetracker
+from . import helpers
+
+def append_rows(file_name: str, writer: int, count: int):
+    """Appends count rows from a separate process"""
+    tracking_file = timetracker.TrackingFile(file_name)
+    for index in range(count):
+        tracking_file.append_direct('writer{}'.format(writer), index)
+
+def try_lock(file_name: str) -> bool:
+    """Whether another process can take the lock of file_name right now"""
+    descriptor = os.open(timetracker.sidecar_name(file_name, 'lock'), os.O_RDWR | os.O_CREAT)
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    finally:
+        os.close(descriptor)
+    return True
+
+class TestFileLock(unittest.TestCase):
+    """Test the advisory lock"""
+
+    def setUp(self):
+        self.file_name = helpers.create_example_file('0\tFree\n')
+
+    def tearDown(self):
+        helpers.delete_sidecars(self.file_name)
+        os.remove(self.file_name)
+
+    def test_same_object(self):
+        """Assert that a file always has the same lock"""
+        self.assertIs(timetracker.file_lock(self.file_name), timetracker.file_lock(self.file_name))
+
+    def test_reentrant(self):
+        """Assert that writing inside a with block does not deadlock"""
+        with timetracker.TrackingFile(self.file_name) as tracking_file:
+            tracking_file.append('Work', 60)
+            tracking_file.write()
+            tracking_file.read()
+        tracking_file.append_direct('Lunch', 120)
+        tracking_file.read()
+        self.assertEqual(tracking_file.data, [[0, 'Free'], [60, 'Work'], [120, 'Lunch']])
+
+    def test_held_across_with(self):
+        """Assert that other processes cannot lock while the file is open"""
+        with multiprocessing.Pool(1) as pool:
+            with timetracker.TrackingFile(self.file_name):
+                self.assertFalse(pool.apply(try_lock, (self.file_name,)))
+            self.assertTrue(pool.apply(try_lock, (self.file_name,)))
+
+class TestGroupAppend(unittest.TestCase):
+    """Test appends through the pending journal"""
+
+    def setUp(self):
+        self.file_name = helpers.create_example_file('')
+
+    def tearDown(self):
+        helpers.delete_sidecars(self.file_name)
+        os.remove(self.file_name)
+
+    def test_single(self):
+        """Assert that the journal is empty after an append"""
+        timetracker.group_append(self.file_name, b'0\tFree\n')
+        with open(self.file_name) as data_file:
+            self.assertEqual(data_file.read(), '0\tFree\n')
+        self.assertEqual(os.path.getsize(timetracker.sidecar_name(self.file_name, 'pending')), 0)
+
+    def test_parallel_writers(self):
+        """Assert that no appends are lost or torn with parallel writers"""
+        processes = [multiprocessing.Process(target=append_rows, args=(self.file_name, writer, 50))
+                     for writer in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        tracking_file = timetracker.TrackingFile(self.file_name)
+        tracking_file.read()
+        self.assertEqual(len(tracking_file.data), 200)
+        for writer in range(4):
+            rows = [row[0] for row in tracking_file.data if row[1] == 'writer{}'.format(writer)]
+            self.assertEqual(rows, list(range(50)))
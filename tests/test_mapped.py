@@ -0,0 +1,139 @@
+"""Tests for the memory-mapped read-only access to tracking files"""
+#pylint: disable=invalid-name
+
+import io
+import os
+import unittest
+
+from .context import timetracker
+from . import helpers
+
+class TestIndexLines(unittest.TestCase):
+    """Test the line-offset index"""
+
+    def test_offsets(self):
+        """Assert that the starts of all lines are found"""
+        buffer = b'1\ta\n22\tbb\n333\tccc\n'
+        self.assertEqual(list(timetracker.mapped.index_lines(buffer)), [0, 4, 10])
+
+    def test_no_final_newline(self):
+        """Assert that a last line without newline is indexed"""
+        buffer = b'1\ta\n22\tbb'
+        self.assertEqual(list(timetracker.mapped.index_lines(buffer)), [0, 4])
+
+    def test_small_chunks(self):
+        """Assert that chunking does not change the offsets"""
+        buffer = b''.join(b'%d\tactivity\n' % i for i in range(100))
+        self.assertEqual(timetracker.mapped.index_lines(buffer, chunk_size=7),
+                         timetracker.mapped.index_lines(buffer))
+
+    def test_empty(self):
+        """Assert that an empty buffer has no lines"""
+        self.assertEqual(len(timetracker.mapped.index_lines(b'')), 0)
+
+    def test_empty_lines(self):
+        """Assert that empty lines are left out"""
+        buffer = b'1\ta\n\n22\tbb\r\n\r\n\n'
+        self.assertEqual(list(timetracker.mapped.index_lines(buffer)), [0, 5])
+
+class TestMappedRows(unittest.TestCase):
+    """Test MappedRows against the rows read from the same file"""
+
+    def setUp(self):
+        self.file_name = helpers.store_example_data(500, 20)
+        self.data = timetracker.TrackingFile(self.file_name)
+        self.data.read()
+        self.rows = timetracker.MappedRows(self.file_name, self.data.cached_dialect())
+
+    def tearDown(self):
+        self.rows.close()
+        helpers.delete_sidecars(self.file_name)
+        os.remove(self.file_name)
+
+    def test_length(self):
+        """Assert that all lines are indexed"""
+        self.assertEqual(len(self.rows), len(self.data.data))
+
+    def test_getitem(self):
+        """Assert that single rows are parsed on access"""
+        self.assertEqual(self.rows[0], self.data[0])
+        self.assertEqual(self.rows[123], self.data[123])
+        self.assertEqual(self.rows[-1], self.data[-1])
+        with self.assertRaises(IndexError):
+            self.rows[500] #pylint: disable=pointless-statement
+
+    def test_slices(self):
+        """Assert that slices are parsed into Columns"""
+        self.assertIsInstance(self.rows[10:20], timetracker.Columns)
+        self.assertEqual(self.rows[10:20], self.data[10:20])
+        self.assertEqual(self.rows[-5:], self.data[-5:])
+        self.assertEqual(self.rows[::50], self.data[::50])
+        self.assertEqual(len(self.rows[20:10]), 0)
+
+    def test_iteration(self):
+        """Assert that iterating yields all rows"""
+        self.assertEqual(list(self.rows), list(self.data.data))
+
+    def test_columns(self):
+        """Assert that the columns are parsed lazily and match"""
+        self.assertIsNone(self.rows._columns) #pylint: disable=protected-access
+        self.assertEqual(self.rows.timestamps, self.data.data.timestamps)
+        self.assertEqual(self.rows.activities, self.data.data.activities)
+
+    def test_between_bisect(self):
+        """Assert that the binary search finds the same rows"""
+        self.rows.assume_sorted = True
+        start, end = self.data[100][0], self.data[200][0]
+        self.assertEqual(self.rows.between(start, end), self.data.between(start, end))
+        self.assertEqual(self.rows.at(end), self.data.at(end))
+        self.assertIsNone(self.rows.at(-1))
+        self.assertIsNone(self.rows._columns) #pylint: disable=protected-access
+
+    def test_empty_lines(self):
+        """Assert that empty lines are not rows, as for read"""
+        file_name = helpers.create_example_file('1\tA\n2\tB\n\n')
+        try:
+            with timetracker.MappedRows(file_name, timetracker.Dialect) as rows:
+                self.assertEqual(len(rows), 2)
+                self.assertEqual(list(rows), [[1, 'A'], [2, 'B']])
+                self.assertEqual(rows[-1], [2, 'B'])
+        finally:
+            helpers.delete_sidecars(file_name)
+            os.remove(file_name)
+
+class TestTrackingFileMap(unittest.TestCase):
+    """Test TrackingFile.map"""
+
+    def setUp(self):
+        self.file_name = helpers.create_example_file('0\ta\n60\tb\n120\tc\n')
+        self.tf = timetracker.TrackingFile(self.file_name)
+        self.tf.map()
+
+    def tearDown(self):
+        helpers.delete_sidecars(self.file_name)
+        os.remove(self.file_name)
+
+    def test_consumers(self):
+        """Assert that format and timestamp work on mapped data"""
+        self.assertIsInstance(self.tf.data, timetracker.MappedRows)
+        self.assertEqual(list(self.tf.timestamp), [0, 60, 120])
+        self.assertEqual(self.tf.format('%H:%M'), '00:00\ta\r\n00:01\tb\r\n00:02\tc\r\n'
+                         .replace('\r\n', os.linesep))
+
+    def test_read_only(self):
+        """Assert that mapped data cannot be written"""
+        with self.assertRaises(AttributeError):
+            self.tf[0] = [1, 'x']
+        with self.assertRaises(io.UnsupportedOperation):
+            self.tf.write()
+        self.tf.read()
+        self.tf.write()
+
+    def test_empty_file(self):
+        """Assert that empty files can be mapped"""
+        empty = helpers.create_example_file('')
+        tf = timetracker.TrackingFile(empty)
+        tf.map()
+        self.assertEqual(len(tf.data), 0)
+        self.assertEqual(list(tf.data), [])
+        os.remove(empty)
@@ -0,0 +1,63 @@
+"""Tests for merging tracking files"""
+#pylint: disable=invalid-name
+
+import os
+import unittest
+
+from .context import timetracker
+from . import helpers
+
+class TestMerge(unittest.TestCase):
+    """Test the k-way merge of sorted files"""
+
+    def setUp(self):
+        self.laptop = [[0, 'Free'], [20, 'Work'], [40, 'Free']]
+        self.desktop = [[10, 'Work'], [20, 'Work'], [30, 'Lunch'], [50, 'Free']]
+        self.files = [helpers.create_example_file(helpers.format_example_data(rows))
+                      for rows in (self.laptop, self.desktop)]
+        self.output = helpers.create_example_file('')
+
+    def tearDown(self):
+        for file_name in self.files + [self.output]:
+            helpers.delete_sidecars(file_name)
+            if os.path.exists(file_name):
+                os.remove(file_name)
+
+    def test_merge(self):
+        """Assert that rows are merged in order"""
+        rows = list(timetracker.merge_rows(self.files))
+        self.assertEqual(rows, sorted(self.laptop + self.desktop, key=lambda row: row[0]))
+
+    def test_dedupe(self):
+        """Assert that identical rows are kept once"""
+        rows = list(timetracker.merge_rows(self.files, dedupe=True))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows.count([20, 'Work']), 1)
+
+    def test_tag(self):
+        """Assert that rows are tagged with their host"""
+        rows = list(timetracker.merge_rows(self.files, tag=True, hosts=['laptop', 'desktop'],
+                                           dedupe=True))
+        self.assertEqual(rows[:3], [[0, 'Free', 'laptop'], [10, 'Work', 'desktop'],
+                                    [20, 'Work', 'laptop']])
+
+    def test_unsorted(self):
+        """Assert that unsorted input is refused"""
+        with open(self.files[0], 'a') as data_file:
+            data_file.write('5\tLate\n')
+        with self.assertRaises(ValueError):
+            list(timetracker.merge_rows(self.files))
+
+    def test_merge_files(self):
+        """Assert that merging into one of the inputs works"""
+        count = timetracker.merge_files(self.files, self.files[0], dedupe=True)
+        self.assertEqual(count, 6)
+        tracking_file = timetracker.TrackingFile(self.files[0])
+        tracking_file.read()
+        self.assertEqual(list(tracking_file.timestamp), [0, 10, 20, 30, 40, 50])
+
+    def test_inputs_untouched(self):
+        """Assert that merging caches no dialect next to the inputs"""
+        timetracker.merge_files(self.files, self.output)
+        for file_name in self.files:
+            self.assertFalse(os.path.exists(timetracker.sidecar_name(file_name, 'dialect')))
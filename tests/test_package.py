@@ -0,0 +1,39 @@
+"""Tests for the lazy imports of the timetracker package"""
+#pylint: disable=invalid-name
+
+import os
+import sys
+import unittest
+import subprocess
+
+from .context import timetracker
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def imported_modules(code: str) -> list:
+    """Runs code in a fresh interpreter and returns the timetracker modules imported"""
+    code += '\nimport sys\nprint(" ".join(sorted(m for m in sys.modules if m.startswith("timetracker"))))'
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT,
+                                     universal_newlines=True)
+    return output.split()
+
+class TestLazyImports(unittest.TestCase):
+    """Test that names are imported from their modules when used"""
+
+    def test_nothing_imported(self):
+        """Assert that importing the package imports none of its modules"""
+        self.assertEqual(imported_modules('import timetracker'), ['timetracker'])
+
+    def test_only_needed(self):
+        """Assert that using a name only imports its module and dependencies"""
+        self.assertEqual(imported_modules('from timetracker import tail_lines'),
+                         ['timetracker', 'timetracker.columns', 'timetracker.fileio'])
+
+    def test_names(self):
+        """Assert that all names and submodules are there"""
+        for name in timetracker.__all__:
+            self.assertTrue(hasattr(timetracker, name), name)
+        self.assertIs(timetracker.archive.Archive, timetracker.Archive)
+        self.assertTrue(callable(timetracker.complete))
+        with self.assertRaises(AttributeError):
+            timetracker.no_such_name  # pylint: disable=pointless-statement
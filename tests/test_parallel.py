@@ -0,0 +1,76 @@
+"""Tests for parsing files in parallel"""
+#pylint: disable=invalid-name
+
+import os
+import unittest
+
+from .context import timetracker
+from . import helpers
+
+class TestParallel(unittest.TestCase):
+    """Test that parallel parsing gives the same columns as serial parsing"""
+
+    def setUp(self):
+        self.file_name = helpers.store_example_data(5000, 40)
+        self.dialect = timetracker.Dialect
+
+    def tearDown(self):
+        helpers.delete_sidecars(self.file_name)
+        os.remove(self.file_name)
+
+    def test_split_ranges(self):
+        """Assert that ranges cover the file and start at the start of lines"""
+        ranges = timetracker.split_ranges(self.file_name, 7)
+        self.assertEqual(len(ranges), 7)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.file_name))
+        with open(self.file_name, 'rb') as data_file:
+            content = data_file.read()
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(content[start - 1:start], b'\n')
+
+    def test_split_long_lines(self):
+        """Assert that ranges within a single line are left out"""
+        rows = [[0, 'a' * 1000], [1, 'b']]
+        file_name = helpers.create_example_file(helpers.format_example_data(rows))
+        try:
+            self.assertEqual(timetracker.split_ranges(file_name, 4), [(0, 1003), (1003, 1007)])
+        finally:
+            os.remove(file_name)
+
+    def test_read(self):
+        """Assert that parsing in several processes gives the same data"""
+        serial = timetracker.read_columns(self.file_name, self.dialect)
+        parallel = timetracker.read_columns_parallel(self.file_name, self.dialect,
+                                                     workers=3, threshold=0)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel.activities, serial.activities)
+        self.assertEqual(len(parallel.dictionary), len(set(parallel.dictionary)))
+
+    def test_extra_fields(self):
+        """Assert that rows with more fields are still read"""
+        rows = [[0, 'Free'], [60, 'Work', 'note'], [120, 'Lunch'], [180, 'Work']]
+        file_name = helpers.create_example_file(helpers.format_example_data(rows))
+        try:
+            columns = timetracker.read_columns_parallel(file_name, self.dialect,
+                                                        workers=2, threshold=0)
+            self.assertEqual(columns, rows)
+        finally:
+            os.remove(file_name)
+
+    def test_tracking_file(self):
+        """Assert that TrackingFile.read passes workers on"""
+        tracking_file = timetracker.TrackingFile(self.file_name)
+        tracking_file.read(workers=2)
+        self.assertEqual(tracking_file.data,
+                         timetracker.read_columns(self.file_name, self.dialect))
+
+    def test_cached_dialect(self):
+        """Assert that sniffed and cached dialects can be sent to the workers"""
+        for _ in range(2):
+            # Sniffed the first time, loaded from the cache the second
+            dialect = timetracker.TrackingFile(self.file_name).cached_dialect()
+            columns = timetracker.read_columns_parallel(self.file_name, dialect,
+                                                        workers=2, threshold=0)
+            self.assertEqual(columns, timetracker.read_columns(self.file_name, self.dialect))
@@ -0,0 +1,116 @@
+"""Tests for reports per period and activity"""
+#pylint: disable=invalid-name
+
+import json
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from .context import timetracker
+
+def utc(*args) -> int:
+    """Returns the timestamp of a date in UTC"""
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+class TestBincount(unittest.TestCase):
+    """Test summing up per integer id"""
+
+    def test_bincount(self):
+        """Assert that weights are summed and ids counted"""
+        self.assertEqual(timetracker.bincount([0, 2, 2, 1], [5, 1, 2, 3]), [5, 3, 3])
+        self.assertEqual(timetracker.bincount([0, 2, 2], length=4), [1, 0, 2, 0])
+        self.assertEqual(timetracker.bincount([]), [])
+
+
+class TestReport(unittest.TestCase):
+    """Test grouping segments by period and activity"""
+
+    def setUp(self):
+        self.tracking_file = timetracker.TrackingFile('report.txt')
+        self.tracking_file.data = [
+            [utc(2018, 8, 6, 9), 'Work:Writing'],
+            [utc(2018, 8, 6, 11), 'Work:Mail'],
+            [utc(2018, 8, 6, 12), 'Free'],
+            [utc(2018, 8, 13, 9), 'Work:Writing'],
+            [utc(2018, 8, 13, 10), 'Free'],
+            [utc(2018, 9, 3, 9), 'Work:Mail'],
+            [utc(2018, 9, 3, 10), 'Free'],
+        ]
+
+    def rows(self, *args, **kwargs):
+        """Returns the rows of the report of the example data in UTC"""
+        return list(self.tracking_file.report(*args, tz_info=timezone.utc, **kwargs).rows())
+
+    def test_all(self):
+        """Assert that totals, means and shares match those of ddply"""
+        rows = self.rows()
+        self.assertEqual([row[1] for row in rows], ['Free', 'Work:Mail', 'Work:Writing'])
+        total = utc(2018, 9, 3, 10) - utc(2018, 8, 6, 9)
+        free = total - 5 * 3600
+        self.assertEqual(rows[0], ('all', 'Free', free, 2, free / 2, free / total))
+        self.assertEqual(rows[1][2:5], (2 * 3600, 2, 3600))
+        self.assertEqual(rows[2][2:5], (3 * 3600, 2, 1.5 * 3600))
+
+    def test_unsorted(self):
+        """Assert that unsorted rows are reported as if they were sorted"""
+        expected = self.rows('week')
+        self.tracking_file.data = self.tracking_file.data[::-1]
+        self.assertEqual(self.rows('week'), expected)
+        segments = self.tracking_file.segments()
+        reverse = timetracker.Segments(segments.start[::-1], segments.end[::-1],
+                                       segments.activity_ids[::-1],
+                                       segments.next_activity_ids[::-1], segments.dictionary)
+        with self.assertRaises(ValueError):
+            timetracker.report(reverse, 'week')
+
+    def test_periods(self):
+        """Assert that segments count towards the period they start in"""
+        rows = self.rows('week', depth=1)
+        self.assertEqual([row[:4] for row in rows], [
+            ('2018-W32', 'Free', utc(2018, 8, 13, 9) - utc(2018, 8, 6, 12), 1),
+            ('2018-W32', 'Work', 3 * 3600, 2),
+            ('2018-W33', 'Free', utc(2018, 9, 3, 9) - utc(2018, 8, 13, 10), 1),
+            ('2018-W33', 'Work', 3600, 1),
+            ('2018-W36', 'Work', 3600, 1),
+        ])
+        months = self.rows('month', depth=1)
+        self.assertEqual([row[:2] for row in months],
+                         [('2018-08', 'Free'), ('2018-08', 'Work'), ('2018-09', 'Work')])
+        self.assertEqual(sum(row[5] for row in months if row[0] == '2018-08'), 1)
+        self.assertEqual(months[2][5], 1)
+
+    def test_time_zone(self):
+        """Assert that periods are taken in the time zone given"""
+        self.tracking_file.data = [[utc(2018, 8, 31, 23), 'Work'], [utc(2018, 9, 1, 1), 'Free']]
+        berlin = timezone(timedelta(hours=2))
+        report = self.tracking_file.report('month', tz_info=berlin)
+        self.assertEqual([row[0] for row in report.rows()], ['2018-09'])
+        self.assertEqual([row[0] for row in self.rows('month')], ['2018-08'])
+
+    def test_until_now(self):
+        """Assert that the last activity is counted until now if asked for"""
+        rows = self.rows('year', until_now=True)
+        free = [row for row in rows if row[1] == 'Free'][0]
+        self.assertEqual(free[3], 3)
+
+    def test_sparse(self):
+        """Assert that more buckets than segments give the same rows"""
+        data = [[utc(2018, 1, 1) + day * 86400, 'Activity {}'.format(day)] for day in range(30)]
+        self.tracking_file.data = data
+        rows = self.rows('day')
+        self.assertEqual(len(rows), 29)
+        self.assertEqual(rows[-1], ('2018-01-29', 'Activity 28', 86400, 1, 86400, 1.0))
+
+    def test_format(self):
+        """Assert that all output formats have a header and every row"""
+        report = self.tracking_file.report('month', 1, timezone.utc)
+        table = report.format('table').split('\n')
+        self.assertEqual(table[0].split(), list(timetracker.reports.COLUMNS))
+        self.assertEqual(table[3].split(), ['2018-09', 'Work', '1:00:00', '1', '1:00:00',
+                                            '100.0%'])
+        tsv = report.format('tsv').split('\n')
+        self.assertEqual(tsv[3], '2018-09\tWork\t3600\t1\t3600.0\t1.0000')
+        self.assertEqual(json.loads(report.format('json'))[2],
+                         {'period': '2018-09', 'activity': 'Work', 'total': 3600, 'count': 1,
+                          'mean': 3600.0, 'share': 1.0})
+        with self.assertRaises(ValueError):
+            report.format('xml')
@@ -0,0 +1,77 @@
+"""Tests for the segments of a tracking file"""
+#pylint: disable=invalid-name
+
+import time
+import unittest
+
+from .context import timetracker
+from . import helpers
+
+class TestSegmentify(unittest.TestCase):
+    """Test that segmentify produces the segments of example/analyse.R"""
+
+    def setUp(self):
+        self.data = timetracker.Columns([
+            [1533747600, 'Work:Writing'],
+            [1533751200, 'Work:Introduction'],
+            [1533754800, 'Free'],
+        ])
+
+    def test_segments_length(self):
+        """Assert that there is one segment less than there are rows"""
+        self.assertEqual(len(timetracker.segmentify(self.data)), 2)
+
+    def test_segments_content(self):
+        """Assert that segments are correct"""
+        segments = list(timetracker.segmentify(self.data))
+        self.assertEqual(segments, [
+            (1533747600, 1533751200, 3600, 'Work:Writing', 'Work:Introduction'),
+            (1533751200, 1533754800, 3600, 'Work:Introduction', 'Free'),
+        ])
+
+    def test_segments_until_now(self):
+        """Assert that the last segment is closed at now if requested"""
+        segments = timetracker.segmentify(self.data, now=1533758400)
+        self.assertEqual(len(segments), 3)
+        self.assertEqual(segments[-1], (1533754800, 1533758400, 3600, 'Free', None))
+
+    def test_segments_empty(self):
+        """Assert that empty and single rows give no segments"""
+        self.assertEqual(len(timetracker.segmentify(timetracker.Columns())), 0)
+        self.assertEqual(len(timetracker.segmentify(self.data[:1])), 0)
+        self.assertEqual(len(timetracker.segmentify(timetracker.Columns(), now=0)), 0)
+
+class TestTrackingFileSegments(unittest.TestCase):
+    """Test TrackingFile.segments"""
+
+    def setUp(self):
+        self.data = helpers.create_example_data(30, 4)
+        self.tf = timetracker.TrackingFile(helpers.create_no_file())
+        self.tf.data = self.data
+
+    def test_durations_add_up(self):
+        """Assert that the durations add up to the time covered by the rows"""
+        segments = self.tf.segments()
+        self.assertEqual(sum(segments.duration), self.data[-1][0] - self.data[0][0])
+
+    def test_activities_match_rows(self):
+        """Assert that activity and next_activity are the shifted activities"""
+        segments = self.tf.segments()
+        activities = [row[1] for row in self.data]
+        self.assertEqual(segments.activity, activities[:-1])
+        self.assertEqual(segments.next_activity, activities[1:])
+
+    def test_until_now(self):
+        """Assert that until_now closes the last segment at the current time"""
+        before = round(time.time())
+        segments = self.tf.segments(until_now=True)
+        self.assertEqual(len(segments), len(self.data))
+        self.assertGreaterEqual(segments.end[-1], before)
+
+    def test_unsorted(self):
+        """Assert that unsorted rows are segmented in the order of their timestamps"""
+        self.tf.data = [[0, 'A'], [259200, 'B'], [3600, 'C'], [259260, 'D']]
+        segments = self.tf.segments()
+        self.assertEqual(segments.activity, ['A', 'C', 'B'])
+        self.assertEqual(list(segments.duration), [3600, 255600, 60])
+        self.assertEqual(self.tf.data.timestamps[2], 3600)
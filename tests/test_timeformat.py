@@ -0,0 +1,102 @@
+"""Tests for the fast timestamp formatting"""
+#pylint: disable=invalid-name
+
+import random
+import unittest
+from datetime import datetime, timezone, timedelta
+
+from .context import timetracker
+
+FORMATS = (
+    '%Y-%m-%d %H:%M:%S %z',
+    '%F %T',
+    '%FT%TZ',
+    '%d.%m.%y %R {braces}',
+    '%a %b %e %H:%M:%S %Y %Z',
+    '%j %U %W %G-%V-%u %%H',
+    '%c',
+    '%I:%M %p',
+)
+
+class TestTimestampFormatter(unittest.TestCase):
+    """Test that TimestampFormatter gives the same output as strftime"""
+
+    def setUp(self):
+        self.timestamps = sorted(random.randint(-10**9, 4 * 10**9) for i in range(300))
+        self.timestamps += [0, 59, 60, 3599, 3600, 86399, 86400, 951782400, 951868799]
+        self.timezones = (timezone.utc, timezone(timedelta(hours=1)),
+                          timezone(timedelta(hours=-9, minutes=-30)), None)
+
+    def test_same_as_strftime(self):
+        """Assert byte-identical output for all formats and time zones"""
+        for ts_format in FORMATS:
+            for tz_info in self.timezones:
+                formatter = timetracker.TimestampFormatter(ts_format, tz_info)
+                for timestamp in self.timestamps:
+                    should = datetime.fromtimestamp(timestamp, tz=tz_info).strftime(ts_format)
+                    self.assertEqual(formatter(timestamp), should)
+
+    def test_fast_path_used(self):
+        """Assert that supported formats with fixed offsets use the day cache"""
+        formatter = timetracker.TimestampFormatter('%F %T', timezone.utc)
+        self.assertTrue(formatter.fast)
+        formatter(10)
+        formatter(20)
+        self.assertEqual(len(formatter.days), 1)
+
+    def test_fallback(self):
+        """Assert that local time and unsupported directives use strftime"""
+        self.assertFalse(timetracker.TimestampFormatter('%F %T').fast)
+        self.assertFalse(timetracker.TimestampFormatter('%c', timezone.utc).fast)
+        self.assertFalse(timetracker.TimestampFormatter('%s', timezone.utc).fast)
+
+PARSE_FORMATS = (
+    '%Y-%m-%d %H:%M:%S %z',
+    '%Y-%m-%dT%H:%M:%S%z',
+    '%d.%m.%y %H:%M %z',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d %H:%M',
+)
+
+class TestTimestampParser(unittest.TestCase):
+    """Test that TimestampParser gives the same result as strptime"""
+
+    def setUp(self):
+        self.timestamps = [random.randint(0, 3 * 10**9) for i in range(300)] + [0, 86399, 86400]
+        self.timezones = (timezone.utc, timezone(timedelta(hours=1)),
+                          timezone(timedelta(hours=-9, minutes=-30)))
+
+    def assert_parses(self, ts_format, value):
+        """Assert that value is parsed like strptime does"""
+        parser = timetracker.TimestampParser(ts_format)
+        should = int(datetime.strptime(value, ts_format).timestamp())
+        self.assertEqual(parser(value), should, (ts_format, value))
+
+    def test_same_as_strptime(self):
+        """Assert that formatted timestamps parse like strptime in all formats"""
+        for ts_format in PARSE_FORMATS:
+            for tz_info in self.timezones:
+                for timestamp in self.timestamps:
+                    value = datetime.fromtimestamp(timestamp, tz=tz_info).strftime(ts_format)
+                    self.assert_parses(ts_format, value)
+
+    def test_loose_values(self):
+        """Assert that values strptime accepts, but the fast paths do not expect, parse"""
+        self.assert_parses('%Y-%m-%d %H:%M:%S %z', '2018-8-8  7:00:00 +01:00')
+        self.assert_parses('%Y-%m-%d %H:%M:%S %z', '2018-08-08 07:00:00 Z')
+        self.assert_parses('%Y-%m-%dT%H:%M:%S%z', '2018-08-08T07:00:00-0530')
+
+    def test_invalid_raises(self):
+        """Assert that invalid values raise ValueError like strptime"""
+        parser = timetracker.TimestampParser(timetracker.DEFAULT_HUMAN_DATETIME)
+        for value in ('2018-02-30 00:00:00 +0000', '2018-08-08 07:00:00 +01', 'nonsense'):
+            with self.assertRaises(ValueError):
+                parser(value)
+
+    def test_strategies(self):
+        """Assert that the expected parsing strategy is chosen"""
+        parser = timetracker.TimestampParser
+        self.assertEqual(parser('%Y-%m-%d %H:%M:%S %z').method.__name__, 'parse_default')
+        self.assertEqual(parser('%Y-%m-%dT%H:%M:%S%z').method.__name__, 'parse_iso')
+        self.assertEqual(parser('%d.%m.%Y').method.__name__, 'parse_pattern')
+        self.assertEqual(parser('%d %B %Y').method.__name__, 'parse_strptime')
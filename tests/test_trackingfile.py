@@ -13,6 +13,8 @@ import os
 import csv
 import io
 import copy
+import types
+from array import array
 from datetime import timezone, timedelta
 
 from .context import timetracker
@@ -34,7 +36,11 @@ class TestTrackingFileBase(unittest.TestCase):
         """Deletes files from string self.file and self.files"""
         if self.file and os.path.exists(self.file):
             os.remove(self.file)
+        if self.file:
+            helpers.delete_sidecars(self.file)
         if self.files:
+            for file_name in self.files.values():
+                helpers.delete_sidecars(file_name)
             # Non-assignment of this. Nothing is returned, assignment makes no
             # sense, but pylint is yelling at me if I don't do this.
             _ = [os.remove(file_name)
@@ -72,25 +78,71 @@ class TestTrackingFileIndexing(TestTrackingFileBase):
     def setUp(self):
         self.file = helpers.create_no_file()
         self.tf = timetracker.TrackingFile(self.file)
-        self.tf.data = [1, 2, 3, 4, 5]
+        self.rows = [[1, 'a'], [2, 'b'], [3, 'a'], [4, 'c'], [5, 'b']]
+        self.tf.data = self.rows
 
     def test_index_deletion(self):
         """Test if deletion with indexes is implemented by TrackingFile"""
         del self.tf[0]
-        self.assertEqual([2, 3, 4, 5], self.tf.data)
+        self.assertEqual(self.rows[1:], self.tf.data)
 
     def test_index_selection_single(self):
         """Test if selection by index is implemented by TrackingFile"""
-        self.assertEqual(1, self.tf[0])
+        self.assertEqual([1, 'a'], self.tf[0])
 
     def test_index_selection_slice(self):
         """Test if selection by index slicing is implemented by TrackingFile"""
-        self.assertEqual([1, 2, 3], self.tf[0:3])
+        self.assertEqual(self.rows[0:3], self.tf[0:3])
+
+    def test_index_selection_step(self):
+        """Test if selection by extended slices is implemented by TrackingFile"""
+        self.assertEqual(self.rows[::-2], self.tf[::-2])
 
     def test_index_replacement(self):
         """Test if replacement by index is implemented by TrackingFile"""
-        self.tf[1] = 9
-        self.assertEqual(9, self.tf.data[1])
+        self.tf[1] = [9, 'z']
+        self.assertEqual([9, 'z'], self.tf.data[1])
+
+    def test_slice_replacement(self):
+        """Test if replacement of slices is implemented by TrackingFile"""
+        self.tf[1:3] = [[7, 'x']]
+        self.rows[1:3] = [[7, 'x']]
+        self.assertEqual(self.rows, self.tf.data)
+
+    def test_slice_deletion(self):
+        """Test if deletion of slices is implemented by TrackingFile"""
+        del self.tf[::2]
+        self.assertEqual(self.rows[1::2], self.tf.data)
+
+class TestTrackingFileColumns(TestTrackingFileBase):
+    """Test the column-wise storage of data"""
+
+    def setUp(self):
+        self.file = helpers.create_no_file()
+        self.tf = timetracker.TrackingFile(self.file)
+        self.tf.data = [[1, 'Work'], [2, 'Free'], [3, 'Work']]
+
+    def test_activities_are_interned(self):
+        """Assert that every activity is stored only once"""
+        self.assertEqual(self.tf.data.dictionary, ['Work', 'Free'])
+        self.assertEqual(list(self.tf.data.activity_ids), [0, 1, 0])
+
+    def test_timestamp_is_column(self):
+        """Assert that the timestamp property does not copy"""
+        self.assertIs(self.tf.timestamp, self.tf.data.timestamps)
+
+    def test_extra_fields_kept(self):
+        """Assert that rows with more than two fields keep their fields"""
+        self.tf.append('Fun', 4)
+        self.tf.data.append([5, 'Work', 'laptop'])
+        self.assertEqual(self.tf[-1], [5, 'Work', 'laptop'])
+        self.assertEqual(self.tf[0], [1, 'Work'])
+        self.assertEqual(len(self.tf.data), 5)
+
+    def test_timestamps_must_be_integers(self):
+        """Assert that non-integer timestamps are rejected"""
+        with self.assertRaises(TypeError):
+            self.tf.append('Work', '5')
 
 class TestTrackingFileWithStatement(TestTrackingFileBase):
     """Tests if TrackingFile implements __enter__ and __exit__"""
@@ -270,6 +322,66 @@ class TestTrackingFileRead(TestTrackingFileBase):
         tf.read()
         self.assertEqual(len(tf.data), len_file)
 
+class TestTrackingFileReadMissing(TestTrackingFileBase):
+    """Test reading a file that does not exist"""
+
+    def test_no_dialect_cached(self):
+        """Assert that reading a missing file leaves no dialect cache behind"""
+        with self.assertRaises(FileNotFoundError):
+            self.tf.read()
+        self.assertFalse(os.path.exists(timetracker.sidecar_name(self.file, 'dialect')))
+        self.assertIsNone(self.tf.dialect)
+
+    def test_no_lock_file(self):
+        """Assert that reading a missing file leaves no lock file behind"""
+        with self.assertRaises(FileNotFoundError):
+            self.tf.read()
+        self.assertFalse(os.path.exists(timetracker.sidecar_name(self.file, 'lock')))
+
+    def test_no_lock_file_with(self):
+        """Assert that opening a missing file with `with` leaves no lock file behind"""
+        with self.assertRaises(FileNotFoundError):
+            with self.tf:
+                pass
+        self.assertFalse(os.path.exists(timetracker.sidecar_name(self.file, 'lock')))
+
+class TestTrackingFileIterRows(TestTrackingFileBase):
+    """Test the streaming row iterator of TrackingFile"""
+
+    def setUp(self):
+        self.data = helpers.create_example_data(25, 3)
+        self.file = helpers.create_example_file(helpers.format_example_data(self.data))
+        self.tf = timetracker.TrackingFile(self.file)
+
+    def test_iter_rows_is_generator(self):
+        """Assert that iter_rows does not build a list"""
+        self.assertIsInstance(self.tf.iter_rows(), types.GeneratorType)
+
+    def test_iter_rows_content(self):
+        """Assert that iter_rows yields the rows of the file"""
+        self.assertEqual(list(self.tf.iter_rows()), [list(row) for row in self.data])
+
+    def test_iter_rows_defines_dialect(self):
+        """Assert that iterating over the own file sets the dialect"""
+        list(self.tf.iter_rows())
+        self.assertEqual(self.tf.dialect.delimiter, '\t')
+
+    def test_iter_rows_empty_file(self):
+        """Assert that an empty file has no rows"""
+        open(self.file, 'w').close()
+        self.assertEqual(list(self.tf.iter_rows()), [])
+        self.tf.read()
+        self.assertFalse(self.tf.data)
+
+    def test_save_streams_unread_file(self):
+        """Assert that saving an unread file converts the file itself"""
+        self.files['out'] = helpers.create_no_file()
+        self.tf.save(self.files['out'])
+        self.assertFalse(self.tf.data)
+        tf = timetracker.TrackingFile(self.file)
+        tf.load(self.files['out'])
+        self.assertEqual(tf.data, [list(row) for row in self.data])
+
 class TestTrackingFileWrite(TestTrackingFileBase):
     """Test the write method of TrackingFile
 
@@ -346,6 +458,96 @@ class TestTrackingFileAppend(TestTrackingFileBase):
         self.tf.append('Hello')
         self.assertFalse(os.path.exists(self.file))
 
+class TestTrackingFileTail(TestTrackingFileBase):
+    """Test the tail method of TrackingFile"""
+
+    def setUp(self):
+        self.data = helpers.create_example_data(40, 4)
+        self.file = helpers.create_example_file(helpers.format_example_data(self.data))
+        self.tf = timetracker.TrackingFile(self.file)
+
+    def test_tail_equals_read(self):
+        """Assert that tail returns the same rows as the end of a full read"""
+        tail = self.tf.tail(6)
+        self.tf.read()
+        self.assertEqual(tail, self.tf.data[-6:])
+
+    def test_tail_leaves_data(self):
+        """Assert that tail does not load data"""
+        self.tf.tail(6)
+        self.assertFalse(self.tf.data)
+        self.assertFalse(self.tf.loaded)
+
+    def test_tail_empty_lines(self):
+        """Assert that empty lines are skipped as by read"""
+        with open(self.file, 'a') as data_file:
+            data_file.write('\n\n')
+        tail = self.tf.tail(6)
+        self.tf.read()
+        self.assertEqual(tail, self.tf.data[-6:])
+
+class TestTrackingFileAppendDirect(TestTrackingFileBase):
+    """Test that append_direct writes single rows without reading the file"""
+
+    def setUp(self):
+        self.len = 10
+        self.file = helpers.store_example_data(self.len, 2)
+        self.tf = timetracker.TrackingFile(self.file)
+
+    def test_append_direct_appends(self):
+        """Assert that the row ends up at the end of the file"""
+        self.tf.append_direct('Hello', 5)
+        self.tf.read()
+        self.assertEqual(len(self.tf.data), self.len+1)
+        self.assertEqual(self.tf.data[-1], [5, 'Hello'])
+
+    def test_append_direct_keeps_data(self):
+        """Assert that append_direct does not load the file into data"""
+        self.tf.append_direct('Hello')
+        self.assertFalse(self.tf.data)
+        self.assertFalse(self.tf.loaded)
+
+    def test_append_direct_creates_file(self):
+        """Assert that a missing file is created with the default dialect"""
+        tf = timetracker.TrackingFile(helpers.create_no_file())
+        self.files['new'] = tf.file_name
+        tf.append_direct('Hello', 0)
+        with open(tf.file_name, 'r') as f:
+            self.assertEqual(f.read(), '0\tHello' + os.linesep)
+
+    def test_dialect_is_cached(self):
+        """Assert that a second TrackingFile takes the dialect from the cache"""
+        self.tf.append_direct('Hello', 0)
+        self.assertTrue(os.path.exists(timetracker.sidecar_name(self.file, 'dialect')))
+        tf = timetracker.TrackingFile(self.file)
+        self.assertEqual(tf.cached_dialect().delimiter, '\t')
+        self.assertEqual(tf.cached_dialect().lineterminator, '\n')
+
+    def test_dialect_sniffed_again(self):
+        """Assert that a dialect sniffed from a few rows is sniffed again once there are more"""
+        with open(self.file, 'w') as data_file:
+            data_file.write('1533747600\tWork: Writing, intro\n')
+        self.assertEqual(timetracker.TrackingFile(self.file).cached_dialect().delimiter, ',')
+        with open(self.file, 'a') as data_file:
+            data_file.write(helpers.format_example_data([[1533747601 + i, 'Work:Mail']
+                                                         for i in range(80)]))
+        self.assertEqual(timetracker.TrackingFile(self.file).cached_dialect().delimiter, '\t')
+        with open(self.file, 'w') as data_file:
+            data_file.write('0,Work\n60,Free\n')
+        self.assertEqual(timetracker.TrackingFile(self.file).cached_dialect().delimiter, ',')
+
+class TestCommandAppend(TestTrackingFileBase):
+    """Test that CommandAppend appends to the target file"""
+
+    def test_command_appends(self):
+        """Assert that the command writes a single row"""
+        command = timetracker.CommandAppend({'target_file': self.file})
+        command(activity='Work', timestamp=10)
+        command(activity='Free', timestamp=None)
+        self.tf.read()
+        self.assertEqual(len(self.tf.data), 2)
+        self.assertEqual(self.tf.data[0], [10, 'Work'])
+
 class TestTrackingFileSave(TestTrackingFileBase):
     """Test save method of TrackingFile object.
 
@@ -440,14 +642,15 @@ class TestTrackingFilePropertyTimestamp(TestTrackingFileBase):
             self.assertEqual(len(list(tf.timestamp)), self.len)
 
     def test_timestamp_is_correct_type(self):
-        """Assert that the property has the correct type (list)"""
+        """Assert that the property has the correct type (array of int64)"""
         with self.tf as tf:
-            self.assertIsInstance(tf.timestamp, list)
+            self.assertIsInstance(tf.timestamp, array)
+            self.assertEqual(tf.timestamp.typecode, 'q')
 
     def test_timestamp_is_correct_content(self):
         """Assert that the property has the correct contents"""
         with self.tf as tf:
-            timestamp_is = tf.timestamp
+            timestamp_is = list(tf.timestamp)
             timestamp_should = list(next(zip(*tf.data)))
         self.assertEqual(timestamp_is, timestamp_should)
 
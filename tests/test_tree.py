@@ -0,0 +1,65 @@
+"""Tests for the hierarchical activity totals"""
+#pylint: disable=invalid-name
+
+import unittest
+
+from .context import timetracker
+from . import helpers
+
+class TestActivityTree(unittest.TestCase):
+    """Test that ActivityTree rolls up segments along the hierarchy"""
+
+    def setUp(self):
+        data = timetracker.Columns([
+            [0, 'Work:Writing:Introduction'],
+            [60, 'Work:Writing'],
+            [180, 'Free'],
+            [240, 'Work:Meeting'],
+            [540, 'Work:Writing'],
+            [600, 'Free'],
+        ])
+        self.tree = timetracker.ActivityTree.from_segments(timetracker.segmentify(data))
+
+    def test_leaf_totals(self):
+        """Assert that leaves hold the time of their segments"""
+        self.assertEqual(self.tree['Work:Meeting'].total, 300)
+        self.assertEqual(self.tree['Work:Writing:Introduction'].total, 60)
+
+    def test_parent_totals(self):
+        """Assert that parents contain the time of their children"""
+        writing = self.tree['Work:Writing']
+        self.assertEqual(writing.total, 60 + 120 + 60)
+        self.assertEqual(writing.own_total, 180)
+        self.assertEqual(writing.count, 3)
+        self.assertEqual(self.tree['Work'].total, 540)
+        self.assertEqual(self.tree.root.total, 600)
+
+    def test_mean(self):
+        """Assert that mean durations are total over count"""
+        self.assertEqual(self.tree['Work:Writing'].mean, 80)
+
+    def test_cut(self):
+        """Assert that cutting keeps totals but removes deeper nodes"""
+        tree = self.tree.cut(1)
+        self.assertEqual([node.name for node in tree], ['Work', 'Free'])
+        self.assertEqual(tree['Work'].total, 540)
+        self.assertEqual(len(list(self.tree)), 5)
+
+    def test_format(self):
+        """Assert that format has one line per node, largest first"""
+        lines = self.tree.format(depth=2).split('\n')
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('Work\t0:09:00\t4'))
+        self.assertTrue(lines[1].startswith('  Meeting\t0:05:00'))
+
+class TestTrackingFileTree(unittest.TestCase):
+    """Test TrackingFile.tree"""
+
+    def test_tree_total_is_time_span(self):
+        """Assert that the root holds the whole tracked time"""
+        data = helpers.create_example_data(40, 6)
+        tf = timetracker.TrackingFile(helpers.create_no_file())
+        tf.data = data
+        tree = tf.tree(depth=2)
+        self.assertEqual(tree.root.total, data[-1][0] - data[0][0])
+        self.assertTrue(all(node.depth <= 2 for node in tree))
@@ -1 +1,50 @@
-from .objects import *
+"""Hierarchical simple file-based timetracking
+
+Names are imported from their modules on first use (PEP 562), so that
+importing timetracker, eg to append a line, does not import every module.
+"""
+
+_EXPORTS = {
+    'objects': ('DEFAULT_CONFIG', 'DEFAULT_CONFIG_RESOLVE_ORDER', 'DEFAULT_HUMAN_DATETIME',
+                'Dialect', 'TrackingFile', 'file_finder', 'config_loader', 'BaseCommand',
+                'CommandAppend', 'CommandEdit', 'CommandTail', 'App'),
+    'fileio': ('tail_lines', 'read_lines', 'bisect_file', 'insert_lines', 'append_line',
+               'sidecar_name', 'sniff_dialect', 'iter_chunks', 'parse_chunk', 'read_columns'),
+    'columns': ('Columns', 'ColumnsView'),
+    'mapped': ('MappedRows',),
+    'binary': ('BinaryTrackingFile', 'read_binary', 'write_binary', 'append_binary',
+               'text_to_binary', 'binary_to_text'),
+    'archive': ('Archive', 'period_start'),
+    'merge': ('merge_rows', 'merge_files'),
+    'locking': ('FileLock', 'file_lock', 'group_append'),
+    'cache': ('AggregateCache',),
+    'activities': ('ActivityDictionary', 'ActivityEntry', 'refresh_activities',
+                   'file_signature'),
+    'completion': ('complete', 'rank_children', 'store_completions', 'load_completions'),
+    'parallel': ('read_columns_parallel', 'split_ranges'),
+    'aio': ('AsyncTrackingFile',),
+    'client': ('request', 'DaemonUnavailable', 'DaemonError', 'DaemonNoAnswer'),
+    'daemon': ('Daemon', 'serve'),
+    'segments': ('Segments', 'segmentify', 'NO_ACTIVITY'),
+    'reports': ('Report', 'report', 'bincount', 'PERIODS', 'FORMATS'),
+    'tree': ('ActivityTree', 'TreeNode', 'format_duration'),
+    'timeformat': ('TimestampFormatter', 'TimestampParser'),
+}
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_MODULES)
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        # A submodule, eg timetracker.archive
+        return __import__(name, globals(), level=1, fromlist=('*',))
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    # The same as `from .module import name`, importlib takes a while to import
+    value = getattr(__import__(module, globals(), level=1, fromlist=(name,)), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_MODULES))
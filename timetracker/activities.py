@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Persistent dictionary of the activities of a tracking file
+
+Listing (or completing) activities should not need the whole file. The
+ActivityDictionary keeps every distinct activity with the number of rows
+using it and the first and last time it was used in a sidecar
+(`.time.txt.activities`), together with the byte offset parsed so far, the
+crc32 of the bytes up to it and that of the last TAIL_WINDOW bytes before it.
+
+Appends only add bytes at the end, so an update parses just the bytes after
+the offset. Right after an append of its own (see refresh_activities), when
+the dictionary was current before it, only the tail window is compared, so
+that appending does not read the whole file. In every other case (eg the
+file was edited in an editor, which may also have added lines), the crc of
+all parsed bytes is compared. Either way, if they no longer match the
+dictionary is rebuilt.
+
+Given the manifest of an archive (see archive.py), the dictionary starts
+with the activities of its chunks, which have dictionaries of their own, and
+is rebuilt when the manifest changes.
+"""
+
+import os
+import json
+import zlib
+from collections import Counter
+
+from .columns import Columns
+from .fileio import sidecar_name, iter_chunks, parse_chunk, load_dialect
+from .locking import file_lock
+from .completion import store_completions
+
+VERSION = 3
+# Bytes before the offset compared after appends
+TAIL_WINDOW = 4096
+
+class ActivityEntry:
+    """How often and when an activity was used"""
+    __slots__ = ('count', 'first_seen', 'last_used')
+
+    def __init__(self, count: int, first_seen: int, last_used: int):
+        self.count = count
+        self.first_seen = first_seen
+        self.last_used = last_used
+
+    def __repr__(self):
+        return '<{} {}x {}-{}>'.format(type(self).__name__, self.count, self.first_seen,
+                                       self.last_used)
+
+    def __eq__(self, other):
+        return (isinstance(other, ActivityEntry)
+                and (self.count, self.first_seen, self.last_used)
+                == (other.count, other.first_seen, other.last_used))
+
+
+class ActivityDictionary:
+    """The distinct activities of a tracking file, kept up to date incrementally
+
+    Maps activity names to ActivityEntry. update brings it up to date with
+    the file, which is cheap after appends. The activities of the archive
+    archive_name (a manifest) are included, if given.
+
+        >>> activities = ActivityDictionary('time.txt').update(dialect)
+        >>> activities['Work'].count
+        12
+    """
+    def __init__(self, file_name: str, archive_name=None):
+        self.file_name = file_name
+        self.archive_name = archive_name
+        self.dictionary_name = sidecar_name(file_name, 'activities')
+        self.loaded = False
+        self.clear()
+
+    def __repr__(self):
+        return '<{} of `{}`>'.format(type(self).__name__, self.file_name)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, activity):
+        return activity in self.entries
+
+    def __getitem__(self, activity: str) -> ActivityEntry:
+        return self.entries[activity]
+
+    def clear(self):
+        """Forgets all activities, the next update parses the whole file"""
+        self.entries = {}
+        self.offset = 0
+        self.crc = 0
+        self.tail_crc = 0
+        self.size = None
+        self.mtime = None
+        self.archived = []
+
+    def names(self) -> list:
+        """Returns the sorted names of all activities"""
+        return sorted(self.entries)
+
+    def exists(self) -> bool:
+        """Whether the dictionary has been stored next to the file"""
+        return os.path.exists(self.dictionary_name)
+
+    def load(self) -> bool:
+        """Loads the sidecar. Returns whether there was a usable one."""
+        self.loaded = True
+        try:
+            with open(self.dictionary_name, 'r') as dictionary_file:
+                state = json.load(dictionary_file)
+            if state.get('version') != VERSION:
+                return False
+            self.entries = {activity: ActivityEntry(*entry)
+                            for activity, entry in state['activities'].items()}
+            self.offset = state['offset']
+            self.crc = state['crc']
+            self.tail_crc = state['tail_crc']
+            self.size = state['size']
+            self.mtime = state['mtime']
+            self.archived = state['archived']
+        except (OSError, ValueError, KeyError, TypeError):
+            self.clear()
+            return False
+        return True
+
+    def store(self):
+        """Writes the sidecar. Failing to do so is not an error."""
+        state = {
+            'version': VERSION,
+            'offset': self.offset,
+            'crc': self.crc,
+            'tail_crc': self.tail_crc,
+            'size': self.size,
+            'mtime': self.mtime,
+            'archived': self.archived,
+            'activities': {activity: [entry.count, entry.first_seen, entry.last_used]
+                           for activity, entry in self.entries.items()},
+        }
+        temporary = self.dictionary_name + '.tmp'
+        try:
+            with open(temporary, 'w') as dictionary_file:
+                json.dump(state, dictionary_file, separators=(',', ':'))
+            os.replace(temporary, self.dictionary_name)
+        except OSError:
+            pass
+
+    def window_crc(self) -> int:
+        """Returns the crc32 of the last TAIL_WINDOW bytes before self.offset"""
+        start = max(self.offset - TAIL_WINDOW, 0)
+        with open(self.file_name, 'rb') as data_file:
+            data_file.seek(start)
+            return zlib.crc32(data_file.read(self.offset - start))
+
+    def unchanged(self, size: int, before_append=None) -> bool:
+        """Whether the bytes up to self.offset are still those parsed
+
+        size is the current size of the file. before_append is the
+        file_signature of the file before an append the caller just made. If
+        the file was then as of the last update, only the tail window is
+        compared, otherwise all bytes.
+        """
+        if size < self.offset:
+            return False
+        if (before_append is not None and before_append == (self.size, self.mtime)
+                and size > self.size):
+            return self.window_crc() == self.tail_crc
+        crc = 0
+        remaining = self.offset
+        with open(self.file_name, 'rb') as data_file:
+            while remaining > 0:
+                block = data_file.read(min(remaining, 1 << 20))
+                if not block:
+                    return False
+                crc = zlib.crc32(block, crc)
+                remaining -= len(block)
+        return crc == self.crc
+
+    def update(self, dialect, before_append=None):
+        """Brings the dictionary up to date with the file and stores it
+
+        dialect is the dialect of the file (see TrackingFile.cached_dialect).
+        before_append is the file_signature from before an append just made
+        by the caller, if any (see unchanged). The completions (see
+        completion.py) are stored along with it. Returns self.
+        """
+        if not self.loaded:
+            self.load()
+        try:
+            stat = os.stat(self.file_name)
+        except FileNotFoundError:
+            self.clear()
+            return self
+        archive = None
+        if self.archive_name is not None:
+            # Imported here, archive imports objects, which imports this module
+            from .archive import Archive
+            archive = Archive(self.archive_name)
+        if (stat.st_size == self.size and stat.st_mtime_ns == self.mtime
+                and (archive is None or archive.signature() == self.archived)):
+            return self
+        with file_lock(self.file_name).shared_lock():
+            if not self.unchanged(stat.st_size, before_append):
+                self.clear()
+            # Rebuilding from scratch forgets the archive as well
+            if archive is not None and archive.signature() != self.archived:
+                self.clear()
+                self.seed(archive)
+            self.fold(dialect)
+            self.tail_crc = self.window_crc()
+        self.size, self.mtime = stat.st_size, stat.st_mtime_ns
+        self.store()
+        store_completions(self.file_name, self.entries, self.size, self.mtime)
+        return self
+
+    def seed(self, archive):
+        """Starts with the activities of the chunks of archive (an Archive)"""
+        from .objects import Dialect
+        for entry in archive:
+            chunk = ActivityDictionary(archive.chunk_path(entry)).update(Dialect)
+            for activity, archived in chunk.entries.items():
+                known = self.entries.get(activity)
+                if known is None:
+                    self.entries[activity] = ActivityEntry(archived.count, archived.first_seen,
+                                                           archived.last_used)
+                else:
+                    known.count += archived.count
+                    known.first_seen = min(known.first_seen, archived.first_seen)
+                    known.last_used = max(known.last_used, archived.last_used)
+        self.archived = archive.signature()
+
+    def fold(self, dialect):
+        """Adds the activities of the whole lines after self.offset"""
+        for chunk in iter_chunks(self.file_name, self.offset):
+            end = chunk.rfind(b'\n') + 1
+            if not end:
+                break
+            chunk = chunk[:end]
+            self.add_rows(parse_chunk(chunk, dialect, Columns()))
+            self.crc = zlib.crc32(chunk, self.crc)
+            self.offset += end
+
+    def add_rows(self, rows: Columns):
+        """Adds the activities of rows"""
+        activity_ids, timestamps = rows.activity_ids, rows.timestamps
+        if rows.is_sorted:
+            # Later items overwrite earlier ones
+            first_seen = dict(zip(reversed(activity_ids), reversed(timestamps)))
+            last_used = dict(zip(activity_ids, timestamps))
+        else:
+            first_seen, last_used = {}, {}
+            for activity_id, timestamp in zip(activity_ids, timestamps):
+                first_seen[activity_id] = min(first_seen.get(activity_id, timestamp), timestamp)
+                last_used[activity_id] = max(last_used.get(activity_id, timestamp), timestamp)
+        for activity_id, count in Counter(activity_ids).items():
+            activity = rows.dictionary[activity_id]
+            entry = self.entries.get(activity)
+            if entry is None:
+                self.entries[activity] = ActivityEntry(count, first_seen[activity_id],
+                                                       last_used[activity_id])
+            else:
+                entry.count += count
+                entry.first_seen = min(entry.first_seen, first_seen[activity_id])
+                entry.last_used = max(entry.last_used, last_used[activity_id])
+
+
+def file_signature(file_name: str):
+    """Returns the size and mtime (in ns) of file_name, None if there is no file"""
+    try:
+        stat = os.stat(file_name)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def refresh_activities(file_name: str, dialect=None, before_append=None):
+    """Updates the activity dictionary of file_name after an append
+
+    Nothing is done if file_name has no dictionary yet, it is created by the
+    first update (eg when listing activities). dialect defaults to the
+    cached dialect of file_name. before_append is the file_signature from
+    before the append, see ActivityDictionary.unchanged.
+    """
+    activities = ActivityDictionary(file_name)
+    if not activities.exists():
+        return
+    if dialect is None:
+        dialect = load_dialect(file_name)
+    if dialect is None:
+        # Imported here, objects imports this module
+        from .objects import TrackingFile
+        dialect = TrackingFile(file_name).cached_dialect()
+    activities.update(dialect, before_append)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Asynchronous access to tracking files for asyncio applications
+
+AsyncTrackingFile wraps a TrackingFile and runs its blocking calls (reading,
+parsing, writing) in a worker thread, so that large files do not stall the
+event loop. Every AsyncTrackingFile has a single worker: calls on one file
+run one at a time and in order, as TrackingFile is not thread-safe and the
+file lock (see locking.py) belongs to the thread that took it. Calls on
+different files run in parallel.
+
+Appends from many coroutines are serialized with an asyncio.Lock and
+written in batches: the lines appended while a write is going on are all
+written by the next one, with one group_append.
+
+    >>> async with AsyncTrackingFile('time.txt') as tracking_file:
+    >>>     tracking_file.append('Work')
+    >>> async for row in AsyncTrackingFile('time.txt'):
+    >>>     ...
+"""
+
+import io
+import csv
+import time
+import asyncio
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from .objects import TrackingFile
+from .locking import group_append
+from .activities import refresh_activities, file_signature
+
+# Rows handed to the event loop at a time when iterating
+BATCH_ROWS = 10000
+
+def _resolve_batch(batch: list, write: asyncio.Future):
+    """Resolves the futures of a batch of appends with the outcome of write
+
+    Futures of appends that were cancelled meanwhile are left alone.
+    """
+    for _, future in batch:
+        if future.done():
+            continue
+        if write.cancelled():
+            future.cancel()
+        elif write.exception() is not None:
+            future.set_exception(write.exception())
+        else:
+            future.set_result(None)
+
+
+class AsyncTrackingFile:
+    """A tracking file for use in coroutines
+
+    The methods are those of TrackingFile, as coroutines where they block.
+    data, indexing, append, between and at work on data in memory and are
+    not coroutines. The with statement becomes async with: the file is read
+    and locked on entering and written on leaving.
+    """
+    def __init__(self, file_name, dialect=None):
+        self.tracking_file = TrackingFile(file_name, dialect)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='timetracker')
+        self.append_lock = asyncio.Lock()
+        self.pending = []
+
+    def __repr__(self):
+        return '<{} at `{}`>'.format(type(self).__name__, self.file_name)
+
+    @property
+    def file_name(self):
+        """The name of the file"""
+        return self.tracking_file.file_name
+
+    @property
+    def data(self):
+        """The rows of the file (see TrackingFile.data)"""
+        return self.tracking_file.data
+
+    @data.setter
+    def data(self, rows):
+        self.tracking_file.data = rows
+
+    def __getitem__(self, key):
+        return self.tracking_file[key]
+
+    def __setitem__(self, key, value):
+        self.tracking_file[key] = value
+
+    def __delitem__(self, key):
+        del self.tracking_file[key]
+
+    async def run(self, function, *args, **kwargs):
+        """Runs function with args in the worker of the file and returns its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,
+                                          functools.partial(function, *args, **kwargs))
+
+    async def close(self):
+        """Waits for the worker to finish and stops it"""
+        await self.run(lambda: None)
+        self.executor.shutdown()
+
+    async def __aenter__(self):
+        await self.run(self.tracking_file.__enter__)
+        return self
+
+    async def __aexit__(self, *args):
+        await self.run(self.tracking_file.__exit__, *args)
+
+    async def read(self):
+        """Reads the file into data (see TrackingFile.read)"""
+        await self.run(self.tracking_file.read)
+
+    async def map(self, assume_sorted: bool = False):
+        """Maps the file read-only (see TrackingFile.map)"""
+        await self.run(self.tracking_file.map, assume_sorted)
+
+    async def write(self):
+        """Writes data to the file (see TrackingFile.write)"""
+        await self.run(self.tracking_file.write)
+
+    async def save(self, file_name, *args, **kwargs):
+        """Saves human-readable data to file_name (see TrackingFile.save)"""
+        await self.run(self.tracking_file.save, file_name, *args, **kwargs)
+
+    async def load(self, file_name, *args, **kwargs):
+        """Loads human-readable data from file_name (see TrackingFile.load)"""
+        await self.run(self.tracking_file.load, file_name, *args, **kwargs)
+
+    async def tail(self, count: int = 5):
+        """Returns the last count rows of the file (see TrackingFile.tail)"""
+        return await self.run(self.tracking_file.tail, count)
+
+    async def cached_dialect(self):
+        """Returns the dialect of the file (see TrackingFile.cached_dialect)"""
+        return await self.run(self.tracking_file.cached_dialect)
+
+    async def tree(self, depth=None, until_now=False):
+        """Returns the ActivityTree of data (see TrackingFile.tree)"""
+        return await self.run(self.tracking_file.tree, depth, until_now)
+
+    async def iter_rows(self, file_name=None, ts_format='unix'):
+        """Yields the rows of the file one at a time (see TrackingFile.iter_rows)
+
+        Rows are read and parsed in the worker, BATCH_ROWS at a time. The
+        event loop runs other tasks while the next batch is parsed.
+        """
+        rows = self.tracking_file.iter_rows(file_name, ts_format)
+        while True:
+            batch = await self.run(list, itertools.islice(rows, BATCH_ROWS))
+            if not batch:
+                return
+            for row in batch:
+                yield row
+
+    def __aiter__(self):
+        return self.iter_rows()
+
+    def append(self, activity: str, timestamp=None):
+        """Appends an activity to data (see TrackingFile.append)"""
+        if timestamp is None:
+            timestamp = round(time.time())
+        self.tracking_file.append(activity, timestamp)
+
+    def between(self, start: int, end: int):
+        """Returns the rows of data with start <= timestamp < end"""
+        return self.tracking_file.between(start, end)
+
+    def at(self, timestamp: int):
+        """Returns the row going on at timestamp, None if there is none"""
+        return self.tracking_file.at(timestamp)
+
+    async def append_direct(self, activity: str, timestamp=None):
+        """Appends an activity straight to the file (see TrackingFile.append_direct)
+
+        The line is queued and written by the first append to get the lock,
+        along with all lines queued until then. Returns once the line is in
+        the file; if the write fails, all appends of the batch raise. The
+        write is shielded: if the append doing it is cancelled, the batch is
+        still written and the other appends of it return.
+        """
+        if timestamp is None:
+            timestamp = round(time.time())
+        with io.StringIO() as output:
+            writer = csv.writer(output, dialect=await self.cached_dialect())
+            writer.writerow([timestamp, activity])
+            line = output.getvalue()
+        written = asyncio.get_running_loop().create_future()
+        self.pending.append((line, written))
+        async with self.append_lock:
+            if not written.done():
+                batch, self.pending = self.pending, []
+                write = asyncio.ensure_future(self.run(self.write_lines,
+                                                       [line for line, _ in batch]))
+                write.add_done_callback(functools.partial(_resolve_batch, batch))
+                await asyncio.shield(write)
+        await written
+        return [timestamp, activity]
+
+    def write_lines(self, lines: list):
+        """Appends formatted lines to the file with a single write (in the worker)"""
+        before = file_signature(self.file_name)
+        group_append(self.file_name, ''.join(lines).encode())
+        refresh_activities(self.file_name, self.tracking_file.cached_dialect(), before)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""Cold storage of closed periods of a tracking file
+
+Archiving moves all rows of closed periods (eg whole months before the
+current one) out of the tracking file into one chunk file per period. The
+chunks are listed in a manifest, one line per chunk:
+
+    <first timestamp>\\t<last timestamp>\\t<rows>\\t<chunk file>
+
+Chunk files are tracking files themselves, named after their period (eg
+`2018-04.txt`) and kept in a directory next to the manifest (`archive/` for
+`archive.txt`). A range query only opens the chunks whose time range overlaps
+it, so the tracking file stays small while nothing is lost.
+"""
+
+import os
+import bisect
+import operator
+from datetime import datetime, timedelta
+
+from .columns import Columns
+from .fileio import bisect_file, iter_chunks, parse_chunk
+from .objects import TrackingFile, Dialect
+from .locking import file_lock
+
+PERIODS = ('day', 'week', 'month', 'year')
+PERIOD_FORMATS = {'day': '%Y-%m-%d', 'week': '%G-W%V', 'month': '%Y-%m', 'year': '%Y'}
+
+def period_start(timestamp: int, period: str = 'month', tz_info=None) -> int:
+    """Returns the timestamp at which the period containing timestamp starts
+
+    Periods are calendar days, weeks (from Monday), months or years in
+    tz_info (local time if None).
+    """
+    moment = datetime.fromtimestamp(timestamp, tz=tz_info)
+    if period == 'day':
+        start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif period == 'week':
+        start = (moment.replace(hour=0, minute=0, second=0, microsecond=0)
+                 - timedelta(days=moment.weekday()))
+    elif period == 'month':
+        start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif period == 'year':
+        start = moment.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    else:
+        raise ValueError('period has to be one of {}'.format(', '.join(PERIODS)))
+    return int(start.timestamp())
+
+def next_period(start: int, period: str = 'month', tz_info=None) -> int:
+    """Returns the start of the period following the one starting at start"""
+    moment = datetime.fromtimestamp(start, tz=tz_info)
+    if period == 'day':
+        # Days can be 23 or 25 hours long, 36 hours are always the next day
+        return period_start(start + 36 * 3600, period, tz_info)
+    if period == 'week':
+        return period_start(start + 7 * 86400 + 12 * 3600, period, tz_info)
+    if period == 'month':
+        year, month = divmod(moment.month, 12)
+        moment = moment.replace(year=moment.year + year, month=month + 1)
+    else:
+        moment = moment.replace(year=moment.year + 1)
+    return int(moment.timestamp())
+
+
+class ManifestEntry:
+    """A chunk of the archive: its time range, number of rows and file"""
+    __slots__ = ('start', 'end', 'count', 'chunk')
+
+    def __init__(self, start: int, end: int, count: int, chunk: str):
+        self.start = start
+        self.end = end
+        self.count = count
+        self.chunk = chunk
+
+    def __repr__(self):
+        return '<{} `{}` {}-{}>'.format(type(self).__name__, self.chunk, self.start, self.end)
+
+    def overlaps(self, start, end) -> bool:
+        """Whether the chunk has rows that could be in start <= ts < end
+
+        None stands for an open end of the range.
+        """
+        return (end is None or self.start < end) and (start is None or self.end >= start)
+
+
+class Archive:
+    """Period-chunked cold storage belonging to a tracking file
+
+    manifest_name is the manifest (eg `archive.txt`), chunks are stored in
+    chunk_dir (the manifest name without extension by default).
+
+        >>> archive = Archive('archive.txt')
+        >>> archive.archive('time.txt', before=period_start(time.time()))
+        >>> archive.between(start, end, 'time.txt')
+    """
+    def __init__(self, manifest_name: str, chunk_dir=None, period: str = 'month',
+                 tz_info=None):
+        if period not in PERIODS:
+            raise ValueError('period has to be one of {}'.format(', '.join(PERIODS)))
+        self.manifest_name = manifest_name
+        self.chunk_dir = chunk_dir or os.path.splitext(manifest_name)[0]
+        self.period = period
+        self.tz_info = tz_info
+        self.entries = self.load()
+
+    def __repr__(self):
+        return '<{} at `{}`>'.format(type(self).__name__, self.manifest_name)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def load(self) -> list:
+        """Reads the manifest, an empty list if there is none"""
+        try:
+            with open(self.manifest_name, 'r') as manifest:
+                lines = [line.rstrip('\r\n').split('\t') for line in manifest]
+        except FileNotFoundError:
+            return []
+        entries = [ManifestEntry(int(start), int(end), int(count), chunk)
+                   for start, end, count, chunk in (line for line in lines if line[0])]
+        return sorted(entries, key=lambda entry: entry.start)
+
+    def store(self):
+        """Writes the manifest, replacing it in one step"""
+        temporary = self.manifest_name + '.tmp'
+        with open(temporary, 'w') as manifest:
+            for entry in self.entries:
+                manifest.write('{}\t{}\t{}\t{}\n'.format(entry.start, entry.end, entry.count,
+                                                        entry.chunk))
+        os.replace(temporary, self.manifest_name)
+
+    def signature(self) -> list:
+        """Returns what identifies the contents of the archive
+
+        Caches seeded from the archive keep it, to notice when chunks were
+        added or changed.
+        """
+        return [[entry.chunk, entry.start, entry.end, entry.count] for entry in self.entries]
+
+    def chunk_path(self, entry: ManifestEntry) -> str:
+        """Returns the path of the chunk file of entry"""
+        return os.path.join(os.path.dirname(self.manifest_name), entry.chunk)
+
+    def chunk_name(self, start: int) -> str:
+        """Returns the chunk file (relative to the manifest) of the period at start"""
+        name = datetime.fromtimestamp(start, tz=self.tz_info).strftime(PERIOD_FORMATS[self.period])
+        directory = os.path.relpath(self.chunk_dir, os.path.dirname(self.manifest_name) or '.')
+        return os.path.join(directory, name + '.txt')
+
+    def add_chunk(self, start: int, rows: Columns):
+        """Adds the rows of the period starting at start to its chunk
+
+        Rows of a period that already has a chunk (eg after back-dated
+        inserts) are merged into it. Rows already in the chunk are not added
+        twice, so an interrupted archive can simply be repeated; rows that
+        are in the chunk more than once stay so.
+        """
+        chunk = self.chunk_name(start)
+        entry = next((entry for entry in self.entries if entry.chunk == chunk), None)
+        tracking_file = TrackingFile(os.path.join(os.path.dirname(self.manifest_name), chunk),
+                                     Dialect)
+        if entry is not None:
+            tracking_file.read()
+            archived = set(map(tuple, tracking_file.data))
+            rows = Columns(sorted(tracking_file.data + [row for row in rows
+                                                        if tuple(row) not in archived],
+                                  key=operator.itemgetter(0)))
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        tracking_file.data = rows
+        tracking_file.loaded = True
+        tracking_file.write()
+        if entry is None:
+            entry = ManifestEntry(0, 0, 0, chunk)
+            self.entries.append(entry)
+        entry.start, entry.end, entry.count = rows.timestamps[0], rows.timestamps[-1], len(rows)
+        self.entries.sort(key=lambda entry: entry.start)
+
+    def archive(self, file_name: str, before: int) -> int:
+        """Moves the rows of file_name in periods ending before `before` here
+
+        before is rounded down to the start of its period, so only whole
+        periods are archived. The chunks and the manifest are written first,
+        the tracking file is replaced last, so an interruption leaves rows in
+        both places rather than in neither. The lock of file_name is held
+        throughout. Returns the number of rows moved.
+        """
+        with file_lock(file_name):
+            return self._archive(file_name, before)
+
+    def _archive(self, file_name: str, before: int) -> int:
+        """Archives with the lock of file_name held, see archive"""
+        before = period_start(before, self.period, self.tz_info)
+        tracking_file = TrackingFile(file_name)
+        tracking_file.read()
+        data = tracking_file.data
+        if not data.is_sorted:
+            data = Columns(sorted(data, key=lambda row: row[0]))
+        timestamps = data.timestamps
+        cut = bisect.bisect_left(timestamps, before)
+        if not cut:
+            return 0
+        start = period_start(timestamps[0], self.period, self.tz_info)
+        index = 0
+        while index < cut:
+            end = min(next_period(start, self.period, self.tz_info), before)
+            stop = bisect.bisect_left(timestamps, end, index, cut)
+            if stop > index:
+                self.add_chunk(start, data[index:stop])
+            index, start = stop, end
+        self.store()
+        tracking_file.data = data[cut:]
+        tracking_file.write()
+        return cut
+
+    def chunks_between(self, start=None, end=None) -> list:
+        """Returns the manifest entries overlapping start <= ts < end"""
+        return [entry for entry in self.entries if entry.overlaps(start, end)]
+
+    def between(self, start=None, end=None, file_name=None) -> Columns:
+        """Returns the rows with start <= timestamp < end
+
+        Only the chunks overlapping the range are read. If file_name (the
+        tracking file) is given, its rows in the range are added as well; it
+        has to be sorted, as the range is found by binary search on disk.
+        None leaves the range open at that end.
+        """
+        rows = Columns()
+        for entry in self.chunks_between(start, end):
+            tracking_file = TrackingFile(self.chunk_path(entry), Dialect)
+            tracking_file.read()
+            rows.extend(tracking_file.data.between(
+                entry.start if start is None else start,
+                entry.end + 1 if end is None else end))
+        if file_name is not None and os.path.exists(file_name):
+            dialect = TrackingFile(file_name).cached_dialect()
+            first = 0 if start is None else bisect_file(file_name, start - 1)
+            last = None if end is None else bisect_file(file_name, end - 1)
+            for chunk in iter_chunks(file_name, first, last):
+                parse_chunk(chunk, dialect, rows)
+        return rows
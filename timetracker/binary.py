@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""Binary storage of tracking data
+
+A binary tracking file holds an 8 byte header followed by fixed-width records
+of a little-endian int64 timestamp and uint32 activity id (12 bytes each).
+The activities the ids point to are kept in a dictionary file next to it
+(`time.bin.dict` for `time.bin`), one JSON string per line, the line number
+being the id. Both files are only ever appended to, so appending rows never
+rewrites anything, and new activities are written to the dictionary before
+the records using them.
+
+Nothing has to be parsed to read a binary file: the columns are copied out
+of the memory mapped records with strided slices. The text format stays the
+source of truth where it is needed, text_to_binary and binary_to_text
+convert without loss.
+"""
+
+import os
+import sys
+import time
+import json
+import mmap
+import struct
+from array import array
+
+from .columns import Columns, TIMESTAMP_TYPECODE, ACTIVITY_TYPECODE
+from .fileio import append_bytes
+from .objects import TrackingFile, Dialect
+
+MAGIC = b'TTB\x00'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+RECORD = struct.Struct('<qI')
+
+def dictionary_name(file_name: str) -> str:
+    """Returns the name of the activity dictionary of binary file_name"""
+    return file_name + '.dict'
+
+def is_binary(file_name: str) -> bool:
+    """Whether file_name is a binary tracking file"""
+    try:
+        with open(file_name, 'rb') as data_file:
+            return data_file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def load_dictionary(file_name: str) -> list:
+    """Loads the activity dictionary of binary file_name"""
+    try:
+        with open(dictionary_name(file_name), 'r', encoding='utf-8') as dictionary_file:
+            return [json.loads(line) for line in dictionary_file if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def dump_activities(activities) -> str:
+    """Formats activities as lines of the dictionary file"""
+    return ''.join(json.dumps(activity, ensure_ascii=False) + '\n' for activity in activities)
+
+def check_header(header: bytes, file_name: str):
+    """Raises ValueError if header is not a binary tracking file header"""
+    if len(header) < HEADER.size:
+        raise ValueError('`{}` is too short to be a binary tracking file'.format(file_name))
+    magic, version, record_size = HEADER.unpack_from(header)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError('`{}` is not a binary tracking file'.format(file_name))
+
+def little_endian(values, typecode: str) -> bytes:
+    """Returns the bytes of an array of values in little-endian order"""
+    if sys.byteorder == 'big':
+        values = array(typecode, values)
+        values.byteswap()
+    return bytes(values)
+
+def unpack_columns(buffer, count: int, start: int = 0):
+    """Copies the timestamp and activity id columns out of count records
+
+    buffer holds the records starting at byte start. Instead of unpacking
+    record by record, every byte of the fields is moved with one strided
+    slice, so the cost does not depend on the number of records in Python.
+    Returns arrays (timestamps, activity_ids).
+    """
+    end = start + count * RECORD.size
+    timestamps = bytearray(8 * count)
+    activity_ids = bytearray(4 * count)
+    for byte in range(8):
+        timestamps[byte::8] = buffer[start + byte:end:RECORD.size]
+    for byte in range(4):
+        activity_ids[byte::4] = buffer[start + 8 + byte:end:RECORD.size]
+    timestamps = array(TIMESTAMP_TYPECODE, timestamps)
+    activity_ids = array(ACTIVITY_TYPECODE, activity_ids)
+    if sys.byteorder == 'big':
+        timestamps.byteswap()
+        activity_ids.byteswap()
+    return timestamps, activity_ids
+
+def read_binary(file_name: str) -> Columns:
+    """Reads binary file_name into Columns
+
+    A trailing incomplete record (from an interrupted append) is ignored.
+    """
+    columns = Columns()
+    for activity in load_dictionary(file_name):
+        columns.intern(activity)
+    with open(file_name, 'rb') as data_file:
+        check_header(data_file.read(HEADER.size), file_name)
+        size = os.fstat(data_file.fileno()).st_size
+        count = (size - HEADER.size) // RECORD.size
+        if not count:
+            return columns
+        with mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            timestamps, activity_ids = unpack_columns(buffer, count, HEADER.size)
+    if max(activity_ids) >= len(columns.dictionary):
+        raise ValueError('`{}` refers to activities missing from its dictionary'
+                         .format(file_name))
+    columns.extend_columns(timestamps, activity_ids)
+    return columns
+
+def write_binary(file_name: str, rows):
+    """Writes rows into binary file_name (and its dictionary), replacing them
+
+    Rows with more fields than timestamp and activity cannot be stored and
+    raise ValueError.
+    """
+    columns = rows if isinstance(rows, Columns) else Columns(rows)
+    if columns.extra is not None and any(columns.extra):
+        raise ValueError('binary files only store timestamp and activity')
+    timestamps = little_endian(columns.timestamps, TIMESTAMP_TYPECODE)
+    activity_ids = little_endian(columns.activity_ids, ACTIVITY_TYPECODE)
+    records = bytearray(len(columns) * RECORD.size)
+    for byte in range(8):
+        records[byte::RECORD.size] = timestamps[byte::8]
+    for byte in range(4):
+        records[8 + byte::RECORD.size] = activity_ids[byte::4]
+    with open(dictionary_name(file_name), 'w', encoding='utf-8') as dictionary_file:
+        dictionary_file.write(dump_activities(columns.dictionary))
+    with open(file_name, 'wb') as data_file:
+        data_file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        data_file.write(records)
+
+def append_binary(file_name: str, rows):
+    """Appends rows to binary file_name, creating it if needed
+
+    Activities not yet in the dictionary are appended to the dictionary file
+    first, then all records are appended with a single write. Rows with more
+    fields than timestamp and activity raise ValueError.
+    """
+    dictionary = load_dictionary(file_name)
+    lookup = {activity: activity_id for activity_id, activity in enumerate(dictionary)}
+    known = len(dictionary)
+    records = bytearray()
+    size = os.path.getsize(file_name) if os.path.exists(file_name) else 0
+    if not size:
+        records += HEADER.pack(MAGIC, VERSION, RECORD.size)
+    elif (size - HEADER.size) % RECORD.size:
+        # Drop the incomplete record of an interrupted append
+        os.truncate(file_name, size - (size - HEADER.size) % RECORD.size)
+    for timestamp, activity, *extra in rows:
+        if extra:
+            raise ValueError('binary files only store timestamp and activity')
+        activity_id = lookup.get(activity)
+        if activity_id is None:
+            activity_id = len(dictionary)
+            dictionary.append(activity)
+            lookup[activity] = activity_id
+        records += RECORD.pack(timestamp, activity_id)
+    if len(dictionary) > known:
+        append_bytes(dictionary_name(file_name), dump_activities(dictionary[known:]).encode())
+    append_bytes(file_name, bytes(records))
+
+def tail_binary(file_name: str, count: int) -> Columns:
+    """Returns the last count rows of binary file_name, reading only those"""
+    columns = Columns()
+    for activity in load_dictionary(file_name):
+        columns.intern(activity)
+    with open(file_name, 'rb') as data_file:
+        check_header(data_file.read(HEADER.size), file_name)
+        size = os.fstat(data_file.fileno()).st_size
+        total = (size - HEADER.size) // RECORD.size
+        count = max(min(count, total), 0)
+        data_file.seek(HEADER.size + (total - count) * RECORD.size)
+        records = data_file.read(count * RECORD.size)
+    columns.extend_columns(*unpack_columns(records, count))
+    return columns
+
+def text_to_binary(text_name: str, binary_name: str, dialect=None):
+    """Converts tab-separated text_name into binary_name"""
+    tracking_file = TrackingFile(text_name, dialect)
+    tracking_file.read()
+    write_binary(binary_name, tracking_file.data)
+
+def binary_to_text(binary_name: str, text_name: str, dialect=None):
+    """Converts binary_name into text_name, replacing it"""
+    tracking_file = TrackingFile(text_name, dialect or Dialect)
+    tracking_file.data = read_binary(binary_name)
+    tracking_file.loaded = True
+    tracking_file.write()
+
+
+class BinaryTrackingFile(TrackingFile):
+    """A TrackingFile stored in the binary format
+
+    Works like TrackingFile: read, write (replacing or appending depending on
+    self.loaded), append_direct, tail and iter_rows use the binary file, and
+    format, save, segments and tree work on the data as usual. Rows can only
+    hold a timestamp and an activity.
+
+        >>> tf = BinaryTrackingFile('time.bin')
+        >>> tf.append_direct('Work')
+        >>> tf.read()
+    """
+    def read(self):
+        """Reads the binary file into self.data"""
+        with self.lock.shared_lock():
+            self.data = read_binary(self.file_name)
+        self.loaded = True
+
+    def map(self, assume_sorted: bool = False):
+        """Same as read, which copies the columns out of a memory map already"""
+        self.read()
+
+    def write(self):
+        """Writes self.data to the binary file, see TrackingFile.write"""
+        with self.lock:
+            if self.loaded:
+                write_binary(self.file_name, self.data)
+            else:
+                append_binary(self.file_name, self.data)
+        if not self.loaded:
+            self.data = []
+
+    def append_direct(self, activity: str, timestamp=None):
+        """Appends an activity to the binary file without reading it
+
+        The dictionary is loaded on every call (under the lock), as other
+        processes may have added activities since.
+        """
+        if timestamp is None:
+            timestamp = round(time.time())
+        with self.lock:
+            append_binary(self.file_name, [[timestamp, activity]])
+        return [timestamp, activity]
+
+    def tail(self, count: int = 5):
+        """Returns the last count rows without reading all of the file"""
+        return tail_binary(self.file_name, count)
+
+    def iter_rows(self, file_name=None, ts_format='unix'):
+        """Yields the rows of the binary file, or of the text file_name"""
+        if file_name is not None:
+            yield from super().iter_rows(file_name, ts_format)
+            return
+        yield from read_binary(self.file_name)
+
+    def cached_dialect(self):
+        """Binary files have no dialect, Dialect is used for text output"""
+        return self.dialect or Dialect
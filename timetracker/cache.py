@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""Incrementally updated totals per day and activity
+
+Reports need the time spent per activity, which needs every row of the
+file. The AggregateCache keeps these totals, per day and activity, in a
+sidecar (`.time.txt.aggregate`) together with how far into the file it has
+got. On every update only the bytes appended since are parsed.
+
+To notice edits to earlier parts of the file, the cache keeps a checkpoint
+at the first row of every day: its byte offset and the crc32 of the bytes up
+to the next checkpoint (for the last one, up to the processed offset, so it
+covers the last processed row). If the size or modification time of the file
+changed, the checkpoints are verified in order, and the totals are rebuilt
+from the day before the first one that does not match, not from scratch.
+Verifying only reads the file, which is a lot cheaper than parsing it.
+
+Each segment (from one row to the next) is counted on the day it starts in.
+The last row has no end yet and is only counted up to now if asked for. The
+file has to be sorted by timestamp, so that new rows only change the totals
+of the day of the last row and later ones. Totals of earlier days are kept
+in flat arrays sorted by day; the sidecar is a line of JSON followed by the
+raw arrays, so that loading it does not depend on the number of days.
+
+Rows moved to an archive (see archive.py) still count if the cache is given
+the manifest: the totals then start with those of the chunks, which are
+tracking files with caches of their own. The manifest entries the totals
+were seeded from are kept, if they change (eg after archiving again) the
+totals are rebuilt. Archived rows have to be older than those of the file.
+"""
+
+import os
+import json
+import time
+import zlib
+import bisect
+import operator
+from array import array
+from itertools import repeat
+from collections import Counter
+from datetime import datetime, date, time as datetime_time
+
+from .columns import Columns
+from .fileio import sidecar_name, iter_chunks, parse_chunk
+from .mapped import index_lines
+from .tree import ActivityTree
+from .objects import TrackingFile
+from .locking import file_lock
+from .archive import Archive
+
+VERSION = 3
+# Utc offsets change at full quarter hours, so all timestamps in one quarter
+# of an hour are on the same day.
+DAY_BLOCK = 900
+# Open totals are keyed by day << ID_BITS | activity id
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+# Names and typecodes of the arrays of the cache, in the order they are stored
+ARRAYS = (
+    ('days', 'i'),
+    ('activity_ids', 'I'),
+    ('seconds', 'q'),
+    ('counts', 'q'),
+    ('checkpoint_days', 'i'),
+    ('checkpoint_offsets', 'q'),
+    ('checkpoint_crcs', 'I'),
+)
+
+def tz_key(tz_info) -> str:
+    """Names the time zone days are counted in, to notice when it changes"""
+    if tz_info is None:
+        return 'local:' + ','.join(time.tzname)
+    return str(tz_info)
+
+
+class AggregateCache:
+    """Totals of seconds and segments per day and activity of a tracking file
+
+    Days are proleptic Gregorian ordinals in tz_info (local time if None),
+    activities are ids into dictionary. Totals of days before the day of the
+    last row are in the arrays days, activity_ids, seconds and counts,
+    sorted by day, and summed up per activity in closed_totals. Totals of
+    later days, which can still change, are in open_seconds and open_counts,
+    keyed by day << ID_BITS | activity id. Checkpoints are the arrays
+    checkpoint_days, checkpoint_offsets and checkpoint_crcs. The first
+    seeded entries of the arrays are the totals of the archive archive_name
+    (a manifest, see archive.py), if given.
+
+        >>> cache = AggregateCache('time.txt').update()
+        >>> cache.totals()['Work']
+        [36000, 12]
+    """
+    def __init__(self, file_name: str, tz_info=None, archive_name=None):
+        self.file_name = file_name
+        self.tz_info = tz_info
+        self.archive_name = archive_name
+        self.cache_name = sidecar_name(file_name, 'aggregate')
+        self.day_blocks = {}
+        self.loaded = False
+        self.clear()
+
+    def __repr__(self):
+        return '<{} of `{}`>'.format(type(self).__name__, self.file_name)
+
+    def clear(self):
+        """Forgets everything, the next update starts from scratch"""
+        for name, typecode in ARRAYS:
+            setattr(self, name, array(typecode))
+        self.dictionary = []
+        self.lookup = {}
+        self.closed_totals = {}
+        self.open_seconds = {}
+        self.open_counts = Counter()
+        self.offset = 0
+        self.size = None
+        self.mtime = None
+        self.pending = None
+        self.archived = []
+        self.seeded = 0
+
+    def intern(self, activity: str) -> int:
+        """Returns the id of activity, adding it to the dictionary if new"""
+        activity_id = self.lookup.get(activity)
+        if activity_id is None:
+            activity_id = self.lookup[activity] = len(self.dictionary)
+            self.dictionary.append(activity)
+        return activity_id
+
+    def day_of(self, timestamp: int) -> int:
+        """Returns the day of timestamp"""
+        block = timestamp // DAY_BLOCK
+        day = self.day_blocks.get(block)
+        if day is None:
+            day = datetime.fromtimestamp(block * DAY_BLOCK, tz=self.tz_info).toordinal()
+            self.day_blocks[block] = day
+        return day
+
+    def days_of(self, timestamps) -> list:
+        """Returns the days of sorted timestamps
+
+        Only the first timestamp of every day is converted, the rest of the
+        day is found by binary search for the next midnight.
+        """
+        days = []
+        index, length = 0, len(timestamps)
+        while index < length:
+            day = self.day_of(timestamps[index])
+            midnight = datetime.combine(date.fromordinal(day + 1), datetime_time(),
+                                        tzinfo=self.tz_info).timestamp()
+            end = bisect.bisect_left(timestamps, midnight, index)
+            days.extend(repeat(day, end - index))
+            index = end
+        return days
+
+    def load(self) -> bool:
+        """Loads the cache sidecar. Returns whether there was a usable one."""
+        self.loaded = True
+        try:
+            with open(self.cache_name, 'rb') as cache_file:
+                state = json.loads(cache_file.readline())
+                if state.get('version') != VERSION or state.get('tz') != tz_key(self.tz_info):
+                    return False
+                for (name, typecode), length in zip(ARRAYS, state['lengths']):
+                    values = array(typecode)
+                    values.fromfile(cache_file, length)
+                    setattr(self, name, values)
+        except (OSError, ValueError, KeyError, EOFError):
+            self.clear()
+            return False
+        self.dictionary = state['dictionary']
+        self.lookup = {activity: activity_id
+                       for activity_id, activity in enumerate(self.dictionary)}
+        self.closed_totals = {int(activity_id): totals
+                              for activity_id, totals in state['closed_totals'].items()}
+        self.open_seconds = {key: seconds for key, seconds, _ in state['open']}
+        self.open_counts = Counter({key: count for key, _, count in state['open']})
+        self.offset = state['offset']
+        self.size = state['size']
+        self.mtime = state['mtime']
+        self.pending = state['pending']
+        self.archived = state['archived']
+        self.seeded = state['seeded']
+        return True
+
+    def close_days(self):
+        """Moves the open totals of days before the day of the last row to the arrays
+
+        Open totals are added in order of their day, so the arrays stay sorted.
+        """
+        if self.pending is None:
+            return
+        limit = self.pending[2] << ID_BITS
+        closing = [key for key in self.open_seconds if key < limit]
+        if not closing:
+            return
+        activity_ids = array('I', [key & ID_MASK for key in closing])
+        seconds = array('q', map(self.open_seconds.pop, closing))
+        counts = array('q', map(self.open_counts.pop, closing))
+        self.days.extend([key >> ID_BITS for key in closing])
+        self.activity_ids.extend(activity_ids)
+        self.seconds.extend(seconds)
+        self.counts.extend(counts)
+        closed_totals = self.closed_totals
+        for activity_id, seconds, count in zip(activity_ids, seconds, counts):
+            total = closed_totals.get(activity_id)
+            if total is None:
+                closed_totals[activity_id] = [seconds, count]
+            else:
+                total[0] += seconds
+                total[1] += count
+
+    def store(self):
+        """Writes the cache sidecar. Failing to do so is not an error."""
+        self.close_days()
+        state = {
+            'version': VERSION,
+            'tz': tz_key(self.tz_info),
+            'offset': self.offset,
+            'size': self.size,
+            'mtime': self.mtime,
+            'pending': self.pending,
+            'archived': self.archived,
+            'seeded': self.seeded,
+            'dictionary': self.dictionary,
+            'closed_totals': self.closed_totals,
+            'open': [[key, seconds, self.open_counts[key]]
+                     for key, seconds in self.open_seconds.items()],
+            'lengths': [len(getattr(self, name)) for name, _ in ARRAYS],
+        }
+        temporary = self.cache_name + '.tmp'
+        try:
+            with open(temporary, 'wb') as cache_file:
+                cache_file.write(json.dumps(state, separators=(',', ':')).encode() + b'\n')
+                for name, _ in ARRAYS:
+                    getattr(self, name).tofile(cache_file)
+            os.replace(temporary, self.cache_name)
+        except OSError:
+            pass
+
+    def first_changed(self) -> int:
+        """Returns the index of the first checkpoint whose bytes changed
+
+        The number of checkpoints if none did.
+        """
+        offsets = self.checkpoint_offsets
+        ends = offsets[1:] + array('q', [self.offset])
+        with open(self.file_name, 'rb') as data_file:
+            for index, (start, end, expected) in enumerate(zip(offsets, ends,
+                                                               self.checkpoint_crcs)):
+                data_file.seek(start)
+                crc = 0
+                remaining = end - start
+                while remaining > 0:
+                    block = data_file.read(min(remaining, 1 << 20))
+                    if not block:
+                        return index
+                    crc = zlib.crc32(block, crc)
+                    remaining -= len(block)
+                if crc != expected:
+                    return index
+        return len(offsets)
+
+    def rewind(self, index: int):
+        """Drops everything that depends on the bytes of checkpoint index
+
+        Parsing restarts at the previous checkpoint: the segment ending at
+        its row is still right, but the segments of its day end in the
+        changed bytes.
+        """
+        if index == 0:
+            self.clear()
+            return
+        day, offset = self.checkpoint_days[index - 1], self.checkpoint_offsets[index - 1]
+        limit = day << ID_BITS
+        self.open_seconds = {key: seconds for key, seconds in self.open_seconds.items()
+                             if key < limit}
+        self.open_counts = Counter({key: count for key, count in self.open_counts.items()
+                                    if key < limit})
+        cut = max(bisect.bisect_left(self.days, day), self.seeded)
+        for activity_id, seconds, count in zip(self.activity_ids[cut:], self.seconds[cut:],
+                                               self.counts[cut:]):
+            totals = self.closed_totals[activity_id]
+            totals[0] -= seconds
+            totals[1] -= count
+        for name in ('days', 'activity_ids', 'seconds', 'counts'):
+            del getattr(self, name)[cut:]
+        for name in ('checkpoint_days', 'checkpoint_offsets', 'checkpoint_crcs'):
+            del getattr(self, name)[index - 1:]
+        self.offset = offset
+        self.pending = None
+
+    def update(self):
+        """Brings the totals up to date with the file and stores them
+
+        Returns self.
+        """
+        if not self.loaded:
+            self.load()
+        try:
+            stat = os.stat(self.file_name)
+        except FileNotFoundError:
+            self.clear()
+            return self
+        archive = None if self.archive_name is None else Archive(self.archive_name)
+        if (stat.st_size == self.size and stat.st_mtime_ns == self.mtime
+                and (archive is None or archive.signature() == self.archived)):
+            return self
+        with file_lock(self.file_name).shared_lock():
+            changed = self.first_changed()
+            if changed < len(self.checkpoint_offsets):
+                self.rewind(changed)
+            # Rebuilding from scratch forgets the archive as well
+            if archive is not None and archive.signature() != self.archived:
+                self.clear()
+                self.seed(archive)
+            self.fold(TrackingFile(self.file_name).cached_dialect())
+        self.size, self.mtime = stat.st_size, stat.st_mtime_ns
+        self.store()
+        return self
+
+    def seed(self, archive: Archive):
+        """Starts the totals with those of the chunks of archive
+
+        The totals of every chunk come from its own cache. The last row of a
+        chunk ends at the first row of the next one, the last archived row is
+        left pending until the first row of the file.
+        """
+        totals = Counter()
+        counts = Counter()
+        pending = None
+        for entry in archive:
+            chunk = AggregateCache(archive.chunk_path(entry), self.tz_info).update()
+            ids = array('I', [self.intern(activity) for activity in chunk.dictionary])
+            if pending is not None:
+                key = pending[2] << ID_BITS | pending[1]
+                totals[key] += max(entry.start - pending[0], 0)
+                counts[key] += 1
+            for day, activity_id, seconds, count in zip(chunk.days, chunk.activity_ids,
+                                                        chunk.seconds, chunk.counts):
+                key = day << ID_BITS | ids[activity_id]
+                totals[key] += seconds
+                counts[key] += count
+            for key, seconds in chunk.open_seconds.items():
+                day_key = key >> ID_BITS << ID_BITS | ids[key & ID_MASK]
+                totals[day_key] += seconds
+                counts[day_key] += chunk.open_counts[key]
+            if chunk.pending is not None:
+                pending = [chunk.pending[0], ids[chunk.pending[1]], chunk.pending[2]]
+        for key in sorted(totals):
+            activity_id = key & ID_MASK
+            self.days.append(key >> ID_BITS)
+            self.activity_ids.append(activity_id)
+            self.seconds.append(totals[key])
+            self.counts.append(counts[key])
+            total = self.closed_totals.setdefault(activity_id, [0, 0])
+            total[0] += totals[key]
+            total[1] += counts[key]
+        self.pending = pending
+        self.seeded = len(self.days)
+        self.archived = archive.signature()
+
+    def fold(self, dialect):
+        """Parses the file from self.offset and adds its segments to the totals
+
+        Only whole lines are parsed, an incomplete last line is left for the
+        next update.
+        """
+        for chunk in iter_chunks(self.file_name, self.offset):
+            end = chunk.rfind(b'\n') + 1
+            if not end:
+                break
+            chunk = chunk[:end]
+            rows = parse_chunk(chunk, dialect, Columns())
+            if rows:
+                starts = index_lines(chunk)
+                if len(starts) != len(rows):
+                    raise ValueError('rows of `{}` cannot be told apart after offset {}'
+                                     .format(self.file_name, self.offset))
+                self.fold_rows(rows, starts, chunk)
+            elif self.checkpoint_crcs:
+                self.checkpoint_crcs[-1] = zlib.crc32(chunk, self.checkpoint_crcs[-1])
+            self.offset += end
+
+    def fold_rows(self, rows: Columns, starts: list, chunk: bytes):
+        """Adds the segments of rows, parsed from chunk at self.offset, to the totals
+
+        starts are the offsets of the rows in chunk.
+        """
+        ids = [self.intern(activity) for activity in rows.dictionary]
+        timestamps = rows.timestamps
+        activity_ids = list(map(ids.__getitem__, rows.activity_ids))
+        if rows.is_sorted:
+            days = self.days_of(timestamps)
+        else:
+            days = list(map(self.day_of, timestamps))
+        # A segment starts at the pending row and at every row but the last
+        keys = list(map(operator.or_, map(operator.lshift, days, repeat(ID_BITS)),
+                        activity_ids))
+        if self.pending is None:
+            keys.pop()
+            durations = map(operator.sub, timestamps[1:], timestamps[:-1])
+        else:
+            keys.insert(0, self.pending[2] << ID_BITS | self.pending[1])
+            keys.pop()
+            durations = map(operator.sub, timestamps, [self.pending[0], *timestamps[:-1]])
+        open_seconds = self.open_seconds
+        get = open_seconds.get
+        for key, duration in zip(keys, durations):
+            open_seconds[key] = get(key, 0) + duration
+        self.open_counts.update(keys)
+        last_day = self.checkpoint_days[-1] if self.checkpoint_days else None
+        new_days = [index for index, day in enumerate(days)
+                    if day != (days[index - 1] if index else last_day)]
+        # Start of the bytes of chunk not yet added to the crc of the last checkpoint
+        crc_start = 0
+        for index in new_days:
+            # The first checkpoint covers anything before its row, too
+            if self.checkpoint_crcs:
+                self.checkpoint_crcs[-1] = zlib.crc32(chunk[crc_start:starts[index]],
+                                                      self.checkpoint_crcs[-1])
+                crc_start = starts[index]
+            self.checkpoint_days.append(days[index])
+            self.checkpoint_offsets.append(self.offset + crc_start)
+            self.checkpoint_crcs.append(0)
+        self.checkpoint_crcs[-1] = zlib.crc32(chunk[crc_start:], self.checkpoint_crcs[-1])
+        self.pending = [timestamps[-1], activity_ids[-1], days[-1]]
+
+    def totals(self, first_day=None, last_day=None, now=None) -> dict:
+        """Returns activity to [seconds, segments] summed over days
+
+        Only days from first_day to last_day (inclusive ordinals, None for
+        no limit) are included. If now is given, the last activity is counted
+        as going on until now.
+        """
+        def in_range(day):
+            return ((first_day is None or day >= first_day)
+                    and (last_day is None or day <= last_day))
+        if first_day is None and last_day is None:
+            totals = {activity_id: list(total) for activity_id, total in self.closed_totals.items()}
+        else:
+            totals = {}
+            low = 0 if first_day is None else bisect.bisect_left(self.days, first_day)
+            high = (len(self.days) if last_day is None
+                    else bisect.bisect_right(self.days, last_day))
+            for activity_id, seconds, count in zip(self.activity_ids[low:high],
+                                                   self.seconds[low:high],
+                                                   self.counts[low:high]):
+                total = totals.setdefault(activity_id, [0, 0])
+                total[0] += seconds
+                total[1] += count
+        for key, seconds in self.open_seconds.items():
+            if in_range(key >> ID_BITS):
+                total = totals.setdefault(key & ID_MASK, [0, 0])
+                total[0] += seconds
+                total[1] += self.open_counts[key]
+        if now is not None and self.pending is not None and in_range(self.pending[2]):
+            total = totals.setdefault(self.pending[1], [0, 0])
+            total[0] += max(now - self.pending[0], 0)
+            total[1] += 1
+        return {self.dictionary[activity_id]: total
+                for activity_id, total in totals.items() if total[1]}
+
+    def tree(self, now=None, **kwargs) -> ActivityTree:
+        """Returns the ActivityTree of totals (see totals for now)"""
+        tree = ActivityTree(**kwargs)
+        for activity, (seconds, count) in sorted(self.totals(now=now).items(),
+                                                 key=operator.itemgetter(0)):
+            tree.add(activity, seconds, count)
+        return tree
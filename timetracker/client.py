@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Client of the tt daemon (see daemon.py)
+
+Every request is a connection to the Unix socket of the daemon
+(`.time.txt.socket` next to the tracking file). The command and its
+arguments are sent separated by NUL bytes, ended by closing the sending
+side. The daemon answers with a status line, `ok` or `error`, followed by
+the result or the error message, and closes the connection.
+
+This module is used on every call of tt, so it imports socket only if a
+daemon seems to be running.
+"""
+
+import os
+
+from .fileio import sidecar_name
+
+# Seconds to wait for the daemon before giving up
+TIMEOUT = 5
+
+class DaemonUnavailable(ConnectionError):
+    """No daemon is running for the file"""
+
+class DaemonError(RuntimeError):
+    """The daemon could not carry out a request"""
+
+class DaemonNoAnswer(DaemonError):
+    """The request was sent, but the daemon did not answer
+
+    The daemon may have carried out the request all the same.
+    """
+
+def socket_name(file_name: str) -> str:
+    """Returns the name of the socket of the daemon serving file_name"""
+    return sidecar_name(file_name, 'socket')
+
+def encode_request(command: str, args) -> bytes:
+    """Encodes a command and its arguments for sending"""
+    return '\0'.join([command, *map(str, args)]).encode()
+
+def decode_request(data: bytes) -> list:
+    """Decodes a request into the command and its arguments"""
+    return data.decode().split('\0')
+
+def request(file_name: str, command: str, *args, timeout: float = TIMEOUT) -> str:
+    """Sends command with args to the daemon of file_name and returns the result
+
+    Raises DaemonUnavailable if no daemon is running (or it cannot be
+    connected to), so that the caller can fall back to accessing the file
+    itself, and DaemonError if the command failed. If the connection fails
+    or times out after the request was sent, DaemonNoAnswer is raised, as
+    the command may have been carried out.
+    """
+    name = socket_name(file_name)
+    if not os.path.exists(name):
+        raise DaemonUnavailable('no daemon is running for `{}`'.format(file_name))
+    import socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        try:
+            connection.connect(name)
+        except OSError as error:
+            # Includes socket.timeout
+            raise DaemonUnavailable('cannot connect to the daemon of `{}`: {}'.format(
+                file_name, error)) from error
+        blocks = []
+        try:
+            connection.sendall(encode_request(command, args))
+            connection.shutdown(socket.SHUT_WR)
+            while True:
+                block = connection.recv(1 << 16)
+                if not block:
+                    break
+                blocks.append(block)
+        except OSError as error:
+            raise DaemonNoAnswer('the daemon of `{}` did not answer: {}'.format(
+                file_name, error)) from error
+    status, _, result = b''.join(blocks).decode(errors='replace').partition('\n')
+    if status == 'ok':
+        return result
+    if status == 'error':
+        raise DaemonError(result)
+    raise DaemonNoAnswer('the daemon of `{}` did not answer'.format(file_name))
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""Column-wise storage of tracking data"""
+
+import bisect
+import operator
+from array import array
+from itertools import islice
+from collections.abc import MutableSequence, Sequence
+
+TIMESTAMP_TYPECODE = 'q'
+ACTIVITY_TYPECODE = 'I'
+
+class Columns(MutableSequence):
+    """Tracking data stored as columns instead of a list of rows
+
+    Timestamps are kept in an array of int64 and activities as uint32 ids
+    into a dictionary of activity strings, so that every distinct activity is
+    stored only once. Any further fields of a row (beyond timestamp and
+    activity) are kept in the extra column, which only exists if such rows
+    were ever added.
+
+    Towards the outside this behaves like the list of rows it replaces:
+
+        >>> data = Columns([[0, 'Free'], [60, 'Work']])
+        >>> data[1]
+        [60, 'Work']
+        >>> data[-1:]
+        Columns([[60, 'Work']])
+
+    Rows handed out are new lists, changing them does not change the data.
+    Slices are new Columns sharing the dictionary with the original. As the
+    dictionary is only ever appended to, this is safe.
+    The columns can be accessed directly without copying through timestamps,
+    activity_ids and dictionary.
+
+    Whether the rows are sorted by timestamp is tracked in is_sorted. Appends
+    in order and deletions keep it, other changes make it unknown until it is
+    asked for again.
+    """
+    def __init__(self, rows=(), dictionary=None, lookup=None):
+        self.timestamps = array(TIMESTAMP_TYPECODE)
+        self.activity_ids = array(ACTIVITY_TYPECODE)
+        self.dictionary = [] if dictionary is None else dictionary
+        self.lookup = {} if lookup is None else lookup
+        self.extra = None
+        self._sorted = True
+        self.extend(rows)
+
+    def _derive(self, timestamps, activity_ids, extra=None, is_sorted=None):
+        """Creates new Columns from columns, sharing the dictionary"""
+        new = type(self)(dictionary=self.dictionary, lookup=self.lookup)
+        new.timestamps = timestamps
+        new.activity_ids = activity_ids
+        new.extra = extra
+        new._sorted = is_sorted
+        return new
+
+    def _extra_of(self, row):
+        """Returns the extra fields of row, creating the extra column if needed"""
+        extra = tuple(row[2:])
+        if extra and self.extra is None:
+            self.extra = [()] * len(self)
+        return extra
+
+    def intern(self, activity: str) -> int:
+        """Returns the id of activity in the dictionary, adding it if new"""
+        activity_id = self.lookup.get(activity)
+        if activity_id is None:
+            activity_id = len(self.dictionary)
+            self.dictionary.append(activity)
+            self.lookup[activity] = activity_id
+        return activity_id
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            extra = self.extra[key] if self.extra is not None else None
+            is_sorted = self._sorted if key.step is None or key.step > 0 else None
+            return self._derive(self.timestamps[key], self.activity_ids[key], extra, is_sorted)
+        row = [self.timestamps[key], self.dictionary[self.activity_ids[key]]]
+        if self.extra is not None:
+            row.extend(self.extra[key])
+        return row
+
+    def __setitem__(self, key, value):
+        self._sorted = None
+        if isinstance(key, slice):
+            value = value if isinstance(value, Columns) else Columns(value)
+            if value.extra is not None and self.extra is None:
+                self.extra = [()] * len(self)
+            activity_ids = array(ACTIVITY_TYPECODE,
+                                 map(self.intern, value.activities))
+            self.timestamps[key] = value.timestamps
+            self.activity_ids[key] = activity_ids
+            if self.extra is not None:
+                self.extra[key] = value.extra if value.extra is not None else [()] * len(value)
+            return
+        extra = self._extra_of(value)
+        timestamp = value[0]
+        activity_id = self.intern(value[1])
+        self.timestamps[key] = timestamp
+        self.activity_ids[key] = activity_id
+        if self.extra is not None:
+            self.extra[key] = extra
+
+    def __delitem__(self, key):
+        del self.timestamps[key]
+        del self.activity_ids[key]
+        if self.extra is not None:
+            del self.extra[key]
+
+    def __iter__(self):
+        dictionary = self.dictionary
+        if self.extra is None:
+            for timestamp, activity_id in zip(self.timestamps, self.activity_ids):
+                yield [timestamp, dictionary[activity_id]]
+        else:
+            for timestamp, activity_id, extra in zip(self.timestamps, self.activity_ids,
+                                                     self.extra):
+                yield [timestamp, dictionary[activity_id], *extra]
+
+    def __eq__(self, other):
+        if isinstance(other, Columns):
+            if (self.dictionary is other.dictionary and self.extra is None
+                    and other.extra is None):
+                return (self.timestamps == other.timestamps
+                        and self.activity_ids == other.activity_ids)
+            return list(self) == list(other)
+        if isinstance(other, Sequence) and not isinstance(other, (str, bytes)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __add__(self, other):
+        new = self[:]
+        new.extend(other)
+        return new
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, list(self))
+
+    def insert(self, index, value):
+        self._sorted = None
+        extra = self._extra_of(value)
+        activity_id = self.intern(value[1])
+        self.timestamps.insert(index, value[0])
+        self.activity_ids.insert(index, activity_id)
+        if self.extra is not None:
+            self.extra.insert(index, extra)
+
+    def append(self, value):
+        extra = self._extra_of(value)
+        activity_id = self.intern(value[1])
+        if self._sorted and self.timestamps and value[0] < self.timestamps[-1]:
+            self._sorted = False
+        self.timestamps.append(value[0])
+        self.activity_ids.append(activity_id)
+        if self.extra is not None:
+            self.extra.append(extra)
+
+    def extend(self, values):
+        if isinstance(values, Columns) and values.extra is None and self.extra is None:
+            if values.dictionary is self.dictionary:
+                self.activity_ids.extend(values.activity_ids)
+            else:
+                self.activity_ids.extend(map(self.intern, values.activities))
+            self.timestamps.extend(values.timestamps)
+            self._sorted = None
+            return
+        for value in values:
+            self.append(value)
+
+    def extend_columns(self, timestamps, activity_ids):
+        """Appends rows given as whole columns
+
+        activity_ids have to be ids in this dictionary (see intern). This is
+        considerably faster than appending rows one by one.
+        """
+        length = len(self)
+        try:
+            self.timestamps.extend(timestamps)
+            self.activity_ids.extend(activity_ids)
+        except Exception:
+            del self.timestamps[length:]
+            del self.activity_ids[length:]
+            raise
+        if self.extra is not None:
+            self.extra.extend([()] * (len(self) - length))
+        if self._sorted:
+            self._sorted = None
+
+    @property
+    def activities(self):
+        """Activities of all rows as a list of (shared) strings"""
+        return list(map(self.dictionary.__getitem__, self.activity_ids))
+
+    @property
+    def is_sorted(self) -> bool:
+        """Whether the rows are sorted by timestamp
+
+        This is tracked on appends and only computed (once) when unknown.
+        """
+        if self._sorted is None:
+            timestamps = self.timestamps
+            self._sorted = all(map(operator.le, timestamps, islice(timestamps, 1, None)))
+        return self._sorted
+
+    def between(self, start: int, end: int):
+        """Returns the rows with start <= timestamp < end
+
+        If the rows are sorted, the range is found by binary search and a
+        ColumnsView on this data is returned. Otherwise the rows are filtered
+        into new Columns.
+        """
+        if self.is_sorted:
+            return ColumnsView(self, bisect.bisect_left(self.timestamps, start),
+                               bisect.bisect_left(self.timestamps, end))
+        return Columns((row for row in self if start <= row[0] < end),
+                       dictionary=self.dictionary, lookup=self.lookup)
+
+    def at(self, timestamp: int):
+        """Returns the row that is going on at timestamp
+
+        This is the last row starting at or before timestamp, None if there
+        is none. Uses binary search if the rows are sorted.
+        """
+        if self.is_sorted:
+            index = bisect.bisect_right(self.timestamps, timestamp) - 1
+        else:
+            candidates = [(row_timestamp, index)
+                          for index, row_timestamp in enumerate(self.timestamps)
+                          if row_timestamp <= timestamp]
+            index = max(candidates)[1] if candidates else -1
+        return self[index] if index >= 0 else None
+
+
+class ColumnsView(Sequence):
+    """A read-only view on a range of rows of Columns
+
+    Nothing is copied: rows are taken from the underlying Columns when they
+    are accessed, and timestamps and activity_ids are memoryviews on its
+    columns. Like all memoryviews they block resizing of the columns while
+    they exist, so do not hold on to them while changing the data.
+    Changes to the underlying Columns show in the view.
+    """
+    def __init__(self, columns: Columns, start: int, stop: int):
+        self.columns = columns
+        self.start = start
+        self.stop = max(start, stop)
+        self.dictionary = columns.dictionary
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return ColumnsView(self.columns, self.start + start, self.start + stop)
+            return self.columns[self.start + start:self.start + stop:step]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('view index out of range')
+        return self.columns[self.start + key]
+
+    def __iter__(self):
+        # Slices of the arrays copy only the rows of the view
+        return iter(self.columns[self.start:self.stop])
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, (str, bytes)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<{} of rows {}:{}>'.format(type(self).__name__, self.start, self.stop)
+
+    @property
+    def timestamps(self):
+        """Timestamps of the rows as a memoryview"""
+        return memoryview(self.columns.timestamps)[self.start:self.stop]
+
+    @property
+    def activity_ids(self):
+        """Activity ids of the rows as a memoryview"""
+        return memoryview(self.columns.activity_ids)[self.start:self.stop]
+
+    @property
+    def activities(self):
+        """Activities of the rows as a list of (shared) strings"""
+        return list(map(self.dictionary.__getitem__,
+                        self.columns.activity_ids[self.start:self.stop]))
+
+    @property
+    def is_sorted(self) -> bool:
+        """Whether the rows are sorted by timestamp"""
+        return self.columns.is_sorted or self.copy().is_sorted
+
+    def copy(self) -> Columns:
+        """Copies the rows of the view into new Columns"""
+        return self.columns[self.start:self.stop]
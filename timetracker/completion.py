@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Completion of activities for shells
+
+Shells ask for completions on every press of tab, so answering has to take
+milliseconds, whatever the size of the file. Completions are precomputed
+from the activity dictionary whenever it changes: the sidecar
+`.time.txt.complete` holds a trie of activity segments, one line per node
+with its children, best first:
+
+    <size>\\t<mtime>
+    \\tFree\\tWork\\tLunch
+    Work\\tWork:Code\\tWork:Mail
+
+The first line is the size and modification time of the tracking file the
+completions belong to. Children are ranked by frecency: the number of uses
+of all activities below them, halved for every HALF_LIFE since their last
+use.
+
+Completing only reads this file. This module is imported for completing, so
+it only imports what is cheap to import (json alone imports re).
+"""
+
+import os
+import time
+
+from .tree import SEPARATOR
+
+# Seconds after which an activity counts half
+HALF_LIFE = 30 * 86400
+
+def completion_name(file_name: str) -> str:
+    """Returns the name of the completion sidecar of file_name
+
+    The same as fileio.sidecar_name(file_name, 'complete'), which is not
+    imported as fileio imports columns (and with it array and
+    collections.abc) on every completion.
+    """
+    directory, base_name = os.path.split(file_name)
+    return os.path.join(directory, '.{}.complete'.format(base_name))
+
+def rank_children(entries, now=None) -> dict:
+    """Returns the ranked children of every node of the activity trie
+
+    entries maps activities to ActivityEntry (anything with count and
+    last_used). The result maps every node (`` for the root) to its
+    children, best first.
+    """
+    if now is None:
+        now = time.time()
+    scores = {}
+    for activity, entry in entries.items():
+        score = entry.count * 0.5 ** (max(now - entry.last_used, 0) / HALF_LIFE)
+        parts = activity.split(SEPARATOR)
+        for depth in range(1, len(parts) + 1):
+            node = SEPARATOR.join(parts[:depth])
+            scores[node] = scores.get(node, 0) + score
+    children = {}
+    for node in scores:
+        parent = node.rpartition(SEPARATOR)[0]
+        children.setdefault(parent, []).append(node)
+    for nodes in children.values():
+        nodes.sort(key=lambda node: (-scores[node], node))
+    return children
+
+def store_completions(file_name: str, entries, size: int, mtime: int, now=None):
+    """Writes the completion sidecar of file_name from the activity entries
+
+    size and mtime are those of file_name when entries were up to date.
+    Activities with tabs or newlines cannot be completed and are left out.
+    Failing to write is not an error.
+    """
+    entries = {activity: entry for activity, entry in entries.items()
+               if '\t' not in activity and '\n' not in activity}
+    lines = ['{}\t{}'.format(size, mtime)]
+    for parent, nodes in sorted(rank_children(entries, now).items()):
+        lines.append('\t'.join([parent] + nodes))
+    completions = completion_name(file_name)
+    temporary = completions + '.tmp'
+    try:
+        with open(temporary, 'w') as completion_file:
+            completion_file.write('\n'.join(lines) + '\n')
+        os.replace(temporary, completions)
+    except OSError:
+        pass
+
+def parent_of(prefix: str) -> str:
+    """Returns the node whose children complete prefix, `` for the root"""
+    parent, separator, _ = prefix.rpartition(SEPARATOR)
+    return parent if separator else ''
+
+def load_completions(file_name: str, prefix: str = ''):
+    """Returns the stored completions of prefix, best first
+
+    Returns None if there are no completions for the current state of
+    file_name.
+    """
+    try:
+        stat = os.stat(file_name)
+        with open(completion_name(file_name), 'r') as completion_file:
+            content = completion_file.read()
+    except OSError:
+        return None
+    header, _, content = content.partition('\n')
+    if header != '{}\t{}'.format(stat.st_size, stat.st_mtime_ns):
+        return None
+    parent = parent_of(prefix)
+    if content.startswith(parent + '\t'):
+        start = 0
+    else:
+        start = content.find('\n{}\t'.format(parent))
+        if start == -1:
+            return []
+        start += 1
+    end = content.find('\n', start)
+    line = content[start:end if end != -1 else len(content)]
+    return [node for node in line.split('\t')[1:] if node.startswith(prefix)]
+
+def complete(file_name: str, prefix: str = '', archive_name=None) -> list:
+    """Returns the activities and activity segments starting with prefix
+
+    Only the next segment is completed (`Work:` completes to `Work:Code`,
+    not `Work:Code:Review`), best first. If the completions are out of date,
+    the activity dictionary (with the archive archive_name, if given) is
+    updated and they are stored again, which takes longer.
+    """
+    completions = load_completions(file_name, prefix)
+    if completions is not None:
+        return completions
+    if not os.path.exists(file_name):
+        return []
+    # Imported here, as they are slow to import
+    from .objects import TrackingFile
+    from .activities import ActivityDictionary
+    activities = ActivityDictionary(file_name, archive_name)
+    activities.update(TrackingFile(file_name).cached_dialect())
+    store_completions(file_name, activities.entries, activities.size, activities.mtime)
+    nodes = rank_children(activities.entries).get(parent_of(prefix), [])
+    return [node for node in nodes if node.startswith(prefix)]
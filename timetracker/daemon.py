@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""A resident daemon serving a tracking file
+
+`tt serve` keeps the activity dictionary, the aggregate cache and the
+dialect of a tracking file in memory and answers commands over a Unix
+socket next to it (see client.py for the protocol). Appends are written
+through to the file with group_append, so other processes can still use the
+file directly at any time. Caches are brought up to date when the file
+changed, which for appends means parsing only the new lines.
+
+Requests are handled one at a time, so the caches need no locking. A
+client has REQUEST_TIMEOUT seconds to send its request, well within the
+time other clients wait for their answer (client.TIMEOUT).
+"""
+
+import os
+import time
+import socketserver
+import threading
+
+from .objects import TrackingFile
+from .fileio import tail_lines
+from .locking import group_append
+from .activities import ActivityDictionary, file_signature
+from .cache import AggregateCache
+from .completion import complete
+from .client import (DaemonError, DaemonUnavailable, socket_name, decode_request, request)
+
+# Seconds a client has to send its request
+REQUEST_TIMEOUT = 1
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Reads one request, answers it and closes the connection
+
+    Reading times out after the request_timeout of the daemon, so that a
+    client that stalls does not keep it from answering everybody else.
+    """
+
+    def setup(self):
+        self.timeout = self.server.request_timeout
+        super().setup()
+
+    def handle(self):
+        try:
+            data = self.rfile.read()
+        except OSError:
+            # Timed out or gone, the client gets no answer
+            return
+        command, *args = decode_request(data)
+        try:
+            result = self.server.dispatch(command, args)
+        except Exception as error:  # pylint: disable=broad-except
+            response = 'error\n{}: {}'.format(type(error).__name__, error)
+        else:
+            response = 'ok\n{}'.format(result)
+        self.wfile.write(response.encode())
+
+
+class Daemon(socketserver.UnixStreamServer):
+    """Serves the tracking file file_name on a Unix socket
+
+    Activities and totals include those of the archive archive_name (a
+    manifest, see archive.py), if given.
+
+        >>> daemon = Daemon('time.txt')
+        >>> daemon.serve_forever()
+    """
+    request_timeout = REQUEST_TIMEOUT
+
+    def __init__(self, file_name: str, socket_name_=None, archive_name=None):
+        self.file_name = file_name
+        self.archive_name = archive_name
+        self.tracking_file = TrackingFile(file_name)
+        self.activities = ActivityDictionary(file_name, archive_name)
+        self.aggregates = AggregateCache(file_name, archive_name=archive_name)
+        self.commands = {
+            'ping': self.ping,
+            'append': self.append,
+            'tail': self.tail,
+            'list': self.list,
+            'complete': self.complete,
+            'tree': self.tree,
+            'stop': self.stop,
+        }
+        name = socket_name_ or socket_name(file_name)
+        self.remove_stale_socket(name)
+        super().__init__(name, _Handler)
+
+    def __repr__(self):
+        return '<{} of `{}`>'.format(type(self).__name__, self.file_name)
+
+    def remove_stale_socket(self, name: str):
+        """Removes the socket of a daemon that is no longer running
+
+        Raises DaemonError if the daemon is still running, including one that
+        is too busy to answer.
+        """
+        if not os.path.exists(name):
+            return
+        try:
+            request(self.file_name, 'ping', timeout=1)
+        except DaemonUnavailable:
+            os.remove(name)
+            return
+        except DaemonError:
+            pass
+        raise DaemonError('a daemon is already running for `{}`'.format(self.file_name))
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+
+    def dispatch(self, command: str, args: list) -> str:
+        """Carries out command with args and returns its result"""
+        try:
+            method = self.commands[command]
+        except KeyError:
+            raise ValueError('unknown command `{}`'.format(command)) from None
+        return method(*args)
+
+    def ping(self) -> str:
+        """Answers that the daemon is running"""
+        return 'pong'
+
+    def append(self, activity: str, timestamp=None) -> str:
+        """Appends activity (now, or at timestamp) and returns the line written"""
+        timestamp = round(time.time()) if timestamp is None else int(timestamp)
+        line = '{}\t{}\n'.format(timestamp, activity)
+        before = file_signature(self.file_name)
+        group_append(self.file_name, line.encode())
+        # Keeps the dictionary and completions on disk current for tt complete
+        try:
+            self.activities.update(self.tracking_file.cached_dialect(), before)
+        except (OSError, ValueError):
+            # The line is written, failing here would make clients append it
+            # again. The dictionary is rebuilt by the next update.
+            self.activities.clear()
+        return line
+
+    def tail(self, count='5') -> str:
+        """Returns the last count lines of the file"""
+        return '\n'.join(tail_lines(self.file_name, int(count)))
+
+    def list(self) -> str:
+        """Returns the sorted activities"""
+        return '\n'.join(self.activities.update(self.tracking_file.cached_dialect()).names())
+
+    def complete(self, prefix='') -> str:
+        """Returns the completions of prefix"""
+        # Updating the dictionary stores the completions as well
+        self.activities.update(self.tracking_file.cached_dialect())
+        return '\n'.join(complete(self.file_name, prefix, self.archive_name))
+
+    def tree(self, depth=None) -> str:
+        """Returns the time spent per activity up to now, as tt tree"""
+        tree = self.aggregates.update().tree(now=round(time.time()))
+        return tree.format(int(depth) if depth else None)
+
+    def stop(self) -> str:
+        """Stops the daemon after answering"""
+        # shutdown waits for serve_forever, which is handling this request
+        threading.Thread(target=self.shutdown).start()
+        return 'stopped'
+
+
+def serve(file_name: str, socket_name_=None, archive_name=None):
+    """Serves file_name (with the archive archive_name) until the daemon is stopped"""
+    with Daemon(file_name, socket_name_, archive_name) as daemon:
+        daemon.serve_forever()
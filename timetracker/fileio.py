@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Low-level file access for tracking files
+
+These functions work on the raw bytes of a tracking file. They exist so that
+the common operations of `tt` do not have to parse the whole file.
+
+csv, json and re are imported by the functions using them, so that tailing
+and appending do not import them.
+"""
+
+import os
+import heapq
+
+from .columns import Columns
+
+TAIL_BLOCK_SIZE = 4096
+CHUNK_SIZE = 1 << 20
+# Bytes at the start of a file the dialect is sniffed from
+SNIFF_SIZE = 1024
+DIALECT_ATTRIBUTES = ('delimiter', 'doublequote', 'escapechar', 'lineterminator',
+                      'quotechar', 'quoting', 'skipinitialspace')
+
+def tail_lines(file_name: str, count: int, block_size: int = TAIL_BLOCK_SIZE,
+               end=None) -> list:
+    """Returns the last count lines of file_name without reading the whole file.
+
+    The file is read in blocks of block_size bytes, starting at the end (or
+    at byte offset end, which should be the start of a line) and moving
+    backwards until count complete lines have been found or the start of the
+    file is reached. The cost of this depends on count and the length of the
+    lines, not on the size of the file.
+
+    Lines are returned as strings without line terminators. A trailing empty
+    line (the file ending in a newline) is not counted.
+    """
+    if count <= 0:
+        return []
+    with open(file_name, 'rb') as data_file:
+        position = data_file.seek(0, os.SEEK_END)
+        if end is not None:
+            position = min(position, end)
+        blocks = []
+        newlines = 0
+        # count+1 newlines guarantee count complete lines, even if the file
+        # ends with a newline.
+        while position > 0 and newlines <= count:
+            size = min(block_size, position)
+            position -= size
+            data_file.seek(position)
+            block = data_file.read(size)
+            newlines += block.count(b'\n')
+            blocks.append(block)
+    lines = b''.join(reversed(blocks)).split(b'\n')
+    if lines and not lines[-1]:
+        del lines[-1]
+    if position > 0:
+        # The first line is most likely incomplete
+        del lines[0]
+    return [line.rstrip(b'\r').decode() for line in lines[-count:]]
+
+def read_lines(file_name: str, start: int, count: int) -> list:
+    """Returns up to count lines of file_name starting at byte offset start
+
+    Lines are returned as strings without line terminators.
+    """
+    lines = []
+    with open(file_name, 'rb') as data_file:
+        data_file.seek(start)
+        for _ in range(count):
+            line = data_file.readline()
+            if not line:
+                break
+            lines.append(line.rstrip(b'\r\n').decode())
+    return lines
+
+def _line_timestamp(line: bytes) -> int:
+    """Returns the unix timestamp at the start of a canonical line"""
+    return int(line.split(b'\t', 1)[0])
+
+def bisect_file(file_name: str, timestamp: int) -> int:
+    """Finds where a row with timestamp belongs in a sorted canonical file
+
+    Returns the byte offset of the first line with a timestamp greater than
+    timestamp (so new rows go after existing ones with the same timestamp).
+    This is a binary search over byte offsets, which reads a handful of lines
+    instead of the file. Empty lines are skipped.
+    """
+    with open(file_name, 'rb') as data_file:
+        low, high = 0, data_file.seek(0, os.SEEK_END)
+        while low < high:
+            middle = (low + high) // 2
+            # Go to the start of the first line starting at or after middle
+            data_file.seek(max(middle - 1, 0))
+            if middle:
+                data_file.readline()
+            start = data_file.tell()
+            if start >= high:
+                # No line starts in [middle, high), look further left
+                high = middle
+                continue
+            line = data_file.readline()
+            while not line.strip() and data_file.tell() < high:
+                line = data_file.readline()
+            if not line.strip():
+                # Only empty lines in [start, high)
+                high = start
+            elif _line_timestamp(line) <= timestamp:
+                low = data_file.tell()
+            else:
+                high = start
+    return low
+
+def insert_lines(file_name: str, rows: list) -> int:
+    """Inserts lines into a sorted canonical file, keeping it sorted
+
+    rows are pairs of (timestamp, line), where line includes the line
+    terminator. The position of the earliest row is found with bisect_file;
+    only the part of the file after it is read and rewritten, once for all
+    rows. Returns the byte offset at which the first row was inserted.
+    """
+    rows = sorted(rows, key=lambda row: row[0])
+    if not rows:
+        return os.path.getsize(file_name)
+    offset = bisect_file(file_name, rows[0][0])
+    with open(file_name, 'r+b') as data_file:
+        if offset:
+            data_file.seek(offset - 1)
+            if data_file.read(1) != b'\n':
+                # The file does not end in a newline (offset is its end)
+                data_file.write(b'\n')
+                offset += 1
+        data_file.seek(offset)
+        suffix = data_file.read().splitlines(keepends=True)
+        if suffix and not suffix[-1].endswith(b'\n'):
+            suffix[-1] += b'\n'
+        suffix_rows = ((_line_timestamp(line), line) for line in suffix if line.strip())
+        new_rows = ((timestamp, line.encode()) for timestamp, line in rows)
+        merged = heapq.merge(suffix_rows, new_rows, key=lambda row: row[0])
+        data_file.seek(offset)
+        data_file.write(b''.join(line for _, line in merged))
+        # Without its empty lines, the suffix may have become shorter
+        data_file.truncate()
+    return offset
+
+def append_line(file_name: str, line: str):
+    """Appends line to file_name with a single write.
+
+    The file is opened with O_APPEND, so the line is written at the end of the
+    file even if other processes append at the same time. The file is created
+    if it does not exist. Nothing is read.
+    """
+    append_bytes(file_name, line.encode())
+
+def append_bytes(file_name: str, data: bytes):
+    """Appends data to file_name with a single write (see append_line)"""
+    descriptor = os.open(file_name, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        os.write(descriptor, data)
+    finally:
+        os.close(descriptor)
+
+def sidecar_name(file_name: str, kind: str) -> str:
+    """Returns the name of a sidecar file of given kind belonging to file_name
+
+    Sidecar files are hidden files next to the tracking file that cache
+    things derived from it, eg `.time.txt.dialect` for `time.txt`.
+    """
+    directory, base_name = os.path.split(file_name)
+    return os.path.join(directory, '.{}.{}'.format(base_name, kind))
+
+def sniff_dialect(sample: bytes):
+    """Determines the csv dialect of a sample of bytes from a tracking file.
+
+    csv.Sniffer does not detect line terminators and always claims '\\r\\n',
+    so the line terminator is taken from the sample instead.
+    """
+    import csv
+    dialect = csv.Sniffer().sniff(sample.decode(errors='ignore'))
+    dialect.lineterminator = '\r\n' if b'\r\n' in sample else '\n'
+    return dialect
+
+def read_sample(file_name: str) -> bytes:
+    """Returns the first SNIFF_SIZE bytes of file_name, empty if there is no file"""
+    try:
+        with open(file_name, 'rb') as data_file:
+            return data_file.read(SNIFF_SIZE)
+    except FileNotFoundError:
+        return b''
+
+def load_dialect(file_name: str):
+    """Loads the cached dialect of file_name. Returns None if there is none.
+
+    The cache is out of date, and None is returned as well, if the bytes the
+    dialect was sniffed from changed (eg the file was rewritten) or if there
+    were fewer than SNIFF_SIZE and the file has grown since, so that a guess
+    from the first few rows of a file does not stick.
+    """
+    import csv
+    import json
+    import zlib
+    try:
+        with open(sidecar_name(file_name, 'dialect'), 'r') as cache:
+            attributes = json.load(cache)
+        size, crc = attributes.pop('sample')
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    sample = read_sample(file_name)
+    if len(sample) != size or zlib.crc32(sample) != crc:
+        return None
+    return type('CachedDialect', (csv.Dialect,), attributes)
+
+def store_dialect(file_name: str, dialect, sample: bytes):
+    """Caches dialect of file_name, sniffed from sample, in a sidecar file.
+
+    sample (the first bytes of the file, see read_sample) is kept as its
+    size and crc32, to tell when the cache is out of date. Failing to write
+    the cache is not an error, the dialect will simply be determined again
+    next time.
+    """
+    import json
+    import zlib
+    attributes = {name: getattr(dialect, name) for name in DIALECT_ATTRIBUTES}
+    attributes['sample'] = [len(sample), zlib.crc32(sample)]
+    try:
+        with open(sidecar_name(file_name, 'dialect'), 'w') as cache:
+            json.dump(attributes, cache)
+    except OSError:
+        pass
+
+def is_canonical(dialect) -> bool:
+    """Whether dialect is the canonical `<unix ts>\\t<activity>` format
+
+    Files in this dialect can be parsed by splitting bytes, as long as they
+    contain no quote characters (which parse_chunk checks).
+    """
+    import csv
+    return (dialect.delimiter == '\t' and not dialect.escapechar
+            and not dialect.skipinitialspace and dialect.quoting != csv.QUOTE_NONNUMERIC)
+
+def iter_chunks(file_name: str, start: int = 0, end=None, chunk_size: int = CHUNK_SIZE):
+    """Yields chunks of whole lines of file_name as bytes
+
+    Reading starts at byte offset start and stops at end (or the end of the
+    file). Both should be at the start of a line. Chunks are about chunk_size
+    bytes long and always end after a newline, except for a last line that
+    has none.
+    """
+    with open(file_name, 'rb') as data_file:
+        data_file.seek(start)
+        position = start
+        remainder = b''
+        while end is None or position < end:
+            size = chunk_size if end is None else min(chunk_size, end - position)
+            block = data_file.read(size)
+            if not block:
+                break
+            position += len(block)
+            block = remainder + block
+            cut = block.rfind(b'\n') + 1
+            remainder = block[cut:]
+            if cut:
+                yield block[:cut]
+        if remainder:
+            yield remainder
+
+class ByteInterner(dict):
+    """Maps activities as bytes to their ids in Columns
+
+    Only activities not seen before are decoded and interned, all others are
+    a single dictionary lookup.
+    """
+    def __init__(self, columns: Columns):
+        super().__init__()
+        self.columns = columns
+
+    def __missing__(self, key):
+        activity_id = self.columns.intern(key.decode())
+        self[key] = activity_id
+        return activity_id
+
+# re caches the compiled pattern
+_MULTIPLE_TABS = rb'\t[^\n]*\t'
+
+def parse_chunk(chunk: bytes, dialect, columns=None, interner=None) -> Columns:
+    """Parses a chunk of whole lines with unix timestamps into Columns
+
+    The rows are added to columns (new Columns if None). If dialect is
+    canonical and every line of the chunk is exactly `<ts>\\t<activity>`, the
+    chunk is split as bytes and whole columns are converted at once.
+    Anything else (quotes, empty lines, more fields) goes through csv.reader.
+    """
+    import re
+    if columns is None:
+        columns = Columns()
+    if interner is None:
+        interner = ByteInterner(columns)
+    if b'\r' in chunk:
+        chunk = chunk.replace(b'\r\n', b'\n')
+    body = chunk[:-1] if chunk.endswith(b'\n') else chunk
+    if not body:
+        return columns
+    lines = body.count(b'\n') + 1
+    if (is_canonical(dialect) and b'"' not in body and body.count(b'\t') == lines
+            and not re.search(_MULTIPLE_TABS, body)):
+        fields = body.replace(b'\n', b'\t').split(b'\t')
+        columns.extend_columns(map(int, fields[0::2]), map(interner.__getitem__, fields[1::2]))
+    else:
+        import csv
+        reader = csv.reader(body.decode().split('\n'), dialect=dialect)
+        columns.extend([int(row[0]), *row[1:]] for row in reader if row)
+    return columns
+
+def read_columns(file_name: str, dialect, chunk_size: int = CHUNK_SIZE) -> Columns:
+    """Reads a whole file with unix timestamps into Columns, chunk by chunk"""
+    columns = Columns()
+    interner = ByteInterner(columns)
+    for chunk in iter_chunks(file_name, chunk_size=chunk_size):
+        parse_chunk(chunk, dialect, columns, interner)
+    return columns
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Advisory locking and group commit of appends
+
+Several processes (shell hooks, cron jobs, editor plugins) may change a
+tracking file at the same time. All changes take an exclusive flock on a
+lock sidecar (`.time.txt.lock`), reads take a shared one. The lock is not
+taken on the tracking file itself, as it is replaced by some operations.
+
+Appends go through a journal of pending lines (`.time.txt.pending`) first:
+every appender adds its line to the journal, then takes the lock and moves
+all pending lines into the tracking file with one write. When many appends
+happen at once, the first to get the lock commits the lines of all others,
+which then find the journal empty and are done.
+
+On systems without fcntl (Windows) locking does nothing and appends are
+written directly.
+"""
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .fileio import sidecar_name, append_bytes
+
+class FileLock:
+    """A reentrant advisory lock belonging to a tracking file
+
+    Use file_lock to get the lock of a file: there is a single FileLock per
+    lock file and process, so that nested use (eg a write inside a with
+    block that already holds the lock) does not deadlock. Threads of the
+    process are serialised by a threading.RLock, other processes by flock.
+
+        >>> with file_lock('time.txt'):
+        >>>     ...
+    """
+    def __init__(self, lock_name: str):
+        self.lock_name = lock_name
+        self.thread_lock = threading.RLock()
+        self.descriptor = None
+        self.depth = 0
+        self.shared = False
+
+    def __repr__(self):
+        return '<{} at `{}`>'.format(type(self).__name__, self.lock_name)
+
+    def acquire(self, shared: bool = False):
+        """Acquires the lock, shared (for reading) or exclusive
+
+        A shared lock held by this process is upgraded if an exclusive one is
+        asked for inside it.
+        """
+        self.thread_lock.acquire()
+        try:
+            if fcntl is not None and self.descriptor is None and not self.depth:
+                try:
+                    self.descriptor = os.open(self.lock_name, os.O_RDWR | os.O_CREAT, 0o666)
+                except OSError:
+                    # Eg a read-only directory, where nobody can change the file either
+                    self.descriptor = None
+            if self.descriptor is not None:
+                if not self.depth or (self.shared and not shared):
+                    fcntl.flock(self.descriptor, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                    self.shared = shared
+        except BaseException:
+            self.thread_lock.release()
+            raise
+        self.depth += 1
+
+    def release(self):
+        """Releases the lock, unlocking the file when the outermost holder is done"""
+        self.depth -= 1
+        if not self.depth and self.descriptor is not None:
+            fcntl.flock(self.descriptor, fcntl.LOCK_UN)
+            os.close(self.descriptor)
+            self.descriptor = None
+        self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def shared_lock(self):
+        """Returns a context manager holding the lock shared"""
+        return _SharedLock(self)
+
+
+class _SharedLock:
+    """Context manager holding a FileLock shared"""
+    def __init__(self, lock: FileLock):
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire(shared=True)
+        return self.lock
+
+    def __exit__(self, *args):
+        self.lock.release()
+
+
+_LOCKS = {}
+_LOCKS_LOCK = threading.Lock()
+
+def file_lock(file_name: str) -> FileLock:
+    """Returns the FileLock of file_name, the same object for every call"""
+    lock_name = os.path.abspath(sidecar_name(file_name, 'lock'))
+    with _LOCKS_LOCK:
+        lock = _LOCKS.get(lock_name)
+        if lock is None:
+            lock = _LOCKS[lock_name] = FileLock(lock_name)
+    return lock
+
+def commit_pending(file_name: str) -> int:
+    """Moves the lines in the journal of file_name into it with one write
+
+    The caller has to hold the file_lock of file_name. Returns the number of
+    bytes committed.
+    """
+    if fcntl is None:
+        return 0
+    try:
+        descriptor = os.open(sidecar_name(file_name, 'pending'), os.O_RDWR)
+    except FileNotFoundError:
+        return 0
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_EX)
+        size = os.fstat(descriptor).st_size
+        data = os.pread(descriptor, size, 0) if size else b''
+        if data:
+            append_bytes(file_name, data)
+            os.ftruncate(descriptor, 0)
+    finally:
+        os.close(descriptor)
+    return len(data)
+
+def group_append(file_name: str, data: bytes):
+    """Appends data (whole lines) to file_name, batched with concurrent appends
+
+    The lines are added to the journal under a shared flock of the journal,
+    so that any number of appenders can add lines at once, while commit_pending
+    waits for them to finish. When this returns, the lines are in file_name,
+    committed either here or by a concurrent appender.
+    """
+    if fcntl is None:
+        with file_lock(file_name):
+            append_bytes(file_name, data)
+        return
+    descriptor = os.open(sidecar_name(file_name, 'pending'),
+                         os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_SH)
+        os.write(descriptor, data)
+    finally:
+        os.close(descriptor)
+    with file_lock(file_name):
+        commit_pending(file_name)
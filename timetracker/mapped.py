@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Read-only, memory-mapped access to tracking files
+
+MappedRows maps a tracking file into memory and only indexes where its lines
+start. Rows are parsed when they are accessed, so looking at a slice or the
+last week of a big file does not parse the rest of it.
+
+The file is mapped and indexed with its lock held shared, but the lock is
+not kept: appends only add bytes after the mapped ones, while a rewrite of
+the file in place (TrackingFile.write, merge, from-binary, an editor) while
+it is mapped makes accessing rows past its new end crash the process with
+SIGBUS. Mappings should be closed before the file is rewritten.
+"""
+
+import mmap
+import bisect
+import operator
+from array import array
+from itertools import accumulate, compress, count
+from collections.abc import Sequence
+
+from .columns import Columns
+from .fileio import CHUNK_SIZE, parse_chunk, is_canonical
+from .locking import file_lock
+
+def index_lines(buffer, chunk_size: int = CHUNK_SIZE) -> array:
+    """Returns the byte offsets at which the lines of buffer start
+
+    The buffer is split into chunks of whole lines, and line lengths are
+    summed up without a Python loop over lines. Empty lines are left out,
+    as they have no row.
+    """
+    offsets = array('q')
+    size = len(buffer)
+    position = 0
+    while position < size:
+        end = buffer.find(b'\n', min(position + chunk_size, size) - 1)
+        end = size if end == -1 else end + 1
+        lines = buffer[position:end].split(b'\n')
+        if not lines[-1]:
+            lines.pop()
+        starts = map(operator.add, accumulate(map(len, lines[:-1]), initial=0),
+                     count(position))
+        if b'\r' in buffer[position:end]:
+            lines = [line.rstrip(b'\r') for line in lines]
+        offsets.extend(compress(starts, lines))
+        position = end
+    return offsets
+
+class _LazyTimestamps(Sequence):
+    """The timestamps of MappedRows, each parsed only when accessed"""
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows.timestamp_at(index)
+
+
+class MappedRows(Sequence):
+    """Rows of a tracking file, parsed on access from a memory map
+
+    On creation the file is mapped and the start of every line is recorded
+    in an array. Nothing else is parsed until it is needed:
+    - rows[i] parses one line
+    - rows[a:b] parses the bytes of the lines a to b in one go into Columns
+    - iterating parses chunk by chunk
+    - timestamps, activity_ids, activities and dictionary parse the whole
+      file once into Columns, which are then kept
+
+    between and at use a binary search over the lines if assume_sorted is set,
+    parsing only the timestamps the search looks at. Otherwise they use the
+    fully parsed Columns.
+
+    The mapping stays open until close is called (or the object is deleted
+    or used in a with statement is left). It must not outlive a rewrite of
+    the file, see above.
+    """
+    def __init__(self, file_name: str, dialect, assume_sorted: bool = False):
+        self.file_name = file_name
+        self.dialect = dialect
+        self.assume_sorted = assume_sorted
+        self.delimiter = dialect.delimiter.encode()
+        self.canonical = is_canonical(dialect)
+        self._columns = None
+        with file_lock(file_name).shared_lock(), open(file_name, 'rb') as data_file:
+            try:
+                self.buffer = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                self.buffer = b''
+            self.offsets = index_lines(self.buffer)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __repr__(self):
+        return '<{} of `{}`>'.format(type(self).__name__, self.file_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Closes the memory map"""
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def line(self, index: int) -> bytes:
+        """Returns line index as bytes, without line terminator"""
+        start = self.offsets[index]
+        end = self.offsets[index + 1] if index + 1 < len(self.offsets) else None
+        return self.buffer[start:end].rstrip(b'\r\n')
+
+    def byte_range(self, start: int, stop: int):
+        """Returns the bytes of the lines start to stop (exclusive)"""
+        if start >= stop:
+            return b''
+        end = self.offsets[stop] if stop < len(self.offsets) else len(self.buffer)
+        return self.buffer[self.offsets[start]:end]
+
+    def timestamp_at(self, index: int) -> int:
+        """Parses only the timestamp of row index"""
+        line = self.line(index)
+        if self.canonical and b'"' not in line:
+            return int(line.split(self.delimiter, 1)[0])
+        return self[index][0]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return parse_chunk(self.byte_range(start, stop), self.dialect)
+            return Columns(self[index] for index in range(start, stop, step))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('row index out of range')
+        return parse_chunk(self.line(key), self.dialect)[0]
+
+    def __iter__(self):
+        if self._columns is not None:
+            yield from self._columns
+            return
+        step = max(CHUNK_SIZE // 64, 1)
+        for start in range(0, len(self), step):
+            yield from self[start:start + step]
+
+    def columns(self) -> Columns:
+        """Parses the whole file into Columns, once"""
+        if self._columns is None:
+            self._columns = parse_chunk(self.buffer[:], self.dialect)
+        return self._columns
+
+    @property
+    def timestamps(self):
+        """Timestamps of all rows (parses the whole file once)"""
+        return self.columns().timestamps
+
+    @property
+    def activity_ids(self):
+        """Activity ids of all rows (parses the whole file once)"""
+        return self.columns().activity_ids
+
+    @property
+    def dictionary(self):
+        """Dictionary of activities (parses the whole file once)"""
+        return self.columns().dictionary
+
+    @property
+    def activities(self):
+        """Activities of all rows (parses the whole file once)"""
+        return self.columns().activities
+
+    @property
+    def is_sorted(self) -> bool:
+        """Whether the rows are sorted by timestamp"""
+        return self.assume_sorted or self.columns().is_sorted
+
+    def between(self, start: int, end: int):
+        """Returns the rows with start <= timestamp < end as Columns"""
+        if not self.assume_sorted:
+            return self.columns().between(start, end)
+        timestamps = _LazyTimestamps(self)
+        return self[bisect.bisect_left(timestamps, start):bisect.bisect_left(timestamps, end)]
+
+    def at(self, timestamp: int):
+        """Returns the row going on at timestamp, None if there is none"""
+        if not self.assume_sorted:
+            return self.columns().at(timestamp)
+        index = bisect.bisect_right(_LazyTimestamps(self), timestamp) - 1
+        return self[index] if index >= 0 else None
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Merging of tracking files kept on several machines
+
+Every input file has to be sorted by timestamp. The files are streamed
+chunk by chunk (see TrackingFile.iter_rows) and combined with a heap-based
+k-way merge, so memory use depends on the number of files, not their size.
+"""
+
+import os
+import csv
+import heapq
+import operator
+
+from .objects import TrackingFile, Dialect
+
+def host_of(file_name: str) -> str:
+    """Derives the host tag of a file from its name, eg `laptop` for `laptop.txt`"""
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+def checked_rows(file_name: str):
+    """Yields the rows of file_name, raising ValueError if they are not sorted
+
+    Inputs are only read, so their dialect is sniffed but not cached next to
+    them.
+    """
+    last = None
+    for row in TrackingFile(file_name).iter_rows(file_name):
+        if last is not None and row[0] < last:
+            raise ValueError('`{}` is not sorted at timestamp {}'.format(file_name, row[0]))
+        last = row[0]
+        yield row
+
+def tagged_rows(rows, host: str):
+    """Yields rows with host as third field (replacing further fields)"""
+    for row in rows:
+        yield [row[0], row[1], host]
+
+def merge_rows(file_names, tag: bool = False, hosts=None, dedupe: bool = False):
+    """Yields the rows of all file_names in order of their timestamps
+
+    Rows with the same timestamp keep the order of file_names. With tag,
+    the host (from hosts, in the order of file_names, or else host_of the
+    file) is added to every row as a third field. With dedupe, rows with the
+    same timestamp and activity as an earlier row are dropped, wherever they
+    come from (the first one, and its host, is kept).
+    """
+    file_names = list(file_names)
+    if hosts is None:
+        hosts = [host_of(file_name) for file_name in file_names]
+    streams = []
+    for file_name, host in zip(file_names, hosts):
+        rows = checked_rows(file_name)
+        streams.append(tagged_rows(rows, host) if tag else rows)
+    merged = heapq.merge(*streams, key=operator.itemgetter(0))
+    if not dedupe:
+        yield from merged
+        return
+    # Duplicates share their timestamp, so only rows at the current one
+    # have to be remembered.
+    current, seen = None, set()
+    for row in merged:
+        if row[0] != current:
+            current, seen = row[0], set()
+        key = row[1] if tag else tuple(row[1:])
+        if key in seen:
+            continue
+        seen.add(key)
+        yield row
+
+def merge_files(file_names, output_name: str, tag: bool = False, hosts=None,
+                dedupe: bool = False, dialect=Dialect) -> int:
+    """Merges file_names into output_name, see merge_rows
+
+    The output is written to a temporary file that replaces output_name at
+    the end, so output_name may be one of the inputs. Returns the number of
+    rows written.
+    """
+    temporary = os.path.join(os.path.dirname(output_name),
+                             '.{}.merge'.format(os.path.basename(output_name)))
+    count = 0
+    try:
+        with open(temporary, 'w') as output:
+            writer = csv.writer(output, dialect=dialect)
+            for row in merge_rows(file_names, tag, hosts, dedupe):
+                writer.writerow(row)
+                count += 1
+    except BaseException:
+        os.remove(temporary)
+        raise
+    os.replace(temporary, output_name)
+    return count
@@ -5,11 +5,18 @@ import io
 import os
 import csv
 import time
-from datetime import datetime
 from datetime import timezone
 import configparser
 
-DEFAULT_HUMAN_DATETIME = '%Y-%m-%d %H:%M:%S %z'
+from .columns import Columns
+from .mapped import MappedRows
+from .segments import segmentify
+from .tree import ActivityTree
+from .timeformat import TimestampFormatter, TimestampParser, DEFAULT_HUMAN_DATETIME
+from .locking import file_lock, group_append
+from .activities import refresh_activities, file_signature
+from .fileio import (tail_lines, sniff_dialect, load_dialect, store_dialect, read_sample,
+                     iter_chunks, parse_chunk, read_columns, SNIFF_SIZE)
 
 DEFAULT_CONFIG = {
     'user': {
@@ -49,6 +56,8 @@ class TrackingFile:
     __enter__ will read the file, and __exit__ will write the file. Append
     appends the 'Work' entry to the file. This construct is most useful when
     used with operations that both read and write, such as editing the file.
+    The lock of the file (see timetracker.locking) is held from reading to
+    writing, so that other processes cannot change the file in between.
 
     A better way of defining the above behaviour would be:
 
@@ -62,6 +71,9 @@ class TrackingFile:
     __{del,set,get}item__ are implemented to allow index-based manipulation of
     data. These methods call the same method on self.data.
 
+    self.data is stored column-wise (see Columns). It can be assigned any
+    sequence of rows, which is then converted.
+
     Formatting of data is implemented. For instance, to print the last 5 entries
     in a user readable (ISO-8601) format:
 
@@ -76,6 +88,15 @@ class TrackingFile:
         self.dialect = dialect
         self.loaded = False
 
+    @property
+    def data(self):
+        """The rows of the file, stored as Columns (or MappedRows, see map)"""
+        return self._data
+
+    @data.setter
+    def data(self, rows):
+        self._data = rows if isinstance(rows, (Columns, MappedRows)) else Columns(rows)
+
     def __getitem__(self, key):
         return self.data.__getitem__(key)
 
@@ -86,26 +107,48 @@ class TrackingFile:
         self.data.__delitem__(key)
 
     def __enter__(self):
-        self.read()
+        if not os.path.exists(self.file_name):
+            # Before locking, so that no lock file is left behind
+            raise FileNotFoundError('The file you are trying to read does not exist')
+        self.lock.acquire()
+        try:
+            self.read()
+        except BaseException:
+            self.lock.release()
+            raise
         return self
 
     def __exit__(self, *args, **kwargs):
-        self.write()
+        try:
+            self.write()
+        finally:
+            self.lock.release()
+
+    @property
+    def lock(self):
+        """The FileLock of the file (see file_lock)"""
+        return file_lock(self.file_name)
 
     def __repr__(self):
         return '<{} at `{}`>'.format(type(self).__name__, self.file_name)
 
-    def format_data(self, ts_format: str, tz_info=None):
+    def format_data(self, ts_format: str, tz_info=None, rows=None):
         """Generator formatting data with a given ts_format for timestamps.
 
         Requires a ts_format, which is a format understood by strftime.
         tz_info can be used to override the system's timezone.
         The format returned is the same as self.data, except timestamps are
         strings now.
+        rows can be given to format other rows than self.data, for instance
+        rows streamed from iter_rows.
+        Timestamps are formatted with a TimestampFormatter, which only calls
+        strftime once per day for fixed utc offsets.
         """
-        for row in self.data:
-            time_data = datetime.fromtimestamp(row[0], tz=tz_info).strftime(ts_format)
-            yield [time_data, *row[1:]]
+        if rows is None:
+            rows = self.data
+        formatter = TimestampFormatter(ts_format, tz_info)
+        for row in rows:
+            yield [formatter(row[0]), *row[1:]]
 
     def format(self, ts_format: str, tz_info=None):
         """Formats data as an output file and returns it as a string.
@@ -128,28 +171,78 @@ class TrackingFile:
             out_string = output.getvalue()
         return out_string
 
-    def read(self):
+    def iter_rows(self, file_name=None, ts_format='unix'):
+        """Generator yielding the rows of a file one at a time.
+
+        Reads self.file_name, or file_name if given. Only one chunk of the
+        file is held in memory at a time, so this can be used to process
+        files of any size.
+        Timestamps are converted according to ts_format, which is one of:
+        - 'unix' indicating a unix timestamp, the default option
+        - a string that can be used with strptime, parsed by a TimestampParser
+
+        For self.file_name the dialect comes from cached_dialect, other files
+        are sniffed from their first SNIFF_SIZE bytes and not cached.
+        """
+        if file_name is None:
+            file_name = self.file_name
+            dialect = self.cached_dialect()
+        else:
+            with open(file_name, 'rb') as data_file:
+                sample = data_file.read(SNIFF_SIZE)
+            if not sample:
+                return
+            dialect = sniff_dialect(sample)
+        if ts_format == 'unix':
+            for chunk in iter_chunks(file_name):
+                yield from parse_chunk(chunk, dialect)
+            return
+        convert = TimestampParser(ts_format)
+        with open(file_name, 'r') as data_file:
+            for row in csv.reader(data_file, dialect=dialect):
+                if row:
+                    yield [convert(row[0]), *row[1:]]
+
+    def read(self, workers: int = 1):
         """Reads file contents into self.data
 
-        File contents are read into self.data. This happens in several steps.
-        First the first 1024 bytes are read to determine the csv dialect if it
-        is not already defined. Then the file is provided to csv.reader, which
-        is then converted to a list.
+        File contents are read into self.data. The dialect comes from
+        cached_dialect, so the file is only sniffed the first time it is
+        seen. Files in the canonical `<unix ts>\\t<activity>` format are then
+        parsed in chunks of bytes straight into Columns (see read_columns),
+        everything else through csv.reader.
+        With more than one worker (or None for one per core), large files
+        are parsed by that many processes (see read_columns_parallel).
         Finally, self.loaded is set to True to indicate that self.data contains
         the whole file and writing should replace, not append.
-
-        time_format is one of the following:
-        - 'unix' indicating a unix timestamp, the default option
-        - a string that can be used with strptime
+        Files that do not exist raise FileNotFoundError before they are locked,
+        so that no lock file is left behind.
+        """
+        if not os.path.exists(self.file_name):
+            raise FileNotFoundError('The file you are trying to read does not exist')
+        dialect = self.cached_dialect()
+        with self.lock.shared_lock():
+            if workers == 1:
+                self.data = read_columns(self.file_name, dialect)
+            else:
+                from .parallel import read_columns_parallel
+                self.data = read_columns_parallel(self.file_name, dialect, workers)
+        self.loaded = True
+
+    def map(self, assume_sorted: bool = False):
+        """Maps the file into memory for read-only access
+
+        Instead of parsing the whole file like read, self.data becomes
+        MappedRows, which only index where lines start and parse rows when
+        they are accessed. format, format_data, between, at and the timestamp
+        property work as usual. If assume_sorted is set, between and at use a
+        binary search that only parses the timestamps it looks at.
+        The data cannot be changed, and write raises io.UnsupportedOperation
+        until other data is read or assigned. The mapping must be closed
+        (self.data.close()) before anything rewrites the file, see mapped.py.
         """
-        with open(self.file_name, 'r') as data_file:
-            if not self.dialect:
-                self.dialect = csv.Sniffer().sniff(data_file.read(1024))
-            data_file.seek(0)
-            reader = csv.reader(data_file, dialect=self.dialect)
-            self.data = list(reader)
-            self.loaded = True
-            self.data = [[int(row[0]), *row[1:]] for row in self.data]
+        self.data = MappedRows(self.file_name, self.cached_dialect(), assume_sorted)
+        self.loaded = True
 
     def write(self):
         """Writes self.data back to the file
@@ -162,43 +255,42 @@ class TrackingFile:
 
         If self.loaded is False, self.data will be appended to the file.
         The contents of self.data are then removed to avoid duplicate writes.
+
+        Files opened with map are read-only and cannot be written.
+        Writing holds the lock of the file.
         """
+        if isinstance(self.data, MappedRows):
+            raise io.UnsupportedOperation('{} is mapped read-only'.format(self.file_name))
         if self.loaded:
             mode = 'w'
         else:
             mode = 'a'
-        if not self.dialect and os.path.exists(self.file_name):
-            # No dialect exists, but we can determine it from the file
-            with open(self.file_name, 'r') as file_conn:
-                sample = file_conn.read(1024)
-                dialect = csv.Sniffer().sniff(sample)
-        elif not self.dialect and not os.path.exists(self.file_name):
-            # No dialect, and no way of guessing. Go back to defaults.
-            # The default dialect is excel_tab with os specific lineseps.
-            dialect = Dialect
-        else:
-            # The dialect exists
-            dialect = self.dialect
-        with open(self.file_name, mode) as file_conn:
+        # Either self.dialect, the cached dialect of the file or Dialect if
+        # there is no file to guess it from.
+        dialect = self.cached_dialect()
+        with self.lock, open(self.file_name, mode) as file_conn:
             # Write
             writer = csv.writer(file_conn, dialect=dialect)
             writer.writerows(self.data)
         if not self.loaded:
             self.data = [] # clear data to avoid duplicate appends
-        if not self.dialect:
-            self.dialect = dialect # set dialect if not already set.
 
     def save(self, file_name, ts_format=DEFAULT_HUMAN_DATETIME, tz_info=None):
         """Save human-readable data to file specified
 
         Save data to file file_name.
         Optionally accept changed ts_format or tz_info
+        If nothing has been read or added to self.data, the rows are streamed
+        from self.file_name instead, so that whole files can be converted
+        without loading them.
         """
         if not tz_info:
             tz_info = timezone.utc
-        write_data = self.format(ts_format, tz_info)
+        rows = self.data if self.data or self.loaded else self.iter_rows()
+        dialect = self.dialect if self.dialect else Dialect
         with open(file_name, 'w') as connection:
-            connection.write(write_data)
+            writer = csv.writer(connection, dialect=dialect)
+            writer.writerows(self.format_data(ts_format, tz_info, rows))
 
     def load(self, file_name, ts_format=DEFAULT_HUMAN_DATETIME, tz_info=None):
         """Loads human-readable data from specified file
@@ -208,14 +300,70 @@ class TrackingFile:
             raise FileNotFoundError('The file you are trying to load does not exist')
         if not tz_info:
             tz_info = timezone.utc
-        with open(file_name, 'r') as connection:
-            this_dialect = csv.Sniffer().sniff(connection.read(1024))
-            connection.seek(0)
-            reader = csv.reader(connection, dialect=this_dialect)
-            data = list(reader)
-            data = [[int(datetime.strptime(row[0], ts_format).timestamp()), *row[1:]]
-                    for row in data]
-            self.data = data
+        self.data = Columns(self.iter_rows(file_name, ts_format))
+
+    def tail(self, count: int = 5):
+        """Returns the last count rows of the file without reading all of it.
+
+        Only the end of the file is read (see tail_lines). The rows are
+        returned in the same shape as self.data, and self.data is left
+        untouched. The dialect comes from cached_dialect. Empty lines have no
+        row, as for read.
+        """
+        wanted = count
+        while True:
+            lines = tail_lines(self.file_name, wanted)
+            if not lines:
+                return Columns()
+            rows = [row for row in csv.reader(lines, dialect=self.cached_dialect()) if row]
+            if len(rows) >= count or len(lines) < wanted:
+                break
+            # Lines without a row, more lines are needed
+            wanted += count - len(rows)
+        return Columns([int(row[0]), *row[1:]] for row in rows[max(len(rows) - count, 0):])
+
+    def cached_dialect(self):
+        """Returns the dialect of the file without sniffing it on every call.
+
+        The dialect is taken from self.dialect, from the dialect cache next to
+        the file or, if neither exists (or the file changed, see load_dialect),
+        sniffed from the first SNIFF_SIZE bytes and then cached. Files that do
+        not exist (or are empty) use Dialect. For files that do not exist,
+        nothing is cached, neither next to the file nor in self.dialect.
+        """
+        if self.dialect:
+            return self.dialect
+        dialect = load_dialect(self.file_name)
+        if not dialect:
+            sample = read_sample(self.file_name)
+            if not sample and not os.path.exists(self.file_name):
+                return Dialect
+            dialect = sniff_dialect(sample) if sample else Dialect
+            store_dialect(self.file_name, dialect, sample)
+        self.dialect = dialect
+        return dialect
+
+    def append_direct(self, activity: str, timestamp=None):
+        """Appends an activity straight to the file with a single write.
+
+        Unlike append, this neither touches self.data nor needs the file to be
+        read. The row is formatted with cached_dialect and written with
+        group_append, so the cost does not grow with the size of the file,
+        and concurrent appends are batched into a single write under the lock.
+        The activity dictionary, if there is one, is updated as well.
+        If no timestamp is provided, the current time is used.
+        """
+        if timestamp is None:
+            timestamp = round(time.time())
+        with io.StringIO() as output:
+            writer = csv.writer(output, dialect=self.cached_dialect())
+            writer.writerow([timestamp, activity])
+            line = output.getvalue()
+        before = file_signature(self.file_name)
+        group_append(self.file_name, line.encode())
+        refresh_activities(self.file_name, self.cached_dialect(), before)
+        return [timestamp, activity]
+
     def append(self, activity: str, timestamp=round(time.time())):
         """Appends an activity at an optionally defined timestamp.
 
@@ -225,15 +373,65 @@ class TrackingFile:
         row = [timestamp, activity]
         self.data.append(row)
 
+    def between(self, start: int, end: int):
+        """Returns the rows of data with start <= timestamp < end
+
+        If data is sorted (see Columns.is_sorted) this is a binary search
+        returning a ColumnsView, otherwise a filtered copy.
+        """
+        return self.data.between(start, end)
+
+    def at(self, timestamp: int):
+        """Returns the row going on at timestamp, None if there is none"""
+        return self.data.at(timestamp)
+
+    def segments(self, until_now=False, now=None):
+        """Returns the Segments of the activities in data
+
+        Each row starts a segment that ends with the next row. If data is not
+        sorted by timestamp (see Columns.is_sorted), a sorted copy is used.
+        If until_now is set, the last activity is taken to be still going on
+        and ends now (or at timestamp now, if given).
+        """
+        if until_now and now is None:
+            now = round(time.time())
+        data = self.data
+        if not data.is_sorted:
+            data = Columns(sorted(data, key=lambda row: row[0]))
+        return segmentify(data, now if until_now else None)
+
+    def tree(self, depth=None, until_now=False):
+        """Returns the ActivityTree of the segments in data
+
+        depth cuts the tree at the given level, until_now is passed on to
+        segments.
+        """
+        tree = ActivityTree.from_segments(self.segments(until_now))
+        return tree if depth is None else tree.cut(depth)
+
+    def report(self, period='all', depth=None, tz_info=None, until_now=False):
+        """Returns the Report of the segments in data per period
+
+        period is one of all, day, week, month and year, taken in tz_info
+        (local time if None). depth cuts activities, until_now is passed on
+        to segments. See timetracker.reports.
+        """
+        from .reports import report
+        return report(self.segments(until_now), period, depth, tz_info)
+
     @property
     def timestamp(self):
-        """Timestamps from data"""
-        return [row[0] for row in self.data]
+        """Timestamps from data
+
+        This is the timestamp column of self.data itself (an array of int64),
+        not a copy.
+        """
+        return self.data.timestamps
 
     @property
     def activity(self):
         """Activities from data"""
-        return [row[1] for row in self.data]
+        return self.data.activities
 
 
 def file_finder(order: list):
@@ -285,11 +483,8 @@ class CommandAppend(BaseCommand):
     def command(self, *args, **kwargs):
         activity = kwargs['activity']
         timestamp = kwargs['timestamp']
-        with TrackingFile(self.config['target_file']) as tracking_file:
-            if timestamp:
-                tracking_file.append(activity, timestamp)
-            else:
-                tracking_file.append(activity)
+        tracking_file = TrackingFile(self.config['target_file'])
+        tracking_file.append_direct(activity, timestamp or None)
 
 class CommandEdit(BaseCommand):
     """Opens the database in an editor to allow the user to make edits"""
@@ -300,8 +495,7 @@ class CommandTail(BaseCommand):
     """Shows the last n entries of the database"""
     def command(self, *args, **kwargs):
         count = kwargs['count']
-        with TrackingFile(self.config['target_file']) as tracking_file:
-            tail = tracking_file.read().data[-count:]
+        tail = TrackingFile(self.config['target_file']).tail(count)
         print(tail)
 
 class App:
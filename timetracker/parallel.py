@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Parsing large tracking files on all cores
+
+The file is split into as many byte ranges as there are workers, each
+starting at the start of a line. Every range is parsed in a process pool
+with parse_chunk, into its own Columns with its own dictionary. The
+timestamp and activity id columns are handed back in shared memory, only the
+dictionaries are pickled. Dialects are often classes local to csv.Sniffer
+or load_dialect, which cannot be pickled, so the workers get the attributes
+in DIALECT_ATTRIBUTES and build the dialect again. The activities of all ranges are then interned
+into one dictionary, the ids of every range translated to it (again in the
+pool, in place) and the columns concatenated in order.
+
+Starting processes takes a while, so files smaller than PARALLEL_THRESHOLD
+are parsed serially with read_columns. Rows with more than two fields
+cannot be handed back in shared memory; files with such rows are read
+serially as well.
+"""
+
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory, resource_tracker
+
+from .columns import Columns, TIMESTAMP_TYPECODE, ACTIVITY_TYPECODE
+from .fileio import iter_chunks, parse_chunk, read_columns, ByteInterner, DIALECT_ATTRIBUTES
+
+# Bytes below which files are parsed serially
+PARALLEL_THRESHOLD = 64 << 20
+
+def split_ranges(file_name: str, parts: int) -> list:
+    """Splits file_name into at most parts byte ranges of whole lines
+
+    Returns a list of (start, end) offsets covering the whole file. Ranges
+    that would be empty (eg for lines longer than a range) are left out.
+    """
+    size = os.path.getsize(file_name)
+    starts = [0]
+    with open(file_name, 'rb') as data_file:
+        for part in range(1, parts):
+            data_file.seek(max(size * part // parts - 1, starts[-1]))
+            data_file.readline()
+            start = data_file.tell()
+            if start >= size:
+                break
+            if start > starts[-1]:
+                starts.append(start)
+    return list(zip(starts, starts[1:] + [size]))
+
+def _to_shared_memory(values: array):
+    """Copies an array into a new block of shared memory, returns its name"""
+    if not values:
+        return None
+    block = shared_memory.SharedMemory(create=True, size=len(values) * values.itemsize)
+    block.buf[:block.size] = memoryview(values).cast('B')
+    block.close()
+    return block.name
+
+def _from_shared_memory(name, typecode: str, count: int) -> array:
+    """Copies count values out of a block of shared memory"""
+    values = array(typecode)
+    if name is not None:
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            values.frombytes(block.buf[:count * values.itemsize])
+        finally:
+            block.close()
+    return values
+
+def _unlink(name):
+    """Removes a block of shared memory, if it still exists"""
+    if name is None:
+        return
+    try:
+        block = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    block.close()
+    block.unlink()
+
+def _parse_range(file_name: str, start: int, end: int, attributes: dict):
+    """Parses a byte range of file_name (in a worker)
+
+    attributes are those of the dialect, see DIALECT_ATTRIBUTES.
+    Returns the names of the shared memory blocks of the timestamps and
+    activity ids, the number of rows and the dictionary. If rows have more
+    than two fields, the blocks are None and the dictionary is None.
+    """
+    import csv
+    dialect = type('WorkerDialect', (csv.Dialect,), attributes)
+    columns = Columns()
+    interner = ByteInterner(columns)
+    for chunk in iter_chunks(file_name, start, end):
+        parse_chunk(chunk, dialect, columns, interner)
+    if columns.extra is not None:
+        return None, None, len(columns), None
+    return (_to_shared_memory(columns.timestamps), _to_shared_memory(columns.activity_ids),
+            len(columns), columns.dictionary)
+
+def _translate_ids(name, count: int, translation: list):
+    """Translates the activity ids in a block of shared memory in place (in a worker)"""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        ids = block.buf[:count * array(ACTIVITY_TYPECODE).itemsize].cast(ACTIVITY_TYPECODE)
+        ids[:] = array(ACTIVITY_TYPECODE, map(translation.__getitem__, ids))
+        ids.release()
+    finally:
+        block.close()
+
+def read_columns_parallel(file_name: str, dialect, workers=None,
+                          threshold: int = PARALLEL_THRESHOLD) -> Columns:
+    """Reads a whole file with unix timestamps into Columns, using workers processes
+
+    The result is the same as that of read_columns. workers defaults to the
+    number of cores. Files smaller than threshold bytes, and all files if
+    there is only one worker, are read serially.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 2 or os.path.getsize(file_name) < threshold:
+        return read_columns(file_name, dialect)
+    ranges = split_ranges(file_name, workers)
+    # Workers have to share the tracker of shared memory blocks with this
+    # process, otherwise theirs removes the blocks they created when they exit
+    resource_tracker.ensure_running()
+    attributes = {name: getattr(dialect, name) for name in DIALECT_ATTRIBUTES}
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(_parse_range, file_name, start, end, attributes)
+                   for start, end in ranges]
+        wait(futures)
+        parts = [future.result() for future in futures if future.exception() is None]
+        try:
+            if len(parts) < len(futures):
+                raise next(future.exception() for future in futures if future.exception())
+            if any(dictionary is None for _, _, _, dictionary in parts):
+                return read_columns(file_name, dialect)
+            columns = Columns()
+            translations = [[columns.intern(activity) for activity in dictionary]
+                            for _, _, _, dictionary in parts]
+            # Ranges whose activities came first in the file keep their ids
+            for future in [executor.submit(_translate_ids, ids_name, count, translation)
+                           for (_, ids_name, count, _), translation in zip(parts, translations)
+                           if ids_name is not None
+                           and translation != list(range(len(translation)))]:
+                future.result()
+            for timestamps_name, ids_name, count, _ in parts:
+                columns.extend_columns(
+                    _from_shared_memory(timestamps_name, TIMESTAMP_TYPECODE, count),
+                    _from_shared_memory(ids_name, ACTIVITY_TYPECODE, count))
+        finally:
+            for timestamps_name, ids_name, _, _ in parts:
+                _unlink(timestamps_name)
+                _unlink(ids_name)
+    return columns
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Totals of activities per calendar period
+
+Computes what example/analyse.R computes with ddply, the total and mean
+time per activity and its share of the time, per day, week, month or year
+(or over all of it) and for activities cut at a depth of the hierarchy
+(`Work:Writing` counts as `Work` at depth 1).
+
+Every segment gets a flat integer bucket id: the index of its period times
+the number of activity groups plus the id of its group. Periods are found
+with one binary search per period boundary, as segments are sorted, and
+groups through a translation table from activity ids. The totals per bucket
+are then summed up by bincount. As in the aggregate cache, a segment counts
+towards the period it starts in.
+"""
+
+import json
+import bisect
+import operator
+from collections import Counter
+from datetime import datetime
+from itertools import repeat, compress, islice
+
+from .archive import period_start, next_period, PERIOD_FORMATS
+from .segments import Segments
+from .tree import SEPARATOR, format_duration
+
+PERIODS = ('all', 'day', 'week', 'month', 'year')
+FORMATS = ('table', 'tsv', 'json')
+COLUMNS = ('period', 'activity', 'total', 'count', 'mean', 'share')
+
+def bincount(ids, weights=None, length: int = 0) -> list:
+    """Returns the sum of weights (or the count) of every id in ids
+
+    The result is a list of at least length totals, indexed by id. This is
+    numpy.bincount for lists of ints: a single pass without a dictionary of
+    totals, counts are taken by Counter.
+    """
+    ids = list(ids)
+    totals = [0] * max(length, max(ids) + 1 if ids else 0)
+    if weights is None:
+        for bucket, count in Counter(ids).items():
+            totals[bucket] = count
+    else:
+        for bucket, weight in zip(ids, weights):
+            totals[bucket] += weight
+    return totals
+
+def period_ids(starts, period: str = 'all', tz_info=None):
+    """Returns the period index of every start and the starts of the periods
+
+    starts have to be sorted, ValueError is raised otherwise. Only periods
+    with starts in them get an index, in order. Periods are those of
+    archive.period_start in tz_info (local time if None); the period 'all'
+    spans everything.
+    """
+    if period not in PERIODS:
+        raise ValueError('period has to be one of {}'.format(', '.join(PERIODS)))
+    if not starts:
+        return [], []
+    if not all(map(operator.le, starts, islice(starts, 1, None))):
+        raise ValueError('starts have to be sorted')
+    if period == 'all':
+        return [0] * len(starts), [starts[0]]
+    ids = []
+    boundaries = []
+    index, length = 0, len(starts)
+    while index < length:
+        boundary = period_start(starts[index], period, tz_info)
+        end = bisect.bisect_left(starts, next_period(boundary, period, tz_info), index)
+        ids.extend(repeat(len(boundaries), end - index))
+        boundaries.append(boundary)
+        index = end
+    return ids, boundaries
+
+def group_activities(dictionary, depth=None):
+    """Returns the sorted activity groups and the group id of every activity id
+
+    Activities are cut at depth (not at all if None).
+    """
+    if depth is None:
+        names = list(dictionary)
+    else:
+        names = [SEPARATOR.join(activity.split(SEPARATOR)[:depth]) for activity in dictionary]
+    groups = sorted(set(names))
+    lookup = {group: group_id for group_id, group in enumerate(groups)}
+    return groups, [lookup[name] for name in names]
+
+
+class Report:
+    """Total, count, mean and share of time per period and activity group
+
+    buckets are the bucket ids (period index * len(groups) + group id) that
+    have segments, in order, and seconds and counts their totals. Periods are
+    given by their starts.
+
+        >>> print(report(tf.segments(), 'week', depth=1).format('table'))
+    """
+    def __init__(self, period: str, period_starts: list, groups: list,
+                 buckets: list, seconds: list, counts: list, tz_info=None):
+        self.period = period
+        self.period_starts = period_starts
+        self.groups = groups
+        self.buckets = buckets
+        self.seconds = seconds
+        self.counts = counts
+        self.tz_info = tz_info
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def __repr__(self):
+        return '<{} of {} rows per {}>'.format(type(self).__name__, len(self), self.period)
+
+    def period_label(self, index: int) -> str:
+        """Names the period with the given index, eg `2018-08` for a month"""
+        if self.period == 'all':
+            return 'all'
+        moment = datetime.fromtimestamp(self.period_starts[index], tz=self.tz_info)
+        return moment.strftime(PERIOD_FORMATS[self.period])
+
+    def rows(self):
+        """Yields (period, activity, total, count, mean, share) for every bucket
+
+        share is the fraction of the time of the period spent on the group.
+        """
+        width = len(self.groups)
+        periods = [bucket // width for bucket in self.buckets]
+        period_totals = bincount(periods, self.seconds, len(self.period_starts))
+        labels = [self.period_label(index) for index in range(len(self.period_starts))]
+        for bucket, period, seconds, count in zip(self.buckets, periods,
+                                                  self.seconds, self.counts):
+            total = period_totals[period]
+            yield (labels[period], self.groups[bucket % width], seconds, count,
+                   seconds / count, seconds / total if total else 0.0)
+
+    def format(self, kind: str = 'table') -> str:
+        """Formats the report as an aligned table, tab separated values or JSON
+
+        Tables show durations as H:MM:SS and shares in percent, tab separated
+        values and JSON seconds and fractions.
+        """
+        if kind == 'json':
+            return json.dumps([dict(zip(COLUMNS, row)) for row in self.rows()], indent=2)
+        if kind == 'tsv':
+            lines = ['\t'.join(COLUMNS)]
+            lines.extend('{}\t{}\t{}\t{}\t{:.1f}\t{:.4f}'.format(*row) for row in self.rows())
+            return '\n'.join(lines)
+        if kind != 'table':
+            raise ValueError('kind has to be one of {}'.format(', '.join(FORMATS)))
+        table = [COLUMNS]
+        for period, activity, total, count, mean, share in self.rows():
+            table.append((period, activity, format_duration(total), str(count),
+                          format_duration(mean), '{:.1f}%'.format(share * 100)))
+        widths = [max(map(len, column)) for column in zip(*table)]
+        # Text columns are aligned left, numbers right
+        return '\n'.join('  '.join([row[0].ljust(widths[0]), row[1].ljust(widths[1])]
+                                   + [cell.rjust(width) for cell, width in zip(row[2:], widths[2:])])
+                         .rstrip() for row in table)
+
+
+def report(segments: Segments, period: str = 'all', depth=None, tz_info=None) -> Report:
+    """Returns the Report of segments (sorted by start) per period
+
+    period is one of PERIODS, depth cuts activities (see group_activities),
+    tz_info is the time zone periods are taken in (local time if None).
+    Unsorted segments raise ValueError (see period_ids).
+    """
+    periods, period_starts = period_ids(segments.start, period, tz_info)
+    groups, translation = group_activities(segments.dictionary, depth)
+    width = len(groups)
+    buckets = list(map(operator.add, map(operator.mul, periods, repeat(width)),
+                       map(translation.__getitem__, segments.activity_ids)))
+    durations = segments.duration.tolist()
+    size = len(period_starts) * width
+    if size <= len(buckets):
+        seconds = bincount(buckets, durations, size)
+        counts = bincount(buckets, None, size)
+        used = list(compress(range(size), counts))
+        seconds = [seconds[bucket] for bucket in used]
+        counts = [counts[bucket] for bucket in used]
+    else:
+        # More buckets than segments (eg days of years of many activities),
+        # only the buckets with segments are counted
+        used = sorted(set(buckets))
+        compact = dict(zip(used, range(len(used))))
+        compact_ids = list(map(compact.__getitem__, buckets))
+        seconds = bincount(compact_ids, durations, len(used))
+        counts = bincount(compact_ids, None, len(used))
+    return Report(period, period_starts, groups, used, seconds, counts, tz_info)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Segments of time spent on activities
+
+Every row in a tracking file starts an activity, which lasts until the next
+row starts another one. This module turns the rows into such segments, the
+same way `segmentify` in example/analyse.R does.
+"""
+
+import operator
+from array import array
+
+from .columns import Columns, ACTIVITY_TYPECODE, TIMESTAMP_TYPECODE
+
+NO_ACTIVITY = 2**32 - 1
+
+class Segments:
+    """Segments between consecutive rows, stored as columns
+
+    Columns are start, end, duration, activity and next_activity. Timestamps
+    and durations are arrays of int64, activities are ids into dictionary
+    (shared with the Columns the segments were made from). A segment that is
+    still open has no next activity, its id is NO_ACTIVITY and its
+    next_activity is None.
+
+    Iterating yields rows of (start, end, duration, activity, next_activity).
+    """
+    def __init__(self, start, end, activity_ids, next_activity_ids, dictionary):
+        self.start = start
+        self.end = end
+        self.duration = array(TIMESTAMP_TYPECODE, map(operator.sub, end, start))
+        self.activity_ids = activity_ids
+        self.next_activity_ids = next_activity_ids
+        self.dictionary = dictionary
+
+    def __len__(self):
+        return len(self.start)
+
+    def __getitem__(self, key):
+        return (self.start[key], self.end[key], self.duration[key],
+                self.dictionary[self.activity_ids[key]],
+                self._name(self.next_activity_ids[key]))
+
+    def __iter__(self):
+        return zip(self.start, self.end, self.duration,
+                   self.activity, self.next_activity)
+
+    def __repr__(self):
+        return '<{} of {} activities>'.format(type(self).__name__, len(self))
+
+    def _name(self, activity_id):
+        """Returns the activity for activity_id, None for NO_ACTIVITY"""
+        return None if activity_id == NO_ACTIVITY else self.dictionary[activity_id]
+
+    @property
+    def activity(self):
+        """Activities of the segments as a list of strings"""
+        return list(map(self.dictionary.__getitem__, self.activity_ids))
+
+    @property
+    def next_activity(self):
+        """Activities following the segments as a list of strings (or None)"""
+        return list(map(self._name, self.next_activity_ids))
+
+
+def segmentify(data: Columns, now=None) -> Segments:
+    """Creates Segments from Columns (or a ColumnsView) of rows sorted by timestamp
+
+    Segments are computed on whole columns by shifting them against each
+    other, never row by row in Python. If now is given, the last row is also
+    turned into a segment, which ends at now and has no next activity.
+    """
+    timestamps = data.timestamps
+    all_activity_ids = data.activity_ids
+    if isinstance(timestamps, memoryview):
+        # Views on Columns hand out memoryviews, which cannot be appended to.
+        timestamps = array(TIMESTAMP_TYPECODE, timestamps)
+        all_activity_ids = array(ACTIVITY_TYPECODE, all_activity_ids)
+    start = timestamps[:-1]
+    end = timestamps[1:]
+    activity_ids = all_activity_ids[:-1]
+    next_activity_ids = all_activity_ids[1:]
+    if now is not None and timestamps:
+        start.append(timestamps[-1])
+        end.append(now)
+        activity_ids.append(all_activity_ids[-1])
+        next_activity_ids.append(NO_ACTIVITY)
+    return Segments(start, end, activity_ids, next_activity_ids, data.dictionary)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Fast formatting and parsing of unix timestamps
+
+datetime.strftime and datetime.strptime are slow when called for millions of
+rows. Most of a formatted timestamp only depends on the day, so the
+TimestampFormatter formats each day once and adds the time of day with
+integer arithmetic. The TimestampParser does the reverse, converting each
+date to seconds only once.
+"""
+
+import re
+from datetime import date, datetime, timezone, timedelta
+
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+DEFAULT_HUMAN_DATETIME = '%Y-%m-%d %H:%M:%S %z'
+ISO_DATETIMES = frozenset(('%Y-%m-%dT%H:%M:%S%z',))
+
+# Directives replaced by the time of day, as str.format fields of
+# (hour, minute, second).
+TIME_DIRECTIVES = {
+    'H': '{0:02d}',
+    'M': '{1:02d}',
+    'S': '{2:02d}',
+    'T': '{0:02d}:{1:02d}:{2:02d}',
+    'R': '{0:02d}:{1:02d}',
+}
+# Directives that only depend on the day (and a fixed utc offset).
+DAY_DIRECTIVES = frozenset('aAbBCdDeFgGhjmnuUtVwWxyYzZ%')
+
+def split_format(ts_format: str):
+    """Splits a strftime format into a day format and whether it is supported
+
+    Returns (day_format, supported). day_format is ts_format with braces
+    escaped and time directives replaced by str.format fields, so that
+    strftime of a day followed by str.format with the time of day gives the
+    same as strftime of the timestamp. supported is False if ts_format has
+    directives that are neither day nor time directives (eg %c, %p or %s).
+    """
+    parts = []
+    index = 0
+    while index < len(ts_format):
+        char = ts_format[index]
+        if char != '%':
+            parts.append(char.replace('{', '{{').replace('}', '}}'))
+            index += 1
+            continue
+        directive = ts_format[index + 1:index + 2]
+        if directive in TIME_DIRECTIVES:
+            parts.append(TIME_DIRECTIVES[directive])
+        elif directive and directive in DAY_DIRECTIVES:
+            parts.append('%' + directive)
+        else:
+            return ts_format, False
+        index += 2
+    return ''.join(parts), True
+
+
+class TimestampFormatter:
+    """Formats unix timestamps like datetime.fromtimestamp(ts, tz).strftime(fmt)
+
+    For a fixed utc offset (tz_info being a datetime.timezone) and formats
+    made of day directives and %H, %M, %S, %T and %R, the output is the same
+    as strftime's, but each day is only formatted once with strftime. The
+    time of day is computed from the timestamp and filled in. Repeated
+    timestamps return the previous string.
+
+    Other time zones (including the local one, tz_info=None, whose offset
+    can change within a day) and other directives use strftime for every
+    timestamp.
+
+        >>> formatter = TimestampFormatter('%F %T', timezone.utc)
+        >>> formatter(0)
+        '1970-01-01 00:00:00'
+    """
+    def __init__(self, ts_format: str, tz_info=None):
+        self.ts_format = ts_format
+        self.tz_info = tz_info
+        self.day_format, supported = split_format(ts_format)
+        self.fast = supported and isinstance(tz_info, timezone)
+        self.offset = int(tz_info.utcoffset(None).total_seconds()) if self.fast else 0
+        self.days = {}
+        self.last = (None, None)
+
+    def __call__(self, timestamp: int) -> str:
+        if timestamp == self.last[0]:
+            return self.last[1]
+        if self.fast:
+            day, second = divmod(timestamp + self.offset, SECONDS_PER_DAY)
+            template = self.days.get(day)
+            if template is None:
+                template = self.day_template(day)
+            hour, second = divmod(second, 3600)
+            minute, second = divmod(second, 60)
+            string = template.format(hour, minute, second)
+        else:
+            string = datetime.fromtimestamp(timestamp, tz=self.tz_info).strftime(self.ts_format)
+        self.last = (timestamp, string)
+        return string
+
+    def day_template(self, day: int) -> str:
+        """Formats day (days since the epoch in local time) into a template"""
+        midnight = datetime.fromtimestamp(day * SECONDS_PER_DAY - self.offset, tz=self.tz_info)
+        template = midnight.strftime(self.day_format)
+        self.days[day] = template
+        return template
+
+
+# Regular expressions for the strptime directives the TimestampParser can
+# compile. They accept the same as strptime does, values are checked when
+# the date is built.
+PARSE_DIRECTIVES = {
+    'Y': r'(?P<Y>\d\d\d\d)',
+    'y': r'(?P<y>\d\d)',
+    'm': r'(?P<m>1[0-2]|0[1-9]|[1-9])',
+    'd': r'(?P<d>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])',
+    'H': r'(?P<H>2[0-3]|[0-1]\d|\d)',
+    'M': r'(?P<M>[0-5]\d|\d)',
+    'S': r'(?P<S>6[0-1]|[0-5]\d|\d)',
+    'z': r'(?P<z>Z|[+-]\d\d:?[0-5]\d(?::?[0-5]\d)?)',
+    '%': '%',
+}
+
+def compile_format(ts_format: str):
+    """Compiles a strptime format into a regular expression
+
+    Returns None if ts_format contains directives that are not supported
+    (eg month names, which depend on the locale) or fields are repeated.
+    """
+    parts = []
+    seen = set()
+    index = 0
+    while index < len(ts_format):
+        char = ts_format[index]
+        if char != '%':
+            # Like strptime, whitespace matches any amount of whitespace
+            parts.append(r'\s+' if char.isspace() else re.escape(char))
+            index += 1
+            continue
+        directive = ts_format[index + 1:index + 2]
+        if directive not in PARSE_DIRECTIVES or directive in seen:
+            return None
+        if directive != '%':
+            seen.add(directive)
+        parts.append(PARSE_DIRECTIVES[directive])
+        index += 2
+    if not seen & {'Y', 'y'} or 'm' not in seen or 'd' not in seen:
+        return None
+    return re.compile(''.join(parts) + '$')
+
+OFFSET_PATTERN = re.compile(PARSE_DIRECTIVES['z'] + '$')
+
+def parse_offset(offset: str) -> int:
+    """Converts a %z utc offset (eg +0100, -05:30 or Z) to seconds"""
+    if not OFFSET_PATTERN.match(offset):
+        raise ValueError('invalid utc offset `{}`'.format(offset))
+    if offset == 'Z':
+        return 0
+    digits = offset[1:].replace(':', '')
+    seconds = int(digits[0:2]) * 3600 + int(digits[2:4]) * 60 + int(digits[4:6] or 0)
+    return -seconds if offset[0] == '-' else seconds
+
+
+class TimestampParser:
+    """Parses strings into unix timestamps like strptime(value, fmt).timestamp()
+
+    Several strategies are tried, depending on ts_format:
+    - DEFAULT_HUMAN_DATETIME is sliced at its fixed positions.
+    - ISO-8601 formats are handed to datetime.fromisoformat.
+    - Other formats made of numeric directives (%Y %y %m %d %H %M %S %z)
+      are compiled to a regular expression.
+    In all of these, each distinct date and utc offset is converted only once
+    and cached. Formats without %z are local time, just like strptime.
+    Anything else, and any value the fast paths do not accept, goes through
+    strptime.
+
+        >>> parser = TimestampParser(DEFAULT_HUMAN_DATETIME)
+        >>> parser('1970-01-01 01:00:00 +0100')
+        0
+    """
+    def __init__(self, ts_format: str):
+        self.ts_format = ts_format
+        self.pattern = compile_format(ts_format)
+        self.dates = {}
+        self.offsets = {}
+        self.default_dates = {}
+        self.default_clocks = {}
+        if ts_format == DEFAULT_HUMAN_DATETIME:
+            self.method = self.parse_default
+        elif ts_format in ISO_DATETIMES:
+            self.method = self.parse_iso
+        elif self.pattern:
+            self.method = self.parse_pattern
+        else:
+            self.method = self.parse_strptime
+
+    def __call__(self, value: str) -> int:
+        try:
+            return self.method(value)
+        except (ValueError, KeyError, IndexError, OverflowError, AttributeError):
+            return self.parse_strptime(value)
+
+    def day_seconds(self, year: int, month: int, day: int) -> int:
+        """Returns the seconds from the epoch to a (utc) date"""
+        key = (year, month, day)
+        seconds = self.dates.get(key)
+        if seconds is None:
+            seconds = (date(year, month, day).toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY
+            self.dates[key] = seconds
+        return seconds
+
+    def offset_seconds(self, offset: str) -> int:
+        """Returns the seconds of a %z utc offset"""
+        seconds = self.offsets.get(offset)
+        if seconds is None:
+            seconds = parse_offset(offset)
+            self.offsets[offset] = seconds
+        return seconds
+
+    def parse_default(self, value: str) -> int:
+        """Parses `YYYY-mm-dd HH:MM:SS +zzzz` by slicing
+
+        The date, the time of day (with the spaces around it) and the offset
+        are looked up in caches, which only hold validated parts.
+        """
+        try:
+            return (self.default_dates[value[:10]] + self.default_clocks[value[10:20]]
+                    - self.offsets[value[20:]])
+        except KeyError:
+            pass
+        match = self.pattern.match(value)
+        if (len(value) < 25 or not match or value[4] != '-' or value[7] != '-'
+                or value[10] != ' ' or value[19] != ' '):
+            # Not at the fixed positions, but still valid for strptime
+            return self.parse_pattern(value)
+        fields = match.groupdict()
+        self.default_dates[value[:10]] = self.day_seconds(int(fields['Y']), int(fields['m']),
+                                                          int(fields['d']))
+        if int(fields['S']) > 59:
+            raise ValueError('leap seconds are left to strptime')
+        self.default_clocks[value[10:20]] = (int(fields['H']) * 3600 + int(fields['M']) * 60
+                                             + int(fields['S']))
+        self.offset_seconds(value[20:])
+        return self.parse_default(value)
+
+    def parse_iso(self, value: str) -> int:
+        """Parses ISO-8601 timestamps with an utc offset"""
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            raise ValueError('no utc offset')
+        return int(parsed.timestamp())
+
+    def parse_pattern(self, value: str) -> int:
+        """Parses value with the compiled regular expression"""
+        fields = self.pattern.match(value).groupdict()
+        if fields.get('Y'):
+            year = int(fields['Y'])
+        else:
+            year = int(fields['y'])
+            year += 1900 if year >= 69 else 2000
+        month, day = int(fields['m']), int(fields['d'])
+        second = int(fields.get('S') or 0)
+        if second > 59:
+            raise ValueError('leap seconds are left to strptime')
+        clock = int(fields.get('H') or 0) * 3600 + int(fields.get('M') or 0) * 60 + second
+        if fields.get('z') is None:
+            # Local time, which has to go through datetime
+            return int((datetime(year, month, day) + timedelta(seconds=clock)).timestamp())
+        return self.day_seconds(year, month, day) + clock - self.offset_seconds(fields['z'])
+
+    def parse_strptime(self, value: str) -> int:
+        """Parses value with strptime"""
+        return int(datetime.strptime(value, self.ts_format).timestamp())
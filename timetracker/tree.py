@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Hierarchical totals of activities
+
+Activities are separated into a hierarchy by colons, eg `Work:Writing`. The
+ActivityTree adds up the time spent on each activity for every level of this
+hierarchy, so that `Work` contains the time spent on `Work:Writing`.
+"""
+
+SEPARATOR = ':'
+
+def format_duration(seconds: int) -> str:
+    """Formats a duration in seconds as H:MM:SS"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+
+class TreeNode:
+    """A single activity in the ActivityTree
+
+    name is the full activity (eg `Work:Writing`), depth its level in the
+    hierarchy (1 for `Work`). total and count include all children, own_total
+    and own_count only segments of exactly this activity.
+    """
+    __slots__ = ('name', 'depth', 'total', 'count', 'own_total', 'own_count', 'children')
+
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.total = 0
+        self.count = 0
+        self.own_total = 0
+        self.own_count = 0
+        self.children = {}
+
+    def __repr__(self):
+        return '<{} `{}` {}>'.format(type(self).__name__, self.name, format_duration(self.total))
+
+    @property
+    def mean(self) -> float:
+        """Mean duration of the segments in this node"""
+        return self.total / self.count if self.count else 0.0
+
+    def walk(self, depth=None):
+        """Yields this node and all children down to depth, depth first"""
+        yield self
+        if depth is None or self.depth < depth:
+            for child in self.children.values():
+                yield from child.walk(depth)
+
+
+class ActivityTree:
+    """Prefix tree of activities with total, count and mean durations
+
+    The root node has depth 0, an empty name and contains everything.
+    Build it from Segments:
+
+        >>> tree = ActivityTree.from_segments(tf.segments())
+        >>> tree['Work:Writing'].total
+        3600
+        >>> print(tree.format(depth=1))
+    """
+    def __init__(self, separator: str = SEPARATOR):
+        self.separator = separator
+        self.root = TreeNode('', 0)
+
+    def __getitem__(self, activity: str) -> TreeNode:
+        node = self.root
+        for part in activity.split(self.separator):
+            node = node.children[part]
+        return node
+
+    def __iter__(self):
+        return self.walk()
+
+    def add(self, activity: str, total: int, count: int):
+        """Adds count segments of activity with a total duration to the tree"""
+        parts = activity.split(self.separator)
+        node = self.root
+        node.total += total
+        node.count += count
+        for depth, part in enumerate(parts, 1):
+            child = node.children.get(part)
+            if child is None:
+                child = TreeNode(self.separator.join(parts[:depth]), depth)
+                node.children[part] = child
+            node = child
+            node.total += total
+            node.count += count
+        node.own_total += total
+        node.own_count += count
+
+    @classmethod
+    def from_segments(cls, segments, separator: str = SEPARATOR):
+        """Creates an ActivityTree from Segments in a single pass
+
+        Durations are first summed per activity id in flat lists, then every
+        distinct activity is split and added to the tree once.
+        """
+        tree = cls(separator)
+        totals = [0] * len(segments.dictionary)
+        counts = [0] * len(segments.dictionary)
+        for activity_id, duration in zip(segments.activity_ids, segments.duration):
+            totals[activity_id] += duration
+            counts[activity_id] += 1
+        for activity_id, activity in enumerate(segments.dictionary):
+            if counts[activity_id]:
+                tree.add(activity, totals[activity_id], counts[activity_id])
+        return tree
+
+    def walk(self, depth=None):
+        """Yields all nodes (without the root) down to depth, depth first"""
+        for child in self.root.children.values():
+            yield from child.walk(depth)
+
+    def cut(self, depth: int):
+        """Returns a copy of the tree without nodes deeper than depth
+
+        Totals of the remaining nodes still include the removed children.
+        """
+        tree = type(self)(self.separator)
+        def copy_node(node, copy):
+            copy.total, copy.count = node.total, node.count
+            copy.own_total, copy.own_count = node.own_total, node.own_count
+            if node.depth < depth:
+                for part, child in node.children.items():
+                    copy.children[part] = copy_node(child, TreeNode(child.name, child.depth))
+            return copy
+        copy_node(self.root, tree.root)
+        return tree
+
+    def format(self, depth=None) -> str:
+        """Formats the tree as an indented table down to depth
+
+        Each line holds the activity, its total, the number of segments and
+        the mean duration. Children are sorted by their total.
+        """
+        lines = []
+        def add_lines(node):
+            children = sorted(node.children.values(), key=lambda child: -child.total)
+            for child in children:
+                lines.append('{}{}\t{}\t{}\t{}'.format(
+                    '  ' * (child.depth - 1), child.name.split(self.separator)[-1],
+                    format_duration(child.total), child.count, format_duration(child.mean)))
+                if depth is None or child.depth < depth:
+                    add_lines(child)
+        add_lines(self.root)
+        return '\n'.join(lines)
@@ -1,14 +1,11 @@
 #!/usr/bin/env python3
 
+# tt is run from prompt hooks and key bindings, where starting up is most of
+# the time it takes. Everything but these is imported where it is needed.
 import os
+import sys
 import time
-import argparse
-import subprocess
-import locale
-import shutil
-from datetime import datetime
 
-#import sys
 #import tempfile
 #import tailer
 
@@ -24,6 +21,20 @@ TT_DIR = '/home/jooa/Cloud/tt'
 TT_FILE = os.path.join(TT_DIR, 'time.txt')
 TT_ARCHIVE = os.path.join(TT_DIR, 'archive.txt')
 
+_LOCALE_SET = False
+
+def set_time_locale():
+    """Formats times in the locale of the environment (once)"""
+    global _LOCALE_SET
+    if not _LOCALE_SET:
+        # locale only adds name normalisation to _locale, but imports re
+        try:
+            from _locale import setlocale, LC_TIME
+        except ImportError:
+            from locale import setlocale, LC_TIME
+        setlocale(LC_TIME, '') # Fixes an issue around not correctly using the locale
+        _LOCALE_SET = True
+
 def format_line(line, utc=False):
     line = line.split('\t')
     try:
@@ -31,8 +42,9 @@ def format_line(line, utc=False):
     except ValueError:
         line[0] = line[0]
     else:
-        method = datetime.utcfromtimestamp if utc else datetime.fromtimestamp
-        line[0] = method(line[0]).strftime('%c')
+        set_time_locale()
+        method = time.gmtime if utc else time.localtime
+        line[0] = time.strftime('%c', method(line[0]))
     return '\t'.join(line)
 
 class ActivityLine:
@@ -71,11 +83,43 @@ class TimeTrackingFile:
     def __repr__(self):
         return '<TimeTrackingFile at `{}`>'.format(self.file_name)
 
+    def manifest_name(self):
+        """Returns the archive file, next to the time-tracking file by default"""
+        if self.archive_name is not None:
+            return self.archive_name
+        return os.path.join(os.path.dirname(self.file_name), TT_ARCHIVE_NAME)
+
+    def via_daemon(self, command, *args, fallback=True):
+        """Returns the result of command from the daemon (see `tt serve`)
+
+        Returns None if no daemon is running for the file, or if it failed
+        (which is reported on stderr), the caller then accesses the file
+        itself. Without fallback, a daemon that did not answer once the
+        request was sent is an error, as the command may have been carried
+        out (eg an append, which must not be written twice).
+        """
+        from timetracker.client import request, DaemonUnavailable, DaemonError, DaemonNoAnswer
+        try:
+            return request(self.file_name, command, *args)
+        except DaemonUnavailable:
+            return None
+        except DaemonError as error:
+            if not fallback and isinstance(error, DaemonNoAnswer):
+                sys.exit('Daemon failed, `{}` may or may not have been carried out: {}'.format(
+                    command, error))
+            print('Daemon failed, using the file directly: {}'.format(error), file=sys.stderr)
+            return None
+
     def append_activity_map(self, activity):
         """Appends to the time-tracking file based on a mapping"""
-        line = self.format.format_map(activity)
-        with open(self.file_name, 'a') as f:
-            f.writelines(line)
+        line = self.via_daemon('append', activity['activity'], activity['timestamp'],
+                               fallback=False)
+        if line is None:
+            from timetracker import group_append, refresh_activities, file_signature
+            line = self.format.format_map(activity)
+            before = file_signature(self.file_name)
+            group_append(self.file_name, line.encode())
+            refresh_activities(self.file_name, before_append=before)
         return format_line(line, self.utc) if not self.raw_ts else line
 
     def append_activity(self, activity, *args):
@@ -89,23 +133,35 @@ class TimeTrackingFile:
             n = int(n)
         except (TypeError, ValueError):
             n = 5
-        with open(self.file_name, 'r') as f:
-            # Seek to the end.
-            lines = f.readlines()[-n:]
-            lines = [format_line(line, self.utc) if not self.raw_ts else line for line in lines]
-        return ''.join(lines)
+        lines = self.via_daemon('tail', n)
+        if lines is not None:
+            lines = lines.split('\n') if lines else []
+        else:
+            from timetracker import tail_lines
+            lines = tail_lines(self.file_name, n)
+        lines = [format_line(line, self.utc) if not self.raw_ts else line for line in lines]
+        return os.linesep.join(lines)
 
     def sort(self, *args):
         """Sorts the list and saves it again"""
         raise NotImplementedError
 
-    def archive(self, *args):
-        """Archive old (defined by some option) activities"""
-        # Implement this. Details might become apparent after a while. Currently not sure what would be a good thing for this.
-        raise NotImplementedError
+    def archive(self, period='month', *args):
+        """Moves activities of closed periods into the archive
+
+        Every month (or day or year, as given by period) before the current one
+        is moved to its own chunk in the archive directory, listed in the
+        archive file.
+        """
+        archive_name = self.manifest_name()
+        from timetracker import Archive
+        archive = Archive(archive_name, period=period)
+        count = archive.archive(self.file_name, round(time.time()))
+        return 'Archived {} activities to {}'.format(count, archive_name)
 
     def backup(self, *args):
         """Copy file to backup location"""
+        import shutil
         try:
             shutil.copy(self.file_name, self.backup_file_name)
         except:
@@ -116,6 +172,7 @@ class TimeTrackingFile:
 
     def edit(self, editor=None, *args):
         """Opens an editor on the file"""
+        import subprocess
         if not editor:
             editor = os.environ.get('EDITOR', 'vim')
         if editor == 'vim':
@@ -126,36 +183,159 @@ class TimeTrackingFile:
     def flush(self, confirm=True, *args):
         """Removes all entries"""
         if confirm and input("Are you sure? [yN] ").lower() in ['yes', 'y']:
-            open(self.file_name, 'w').close()
+            from timetracker import file_lock
+            with file_lock(self.file_name):
+                open(self.file_name, 'w').close()
             return "Cleared activities"
         return "Abort"
 
-    def insert(self, activity='Free', timestamp=round(time.time())):
-        """Inserts a activity at timestamp"""
-        with open(self.file_name, 'r') as f:
-            content = f.readlines()
-        content = [tuple(line.split('\t')) for line in content]
-        content = [(int(i[0]), i[1]) for i in content]
-        content.append((timestamp, activity))
-        content = sorted(content)
-        content_str = ''.join(['{}\t{}'.format(i[0], i[1]) for i in content])
-        content_i = [index for index, line in enumerate(content) if line[0] == timestamp][0]
-        content_trim = ['{}\t{}'.format(line[0], line[1]) for line in content[content_i-2:content_i+2]]
-        with open(self.file_name, 'w') as f:
-            f.write(content_str)
-        return ''.join([format_line(line, self.utc) for line in content_trim])
-
-    def list(self):
-        with open(self.file_name, 'r') as f:
-            content = [line.strip().split('\t') for line in f.readlines()]
-        zipped = sorted(set(list(zip(*content))[1]))
-        return os.linesep.join(zipped)
+    def insert(self, *args):
+        """Inserts activities at timestamps into the sorted file
 
+        Arguments are pairs of activity and timestamp. A single activity
+        without timestamp is inserted now. All entries are inserted with a
+        single rewrite of the part of the file after the earliest one. Returns
+        the lines around the inserted entries.
+        """
+        if not args:
+            args = (self.default,)
+        activities, timestamps = args[0::2], [int(i) for i in args[1::2]]
+        if len(timestamps) < len(activities):
+            timestamps.append(round(time.time()))
+        rows = [(timestamp, self.format.format(timestamp=timestamp, activity=activity))
+                for activity, timestamp in zip(activities, timestamps)]
+        from timetracker import file_lock, insert_lines, tail_lines, read_lines
+        with file_lock(self.file_name):
+            offset = insert_lines(self.file_name, rows)
+            lines = tail_lines(self.file_name, 2, end=offset) + read_lines(self.file_name, offset, 2)
+        lines = [format_line(line, self.utc) if not self.raw_ts else line
+                 for line in lines if line]
+        return os.linesep.join(lines)
 
-def main():
-    """Main function, called when not loaded as lib"""
-    locale.setlocale(locale.LC_TIME, '') # Fixes an issue around not correctly using the locale
+    def tree(self, depth=None, *args):
+        """Returns total time spent per activity, summed up along the hierarchy
+
+        The totals come from the aggregate cache, so only rows added since the
+        last call are parsed. Archived activities are included.
+        """
+        result = self.via_daemon('tree', *([] if depth is None else [int(depth)]))
+        if result is not None:
+            return result
+        from timetracker import AggregateCache
+        tree = AggregateCache(self.file_name, archive_name=self.manifest_name()).update()
+        tree = tree.tree(now=round(time.time()))
+        return tree.format(int(depth) if depth is not None else None)
+
+    def report(self, *args):
+        """Returns total, count, mean and share of time per period and activity
+
+        Arguments can come in any order: a period (all, day, week, month or
+        year), a depth to cut activities at, an output format (table, tsv or
+        json) and a time zone (eg Europe/Berlin, local time by default).
+        Archived activities are included. Anything else is answered with
+        the usage.
+        """
+        from timetracker import TrackingFile, Archive, PERIODS, FORMATS
+        period, depth, kind = 'all', None, 'table'
+        tz_info = None
+        if self.utc:
+            from datetime import timezone
+            tz_info = timezone.utc
+        for arg in args:
+            if arg in PERIODS:
+                period = arg
+            elif arg.isdigit():
+                depth = int(arg)
+            elif arg in FORMATS:
+                kind = arg
+            else:
+                from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+                try:
+                    tz_info = ZoneInfo(arg)
+                except (ZoneInfoNotFoundError, ValueError):
+                    return ('Unknown argument `{}`, usage: report [{}] [depth] [{}] [time zone]'
+                            .format(arg, '|'.join(PERIODS), '|'.join(FORMATS)))
+        tracking_file = TrackingFile(self.file_name)
+        archive = Archive(self.manifest_name())
+        if archive:
+            tracking_file.data = archive.between(file_name=self.file_name)
+            tracking_file.loaded = True
+        else:
+            tracking_file.read(workers=None)
+        return tracking_file.report(period, depth, tz_info, until_now=True).format(kind)
 
+    def merge(self, *file_names):
+        """Merges other time-tracking files into this one
+
+        All files have to be sorted. Activities that are in several files
+        (same time and activity) are kept only once.
+        """
+        if not file_names:
+            return 'Nothing to merge'
+        from timetracker import file_lock, merge_files
+        with file_lock(self.file_name):
+            count = merge_files((self.file_name, *file_names), self.file_name, dedupe=True)
+        return 'Merged {} files into {} activities'.format(len(file_names) + 1, count)
+
+    def to_binary(self, binary_name=None, *args):
+        """Converts the time-tracking file to the binary format"""
+        if binary_name is None:
+            binary_name = os.path.splitext(self.file_name)[0] + '.bin'
+        from timetracker import text_to_binary
+        text_to_binary(self.file_name, binary_name)
+        return 'Converted {} to {}'.format(self.file_name, binary_name)
+
+    def from_binary(self, binary_name=None, *args):
+        """Replaces the time-tracking file with the contents of a binary file"""
+        if binary_name is None:
+            binary_name = os.path.splitext(self.file_name)[0] + '.bin'
+        from timetracker import file_lock, binary_to_text
+        with file_lock(self.file_name):
+            binary_to_text(binary_name, self.file_name)
+        return 'Converted {} to {}'.format(binary_name, self.file_name)
+
+    def complete(self, prefix='', *args):
+        """Returns the completions of an activity prefix, best first"""
+        from timetracker import complete
+        return os.linesep.join(complete(self.file_name, prefix, self.manifest_name()))
+
+    def list(self, *args):
+        """Returns all distinct activities, sorted
+
+        They come from the activity dictionary, so only rows added since the
+        last call are read. Archived activities are included.
+        """
+        result = self.via_daemon('list')
+        if result is not None:
+            return os.linesep.join(result.split('\n'))
+        from timetracker import TrackingFile, ActivityDictionary
+        dialect = TrackingFile(self.file_name).cached_dialect()
+        activities = ActivityDictionary(self.file_name, self.manifest_name())
+        return os.linesep.join(activities.update(dialect).names())
+
+    def serve(self, *args):
+        """Serves the time-tracking file until stopped (see timetracker/daemon.py)
+
+        While it runs, do, tail, list and tree are answered by the daemon,
+        which keeps the indexes of the file in memory.
+        """
+        from timetracker.daemon import serve
+        serve(self.file_name, archive_name=self.manifest_name())
+        return 'Stopped serving {}'.format(self.file_name)
+
+
+def parse_args(argv):
+    """Parses the command line arguments
+
+    A command without options (eg `tt do Work`) is parsed by hand, as
+    importing argparse takes longer than most commands.
+    """
+    if not any(arg.startswith('-') for arg in argv):
+        from types import SimpleNamespace
+        return SimpleNamespace(verbose=False, archive=False, config_file=CONFIG_FILE,
+                               tt_dir=TT_DEFAULT_DIR, utc=False, raw=False,
+                               command=argv[0] if argv else None, args=argv[1:])
+    import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('-v', '--verbose', dest='verbose',
                         help='increased verbosity',
@@ -181,17 +361,39 @@ def main():
     # object, somehow so that tt ignores any commands that are not part of it's
     # own part?
     parser.add_argument('args', nargs='*', help="further arguments passed to command")
-    args = parser.parse_args()
+    return parser.parse_args(argv)
+
+def main():
+    """Main function, called when not loaded as lib"""
+    if sys.argv[1:2] == ['complete']:
+        # Shells call this on every tab, skip everything else
+        from timetracker.completion import complete
+        print(os.linesep.join(complete(os.path.join(TT_DEFAULT_DIR, TT_FILE_NAME),
+                                       *(sys.argv[2:3] or ['']),
+                                       os.path.join(TT_DEFAULT_DIR, TT_ARCHIVE_NAME))))
+        return
+    args = parse_args(sys.argv[1:])
 
     if args.verbose:
         print(args)
 
     ttf = TimeTrackingFile(args.tt_dir, verbose=args.verbose, utc=args.utc, raw_ts=args.raw)
 
+    if args.archive:
+        ttf.archive()
+
     #default_command = ttf.tail
     lookup_dict = {
         'list': ttf.list,
+        'complete': ttf.complete,
+        'tree': ttf.tree,
+        'report': ttf.report,
+        'serve': ttf.serve,
         'insert': ttf.insert,
+        'archive': ttf.archive,
+        'merge': ttf.merge,
+        'to-binary': ttf.to_binary,
+        'from-binary': ttf.from_binary,
         'do': ttf.append_activity,
         'tail': ttf.tail,
         'show': ttf.tail,